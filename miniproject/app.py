@@ -1,6 +1,9 @@
-from flask import Flask, session, render_template, redirect, url_for, flash
+from flask import Flask, session, render_template, redirect, url_for, flash, request
 from extensions import mail
-from models.db import get_db_connection
+from models.db import init_app as init_db
+from models import stats, migrations, explain_check
+from utils.helpers import get_unread_count
+from utils import cache, ratelimit
 from routes.auth_routes import auth_bp
 from routes.student_routes import student_bp
 from routes.faculty_routes import faculty_bp
@@ -11,6 +14,7 @@ import flask
 
 from dotenv import load_dotenv
 from config import Config
+from services import jobs, email_service, deletion_service, scheduler_service, processes
 
 load_dotenv()
 
@@ -18,6 +22,17 @@ app = Flask(__name__)
 app.config.from_object(Config)
 
 mail.init_app(app)
+init_db(app)
+migrations.init_app(app)
+explain_check.init_app(app)
+stats.init_app(app)
+cache.init_app(app)
+ratelimit.init_app(app)
+jobs.init_app(app)
+email_service.init_app(app)
+deletion_service.init_app(app)
+scheduler_service.init_app(app)
+processes.init_app(app)
 
 # Register Blueprints
 app.register_blueprint(auth_bp)
@@ -32,15 +47,7 @@ app.register_blueprint(common_bp)
 def inject_notifications():
     if 'user_id' in session:
         try:
-            db = get_db_connection()
-            cursor = db.cursor(dictionary=True)
-            cursor.execute("""
-                SELECT COUNT(*) as count FROM notifications 
-                WHERE user_id = %s AND user_role = %s AND is_read = 0
-            """, (session['user_id'], session.get('role')))
-            result = cursor.fetchone()
-            db.close()
-            return {'unread_notifications': result['count'] if result else 0}
+            return {'unread_notifications': get_unread_count(session['user_id'], session.get('role'))}
         except:
              return {'unread_notifications': 0}
     return {'unread_notifications': 0}
@@ -50,6 +57,14 @@ def forbidden(e):
     flash("Unauthorized access. You do not have permission to view this page.", "error")
     return redirect(url_for('auth.login'))
 
+@app.errorhandler(429)
+def too_many_requests(e):
+    retry_after = getattr(e, 'retry_after', None) or 1
+    headers = {'Retry-After': str(retry_after)}
+    if request.accept_mimetypes.best == 'application/json' or request.is_json:
+        return {'error': 'Too many requests', 'retry_after': retry_after}, 429, headers
+    return render_template('429.html', retry_after=retry_after), 429, headers
+
 @app.errorhandler(404)
 def not_found(e):
     return render_template('404.html'), 404 # Assuming 404.html exists or simple return
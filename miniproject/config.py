@@ -7,3 +7,34 @@ class Config:
     MAIL_USE_TLS = True
     MAIL_USERNAME = os.environ.get("MAIL_USERNAME")
     MAIL_PASSWORD = os.environ.get("MAIL_PASSWORD")
+    MAIL_WORKERS = int(os.environ.get("MAIL_WORKERS", 2))  # outbox delivery threads, one SMTP session each
+    MAIL_CHUNK_SIZE = int(os.environ.get("MAIL_CHUNK_SIZE", 100))  # outbox rows inserted per statement for bulk mail
+    MAIL_BATCH_SIZE = int(os.environ.get("MAIL_BATCH_SIZE", 20))  # outbox rows claimed by a worker at once
+    MAIL_RATE_PER_MINUTE = int(os.environ.get("MAIL_RATE_PER_MINUTE", 120))
+    MAIL_MAX_ATTEMPTS = int(os.environ.get("MAIL_MAX_ATTEMPTS", 5))  # then the message is dead-lettered
+    MAIL_RETRY_BACKOFF = int(os.environ.get("MAIL_RETRY_BACKOFF", 60))  # seconds, doubled on every attempt
+    MAIL_POLL_INTERVAL = int(os.environ.get("MAIL_POLL_INTERVAL", 5))
+    JOB_WORKERS = int(os.environ.get("JOB_WORKERS", 4))
+    EXPORT_CHUNK_SIZE = int(os.environ.get("EXPORT_CHUNK_SIZE", 1000))  # rows fetched per round trip by the exporters
+    CERTIFICATE_CACHE_DIR = os.environ.get("CERTIFICATE_CACHE_DIR")  # rendered PDFs; defaults to a folder in the system temp dir
+    PROCESS_WORKERS = int(os.environ.get("PROCESS_WORKERS", 0)) or None  # worker processes for certificate ZIPs and import password hashing; None = one per CPU
+
+    DB_HOST = os.environ.get("DB_HOST", "localhost")
+    DB_USER = os.environ.get("DB_USER", "root")
+    DB_PASSWORD = os.environ.get("DB_PASSWORD", "123456")
+    DB_NAME = os.environ.get("DB_NAME", "campus_event_db")
+    DB_POOL_SIZE = int(os.environ.get("DB_POOL_SIZE", 10))
+    DB_POOL_TIMEOUT = int(os.environ.get("DB_POOL_TIMEOUT", 10))  # seconds to wait for a free connection
+    DB_POOL_RECYCLE = int(os.environ.get("DB_POOL_RECYCLE", 3600))  # seconds before a connection is replaced
+    DB_POOL_PRE_PING = os.environ.get("DB_POOL_PRE_PING", "1") == "1"
+    DB_AUTO_MIGRATE = os.environ.get("DB_AUTO_MIGRATE", "1") == "1"  # apply pending migrations on startup
+
+    CACHE_BACKEND = os.environ.get("CACHE_BACKEND", "local")  # 'local' (per process) or 'redis' (shared)
+    CACHE_REDIS_URL = os.environ.get("CACHE_REDIS_URL", "redis://localhost:6379/0")
+    CACHE_MAX_ENTRIES = int(os.environ.get("CACHE_MAX_ENTRIES", 10000))
+
+    NOTIFICATION_STREAM_SECONDS = int(os.environ.get("NOTIFICATION_STREAM_SECONDS", 30))  # SSE connection lifetime
+    NOTIFICATION_STREAM_RECHECK = int(os.environ.get("NOTIFICATION_STREAM_RECHECK", 10))  # seconds between DB checks
+
+    RATELIMIT_ENABLED = os.environ.get("RATELIMIT_ENABLED", "1") == "1"
+    RATELIMIT_STORAGE = os.environ.get("RATELIMIT_STORAGE", "memory")  # 'memory' (per process) or 'redis' (shared)
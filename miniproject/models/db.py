@@ -1,10 +1,206 @@
 import mysql.connector
-import os
+from mysql.connector import IntegrityError
+import threading
+import time
+from queue import LifoQueue, Empty
+from flask import g, has_request_context
+from config import Config
 
-def get_db_connection():
-    return mysql.connector.connect(
-        host="localhost",
-        user="root",
-        password="123456",
-        database="campus_event_db"
+
+class PoolTimeout(Exception):
+    pass
+
+
+class PooledConnection:
+    """Wraps a raw MySQL connection; close() hands it back to the pool."""
+
+    def __init__(self, pool, raw, created_at):
+        self._pool = pool
+        self._raw = raw
+        self._created_at = created_at
+        self._released = False
+
+    def __getattr__(self, name):
+        return getattr(self._raw, name)
+
+    def cursor(self, *args, **kwargs):
+        # Buffered so callers sharing a connection never trip over unread results
+        kwargs.setdefault('buffered', True)
+        return self._raw.cursor(*args, **kwargs)
+
+    def close(self):
+        if not self._released:
+            self._released = True
+            self._pool._release(self)
+
+
+class RequestConnection(PooledConnection):
+    """The connection held on flask.g; it is only released by the teardown handler."""
+
+    def close(self):
+        pass
+
+    def release(self):
+        PooledConnection.close(self)
+
+
+class ConnectionPool:
+    def __init__(self, size=10, timeout=10, recycle=3600, pre_ping=True, **connect_args):
+        self.size = size
+        self.timeout = timeout
+        self.recycle = recycle
+        self.pre_ping = pre_ping
+        self.connect_args = connect_args
+
+        self._idle = LifoQueue()
+        self._slots = threading.BoundedSemaphore(size)
+        self._lock = threading.Lock()
+        self._stats = {
+            'checkouts': 0,
+            'in_use': 0,
+            'created': 0,
+            'recycled': 0,
+            'failed_health_checks': 0,
+            'timeouts': 0,
+            'wait_time_total_ms': 0.0,
+            'wait_time_max_ms': 0.0,
+        }
+
+    def connect(self, wrapper=PooledConnection):
+        started = time.perf_counter()
+        if not self._slots.acquire(timeout=self.timeout):
+            with self._lock:
+                self._stats['timeouts'] += 1
+            raise PoolTimeout(f"No database connection available within {self.timeout}s")
+
+        try:
+            raw, created_at = self._checkout_raw()
+        except Exception:
+            self._slots.release()
+            raise
+
+        waited = (time.perf_counter() - started) * 1000
+        with self._lock:
+            self._stats['checkouts'] += 1
+            self._stats['in_use'] += 1
+            self._stats['wait_time_total_ms'] += waited
+            self._stats['wait_time_max_ms'] = max(self._stats['wait_time_max_ms'], waited)
+        return wrapper(self, raw, created_at)
+
+    def _checkout_raw(self):
+        while True:
+            try:
+                raw, created_at = self._idle.get_nowait()
+            except Empty:
+                return self._new_raw()
+
+            if self.recycle and time.time() - created_at > self.recycle:
+                self._discard(raw)
+                with self._lock:
+                    self._stats['recycled'] += 1
+                continue
+
+            if self.pre_ping:
+                try:
+                    raw.ping(reconnect=False)
+                except Exception:
+                    self._discard(raw)
+                    with self._lock:
+                        self._stats['failed_health_checks'] += 1
+                    continue
+
+            return raw, created_at
+
+    def _new_raw(self):
+        raw = mysql.connector.connect(**self.connect_args)
+        with self._lock:
+            self._stats['created'] += 1
+        return raw, time.time()
+
+    def _discard(self, raw):
+        try:
+            raw.close()
+        except Exception:
+            pass
+
+    def _release(self, conn):
+        raw = conn._raw
+        try:
+            # Never hand uncommitted work to the next borrower
+            if raw.in_transaction:
+                raw.rollback()
+            self._idle.put((raw, conn._created_at))
+        except Exception:
+            self._discard(raw)
+        finally:
+            with self._lock:
+                self._stats['in_use'] -= 1
+            self._slots.release()
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+        stats['size'] = self.size
+        stats['idle'] = self._idle.qsize()
+        checkouts = stats['checkouts']
+        stats['wait_time_avg_ms'] = round(stats['wait_time_total_ms'] / checkouts, 3) if checkouts else 0.0
+        return stats
+
+
+_pool = None
+
+
+def _build_pool(config):
+    return ConnectionPool(
+        size=config.get('DB_POOL_SIZE', 10),
+        timeout=config.get('DB_POOL_TIMEOUT', 10),
+        recycle=config.get('DB_POOL_RECYCLE', 3600),
+        pre_ping=config.get('DB_POOL_PRE_PING', True),
+        host=config.get('DB_HOST', "localhost"),
+        user=config.get('DB_USER', "root"),
+        password=config.get('DB_PASSWORD', "123456"),
+        database=config.get('DB_NAME', "campus_event_db")
     )
+
+
+def init_app(app):
+    global _pool
+    _pool = _build_pool(app.config)
+    app.teardown_appcontext(close_db)
+
+
+def get_pool():
+    global _pool
+    if _pool is None:
+        _pool = _build_pool({k: getattr(Config, k) for k in dir(Config) if k.isupper()})
+    return _pool
+
+
+def get_pooled_connection():
+    """
+    Check out a connection that is independent of the current request.
+    Used by background workers; close() returns it to the pool.
+    """
+    return get_pool().connect()
+
+
+def get_db_connection():
+    """
+    Inside a request, every caller shares one pooled connection held on flask.g
+    until teardown. Outside a request a fresh pooled connection is checked out.
+    """
+    if not has_request_context():
+        return get_pooled_connection()
+    if 'db' not in g:
+        g.db = get_pool().connect(wrapper=RequestConnection)
+    return g.db
+
+
+def close_db(exc=None):
+    db = g.pop('db', None)
+    if db is not None:
+        db.release()
+
+
+def pool_stats():
+    return get_pool().stats()
@@ -0,0 +1,122 @@
+import click
+from models.db import get_pooled_connection
+
+# The lookups each route runs on its hot path, with representative parameters.
+# `flask explain-check` EXPLAINs every one and fails when MySQL plans a full table scan.
+# Keep this list in step with the routes when a query changes.
+HOT_QUERIES = [
+    ("auth.login (faculty)", "SELECT * FROM faculty WHERE email=%s", ('someone@college.edu',)),
+    ("auth.login (student)", "SELECT * FROM student WHERE register_number=%s", ('REG0001',)),
+    ("auth.forgot_password", "SELECT * FROM student WHERE email=%s", ('someone@college.edu',)),
+    ("unread notification count", """
+        SELECT COUNT(*) as count FROM notifications
+        WHERE user_id = %s AND user_role = %s AND is_read = 0
+    """, (1, 'student')),
+    ("common.get_notifications", """
+        SELECT notification_id, message, is_read, created_at FROM notifications
+        WHERE user_id = %s AND user_role = %s AND notification_id > %s
+        ORDER BY notification_id ASC LIMIT 20
+    """, (1, 'student', 0)),
+    ("student.student_dashboard", """
+        SELECT e.event_id, e.event_name, e.event_date, e.location, r.attendance, r.certificate_status, r.registration_id,
+        (SELECT COUNT(*) FROM feedback f WHERE f.event_id=r.event_id AND f.student_id=r.student_id) as feedback_count,
+        od.status as od_status
+        FROM registrations r
+        JOIN events e ON r.event_id=e.event_id
+        LEFT JOIN onduty_requests od ON r.event_id = od.event_id AND r.student_id = od.student_id
+        WHERE r.student_id=%s
+    """, (1,)),
+    ("student.register_for_event", """
+        SELECT registration_id FROM registrations WHERE student_id=%s AND event_id=%s
+    """, (1, 1)),
+    ("student.submit_feedback", "SELECT * FROM feedback WHERE event_id=%s AND student_id=%s", (1, 1)),
+    ("student.request_onduty", "SELECT request_id FROM onduty_requests WHERE student_id=%s AND event_id=%s", (1, 1)),
+    ("schedule_service.cohort_snapshot (timetable)", """
+        SELECT t.timetable_id, t.day, t.start_time, t.end_time, t.classroom,
+               c.course_name, c.department, c.semester, f.name AS faculty_name
+        FROM timetable t
+        JOIN courses c ON t.course_id = c.course_id
+        JOIN faculty f ON t.faculty_id = f.faculty_id
+        WHERE c.department = %s AND c.semester = %s
+    """, ('CSE', 1)),
+    ("schedule_service.cohort_snapshot (exams)", """
+        SELECT e.exam_id, e.exam_date, e.start_time, e.end_time, e.hall, c.course_name, c.department, c.semester
+        FROM exams e
+        JOIN courses c ON e.course_id = c.course_id
+        WHERE c.department = %s AND c.semester = %s
+    """, ('CSE', 1)),
+    ("faculty.faculty_dashboard", """
+        SELECT e.event_id, COUNT(r.registration_id)
+        FROM events e
+        LEFT JOIN registrations r ON e.event_id = r.event_id
+        WHERE e.coordinator_id = %s AND e.deleted_at IS NULL
+        GROUP BY e.event_id
+    """, (1,)),
+    ("schedule_service.faculty_snapshot", """
+        SELECT t.timetable_id, t.day, t.start_time, t.end_time, t.classroom,
+               c.course_name, c.department, c.semester, f.name AS faculty_name
+        FROM timetable t
+        JOIN courses c ON t.course_id = c.course_id
+        JOIN faculty f ON t.faculty_id = f.faculty_id
+        WHERE t.faculty_id = %s
+    """, (1,)),
+    ("faculty.scan_attendance", """
+        SELECT r.registration_id, s.student_id, s.name, e.event_name
+        FROM registrations r
+        JOIN student s ON r.student_id = s.student_id
+        JOIN events e ON r.event_id = e.event_id
+        WHERE r.qr_token = %s
+    """, ('00000000-0000-0000-0000-000000000000',)),
+    ("faculty.export_attendance", """
+        SELECT s.name, s.register_number, r.attendance
+        FROM registrations r
+        JOIN student s ON r.student_id = s.student_id
+        WHERE r.event_id = %s
+    """, (1,)),
+    ("admin.admin_certificates", """
+        SELECT r.registration_id, s.name, e.event_name
+        FROM registrations r
+        JOIN student s ON r.student_id = s.student_id
+        JOIN events e ON r.event_id = e.event_id
+        WHERE r.certificate_status = 'Pending' AND e.deleted_at IS NULL AND r.registration_id < %s
+        ORDER BY r.registration_id DESC LIMIT 51
+    """, (1000000,)),
+    ("admin.admin_onduty", """
+        SELECT od.*, s.name, e.event_name
+        FROM onduty_requests od
+        JOIN student s ON od.student_id = s.student_id
+        JOIN events e ON od.event_id = e.event_id
+        WHERE od.status = 'Pending' AND e.deleted_at IS NULL AND od.request_id < %s
+        ORDER BY od.request_id DESC LIMIT 51
+    """, (1000000,)),
+    ("admin pending on-duty", "SELECT COUNT(*) FROM onduty_requests WHERE status='Pending'", ()),
+]
+
+
+def full_scans(cursor, sql, params):
+    """Return the EXPLAIN rows that read a whole table."""
+    cursor.execute("EXPLAIN " + sql, params)
+    return [row for row in cursor.fetchall() if row.get('type') == 'ALL']
+
+
+def init_app(app):
+    @app.cli.command('explain-check')
+    @click.option('--min-rows', default=0, help="Ignore full scans the optimizer estimates below this many rows.")
+    def explain_check_command(min_rows):
+        """EXPLAIN every hot query and exit non-zero if any plans a full table scan."""
+        db = get_pooled_connection()
+        failures = 0
+        try:
+            cursor = db.cursor(dictionary=True)
+            for name, sql, params in HOT_QUERIES:
+                scans = [row for row in full_scans(cursor, sql, params) if (row.get('rows') or 0) >= min_rows]
+                if scans:
+                    failures += 1
+                    tables = ", ".join(f"{row['table']} (~{row.get('rows')} rows)" for row in scans)
+                    click.echo(f"FULL SCAN  {name}: {tables}")
+                else:
+                    click.echo(f"ok         {name}")
+        finally:
+            db.close()
+        if failures:
+            raise SystemExit(1)
@@ -0,0 +1,387 @@
+import click
+from models.db import get_pooled_connection
+
+# Each migration is (version, description, steps). A step is a SQL string or a
+# callable(cursor) for changes MySQL cannot express idempotently (e.g. indexes).
+# Applied versions are recorded in schema_migrations; never edit a shipped migration,
+# append a new one instead. A step may carry a `precheck(cursor)` returning a problem
+# description; every precheck of a migration runs before any of its steps, so data that
+# would make a step fail stops the migration before it has changed anything.
+
+
+class MigrationError(RuntimeError):
+    pass
+
+
+def _duplicates(table, columns):
+    def precheck(cursor):
+        cursor.execute(f"""
+            SELECT COUNT(*), COALESCE(SUM(n), 0) FROM (
+                SELECT COUNT(*) AS n FROM {table}
+                WHERE {' AND '.join(f'{c.strip()} IS NOT NULL' for c in columns.split(','))}
+                GROUP BY {columns} HAVING COUNT(*) > 1
+            ) dup
+        """)
+        groups, rows = cursor.fetchone()
+        if not groups:
+            return None
+        return (f"{table}({columns}) has {groups} duplicated value(s) across {rows} rows; find them with "
+                f"SELECT {columns}, COUNT(*) FROM {table} GROUP BY {columns} HAVING COUNT(*) > 1")
+    return precheck
+
+
+def add_index(table, name, columns, unique=False):
+    def step(cursor):
+        cursor.execute("""
+            SELECT COUNT(*) FROM information_schema.statistics
+            WHERE table_schema = DATABASE() AND table_name = %s AND index_name = %s
+        """, (table, name))
+        if cursor.fetchone()[0]:
+            return
+        kind = "UNIQUE INDEX" if unique else "INDEX"
+        cursor.execute(f"CREATE {kind} {name} ON {table} ({columns})")
+    step.__doc__ = f"{'unique ' if unique else ''}index {name} on {table}({columns})"
+    if unique:
+        step.precheck = _duplicates(table, columns)
+    return step
+
+
+def add_column(table, name, definition):
+    def step(cursor):
+        cursor.execute("""
+            SELECT COUNT(*) FROM information_schema.columns
+            WHERE table_schema = DATABASE() AND table_name = %s AND column_name = %s
+        """, (table, name))
+        if cursor.fetchone()[0]:
+            return
+        cursor.execute(f"ALTER TABLE {table} ADD COLUMN {name} {definition}")
+    step.__doc__ = f"column {table}.{name}"
+    return step
+
+
+MIGRATIONS = [
+    (1, "base schema", [
+        """
+        CREATE TABLE IF NOT EXISTS student (
+            student_id INT AUTO_INCREMENT PRIMARY KEY,
+            name VARCHAR(100) NOT NULL,
+            register_number VARCHAR(50) NOT NULL,
+            email VARCHAR(100) NOT NULL,
+            department VARCHAR(100),
+            semester INT,
+            password VARCHAR(255) NOT NULL
+        )
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS faculty (
+            faculty_id INT AUTO_INCREMENT PRIMARY KEY,
+            name VARCHAR(100) NOT NULL,
+            email VARCHAR(100) NOT NULL,
+            department VARCHAR(100),
+            password VARCHAR(255) NOT NULL,
+            is_admin TINYINT(1) NOT NULL DEFAULT 0
+        )
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS events (
+            event_id INT AUTO_INCREMENT PRIMARY KEY,
+            event_name VARCHAR(200) NOT NULL,
+            event_date DATE NOT NULL,
+            location VARCHAR(200),
+            description TEXT,
+            coordinator_id INT,
+            status VARCHAR(20) NOT NULL DEFAULT 'Open'
+        )
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS registrations (
+            registration_id INT AUTO_INCREMENT PRIMARY KEY,
+            student_id INT NOT NULL,
+            event_id INT NOT NULL,
+            qr_token VARCHAR(64),
+            attendance VARCHAR(20) DEFAULT NULL,
+            certificate_status VARCHAR(20) DEFAULT NULL,
+            registered_at DATETIME DEFAULT CURRENT_TIMESTAMP
+        )
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS notifications (
+            notification_id INT AUTO_INCREMENT PRIMARY KEY,
+            user_id INT NOT NULL,
+            user_role VARCHAR(20) NOT NULL,
+            message TEXT NOT NULL,
+            is_read TINYINT(1) NOT NULL DEFAULT 0,
+            created_at DATETIME DEFAULT CURRENT_TIMESTAMP
+        )
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS feedback (
+            feedback_id INT AUTO_INCREMENT PRIMARY KEY,
+            event_id INT NOT NULL,
+            student_id INT NOT NULL,
+            rating INT,
+            comments TEXT,
+            created_at DATETIME DEFAULT CURRENT_TIMESTAMP
+        )
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS courses (
+            course_id INT AUTO_INCREMENT PRIMARY KEY,
+            course_name VARCHAR(200) NOT NULL,
+            department VARCHAR(100),
+            semester INT
+        )
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS timetable (
+            timetable_id INT AUTO_INCREMENT PRIMARY KEY,
+            course_id INT NOT NULL,
+            faculty_id INT NOT NULL,
+            day VARCHAR(10) NOT NULL,
+            start_time TIME NOT NULL,
+            end_time TIME NOT NULL,
+            classroom VARCHAR(50)
+        )
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS onduty_requests (
+            request_id INT AUTO_INCREMENT PRIMARY KEY,
+            student_id INT NOT NULL,
+            event_id INT NOT NULL,
+            status VARCHAR(20) NOT NULL DEFAULT 'Pending',
+            approved_by INT,
+            request_date DATETIME DEFAULT CURRENT_TIMESTAMP
+        )
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS exams (
+            exam_id INT AUTO_INCREMENT PRIMARY KEY,
+            course_id INT NOT NULL,
+            exam_date DATE NOT NULL,
+            start_time TIME NOT NULL,
+            end_time TIME NOT NULL,
+            hall VARCHAR(50)
+        )
+        """
+    ]),
+    (2, "email outbox and statistics read models", [
+        """
+        CREATE TABLE IF NOT EXISTS email_outbox (
+            outbox_id BIGINT AUTO_INCREMENT PRIMARY KEY,
+            subject VARCHAR(255) NOT NULL,
+            recipients TEXT NOT NULL,
+            body MEDIUMTEXT,
+            html MEDIUMTEXT,
+            attachments LONGTEXT,
+            status ENUM('pending', 'sending', 'sent', 'dead') NOT NULL DEFAULT 'pending',
+            attempts INT NOT NULL DEFAULT 0,
+            next_attempt_at DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP,
+            claimed_at DATETIME NULL,
+            last_error TEXT,
+            created_at DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP,
+            sent_at DATETIME NULL,
+            INDEX idx_outbox_status_next (status, next_attempt_at)
+        )
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS event_stats (
+            event_id INT PRIMARY KEY,
+            registration_count INT NOT NULL DEFAULT 0,
+            attendance_count INT NOT NULL DEFAULT 0
+        )
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS portal_stats (
+            stat_key VARCHAR(50) PRIMARY KEY,
+            stat_value BIGINT NOT NULL DEFAULT 0
+        )
+        """
+    ]),
+    (3, "indexes for hot lookups", [
+        add_index('registrations', 'idx_reg_event_attendance', 'event_id, attendance'),
+        add_index('registrations', 'idx_reg_certificate_status', 'certificate_status'),
+        add_index('notifications', 'idx_notif_unread', 'user_id, user_role, is_read, created_at'),
+        add_index('notifications', 'idx_notif_cursor', 'user_id, user_role, notification_id'),
+        add_index('events', 'idx_events_date', 'event_date'),
+        add_index('events', 'idx_events_coordinator', 'coordinator_id, event_date'),
+        add_index('courses', 'idx_courses_cohort', 'department, semester'),
+        add_index('timetable', 'idx_timetable_faculty_day', 'faculty_id, day, start_time'),
+        add_index('timetable', 'idx_timetable_course', 'course_id'),
+        add_index('exams', 'idx_exams_course_date', 'course_id, exam_date'),
+        add_index('onduty_requests', 'idx_od_status_date', 'status, request_date'),
+        add_index('onduty_requests', 'idx_od_event', 'event_id'),
+        add_index('feedback', 'idx_feedback_student', 'student_id'),
+        add_index('feedback', 'idx_feedback_created', 'created_at')
+    ]),
+    (4, "unique constraints behind the duplicate checks", [
+        add_index('registrations', 'uq_reg_qr_token', 'qr_token', unique=True),
+        add_index('registrations', 'uq_reg_student_event', 'student_id, event_id', unique=True),
+        add_index('feedback', 'uq_feedback_event_student', 'event_id, student_id', unique=True),
+        add_index('onduty_requests', 'uq_od_student_event', 'student_id, event_id', unique=True),
+        add_index('student', 'uq_student_register_number', 'register_number', unique=True),
+        add_index('student', 'uq_student_email', 'email', unique=True),
+        add_index('faculty', 'uq_faculty_email', 'email', unique=True)
+    ]),
+    (5, "attendance scan time", [
+        add_column('registrations', 'attended_at', 'DATETIME NULL')
+    ]),
+    (6, "pending certificates per event", [
+        add_index('registrations', 'idx_reg_cert_event', 'certificate_status, event_id')
+    ]),
+    (7, "on-duty pages by status", [
+        add_index('onduty_requests', 'idx_od_status', 'status')
+    ]),
+    (8, "user directory search", [
+        add_index('student', 'idx_student_name', 'name'),
+        add_index('student', 'idx_student_dept_sem_name', 'department, semester, name'),
+        add_index('faculty', 'idx_faculty_name', 'name'),
+        add_index('faculty', 'idx_faculty_dept_name', 'department, name')
+    ]),
+    (9, "soft delete for events", [
+        add_column('events', 'deleted_at', 'DATETIME NULL')
+    ]),
+    (10, "event capacity, waitlist and registration idempotency keys", [
+        add_column('events', 'capacity', 'INT NULL'),
+        """
+        CREATE TABLE IF NOT EXISTS event_waitlist (
+            waitlist_id BIGINT AUTO_INCREMENT PRIMARY KEY,
+            event_id INT NOT NULL,
+            student_id INT NOT NULL,
+            created_at DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP,
+            UNIQUE KEY uq_waitlist_event_student (event_id, student_id),
+            INDEX idx_waitlist_event (event_id, waitlist_id),
+            INDEX idx_waitlist_student (student_id)
+        )
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS registration_requests (
+            idempotency_key VARCHAR(64) PRIMARY KEY,
+            student_id INT NOT NULL,
+            event_id INT NOT NULL,
+            outcome VARCHAR(20),
+            created_at DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP,
+            INDEX idx_regreq_student (student_id)
+        )
+        """
+    ]),
+    (11, "exam halls and seating", [
+        """
+        CREATE TABLE IF NOT EXISTS exam_halls (
+            hall_id INT AUTO_INCREMENT PRIMARY KEY,
+            name VARCHAR(50) NOT NULL,
+            capacity INT NOT NULL,
+            seats_per_row INT NOT NULL DEFAULT 10,
+            UNIQUE KEY uq_exam_hall_name (name)
+        )
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS exam_seating (
+            seat_id BIGINT AUTO_INCREMENT PRIMARY KEY,
+            exam_id INT NOT NULL,
+            student_id INT NOT NULL,
+            hall_id INT NOT NULL,
+            seat_number INT NOT NULL,
+            UNIQUE KEY uq_seating_exam_student (exam_id, student_id),
+            INDEX idx_seating_hall (hall_id, seat_number),
+            INDEX idx_seating_student (student_id)
+        )
+        """,
+        add_index('exams', 'idx_exams_date', 'exam_date, start_time')
+    ]),
+    (12, "event start and end times", [
+        add_column('events', 'start_time', 'TIME NULL'),
+        add_column('events', 'end_time', 'TIME NULL')
+    ]),
+    (13, "version counters for cached data", [
+        """
+        CREATE TABLE IF NOT EXISTS data_versions (
+            name VARCHAR(50) PRIMARY KEY,
+            version BIGINT NOT NULL DEFAULT 0
+        )
+        """
+    ]),
+    (14, "revocable calendar feed links", [
+        add_column('student', 'feed_nonce', 'VARCHAR(32) NULL'),
+        add_column('faculty', 'feed_nonce', 'VARCHAR(32) NULL')
+    ]),
+    (15, "registration total summed from event_stats", [
+        "DELETE FROM portal_stats WHERE stat_key = 'total_registrations'"
+    ])
+]
+
+
+def _ensure_migrations_table(cursor):
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS schema_migrations (
+            version INT PRIMARY KEY,
+            description VARCHAR(200) NOT NULL,
+            applied_at DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+
+
+def applied_versions(cursor):
+    _ensure_migrations_table(cursor)
+    cursor.execute("SELECT version FROM schema_migrations")
+    return {row[0] for row in cursor.fetchall()}
+
+
+def upgrade(db, echo=print):
+    """Apply every pending migration in order. Returns the versions applied."""
+    cursor = db.cursor()
+    done = applied_versions(cursor)
+    applied = []
+    for version, description, steps in MIGRATIONS:
+        if version in done:
+            continue
+        problems = [problem for problem in (step.precheck(cursor) for step in steps if hasattr(step, 'precheck')) if problem]
+        if problems:
+            raise MigrationError(f"Migration {version} ({description}) cannot be applied until the data is cleaned up:\n  "
+                                 + "\n  ".join(problems))
+        echo(f"Applying migration {version}: {description}")
+        for step in steps:
+            # MySQL DDL commits implicitly, so every step must be safe to re-run after a failure
+            if callable(step):
+                step(cursor)
+            else:
+                cursor.execute(step)
+        cursor.execute("INSERT INTO schema_migrations (version, description) VALUES (%s, %s)", (version, description))
+        db.commit()
+        applied.append(version)
+    return applied
+
+
+def init_app(app):
+    if app.config.get('DB_AUTO_MIGRATE', True):
+        # The routes assume the latest schema, so a database that cannot be brought up to date
+        # stops the app here rather than failing query by query later.
+        db = get_pooled_connection()
+        try:
+            upgrade(db)
+        except Exception as e:
+            raise RuntimeError(f"Database migrations failed; the app will not start on a partly migrated schema.\n{e}") from e
+        finally:
+            db.close()
+
+    @app.cli.command('db-upgrade')
+    def db_upgrade_command():
+        """Apply pending schema migrations."""
+        db = get_pooled_connection()
+        try:
+            applied = upgrade(db, echo=click.echo)
+        except MigrationError as e:
+            raise click.ClickException(str(e))
+        finally:
+            db.close()
+        click.echo(f"Applied {len(applied)} migration(s)." if applied else "Schema is up to date.")
+
+    @app.cli.command('db-status')
+    def db_status_command():
+        """List migrations and whether they have been applied."""
+        db = get_pooled_connection()
+        try:
+            done = applied_versions(db.cursor())
+        finally:
+            db.close()
+        for version, description, _ in MIGRATIONS:
+            click.echo(f"[{'x' if version in done else ' '}] {version:3d}  {description}")
@@ -0,0 +1,131 @@
+import click
+from models.db import get_pooled_connection
+
+TOTALS = ['total_students', 'total_faculty', 'total_events', 'pending_ods']
+
+# Every function below takes the caller's connection so the counters change in the same
+# transaction as the rows they count. Registrations are only counted per event: a campus-wide
+# counter row would make every registration wait on one row lock. The total is summed on read.
+
+def bump_total(db, key, delta=1):
+    cursor = db.cursor()
+    cursor.execute("""
+        INSERT INTO portal_stats (stat_key, stat_value) VALUES (%s, %s)
+        ON DUPLICATE KEY UPDATE stat_value = stat_value + VALUES(stat_value)
+    """, (key, delta))
+
+def record_registration(db, event_id, delta=1):
+    cursor = db.cursor()
+    cursor.execute("""
+        INSERT INTO event_stats (event_id, registration_count) VALUES (%s, %s)
+        ON DUPLICATE KEY UPDATE registration_count = registration_count + VALUES(registration_count)
+    """, (event_id, delta))
+
+def claim_seat(db, event_id):
+    """
+    Count one registration if the event has room. The capacity check is part of the UPDATE,
+    so concurrent registrations serialise on the event_stats row and can never oversell.
+    Returns False when the event is full.
+    """
+    cursor = db.cursor()
+    for _ in range(2):
+        cursor.execute("""
+            UPDATE event_stats es JOIN events e ON e.event_id = es.event_id
+            SET es.registration_count = es.registration_count + 1
+            WHERE es.event_id = %s AND (e.capacity IS NULL OR es.registration_count < e.capacity)
+        """, (event_id,))
+        if cursor.rowcount:
+            return True
+        cursor.execute("SELECT 1 FROM event_stats WHERE event_id=%s", (event_id,))
+        if cursor.fetchone():
+            return False
+        # Counter row missing (event predates the stats table): create it and try once more
+        cursor.execute("INSERT IGNORE INTO event_stats (event_id) VALUES (%s)", (event_id,))
+    return False
+
+def record_attendance(db, event_id, delta=1):
+    cursor = db.cursor()
+    cursor.execute("""
+        INSERT INTO event_stats (event_id, attendance_count) VALUES (%s, %s)
+        ON DUPLICATE KEY UPDATE attendance_count = attendance_count + VALUES(attendance_count)
+    """, (event_id, delta))
+
+def record_event_created(db, event_id):
+    cursor = db.cursor()
+    cursor.execute("INSERT IGNORE INTO event_stats (event_id) VALUES (%s)", (event_id,))
+    bump_total(db, 'total_events', 1)
+
+def record_event_deleted(db, event_id):
+    """Drop the event's counters, and with them its registrations from the total."""
+    cursor = db.cursor()
+    cursor.execute("DELETE FROM event_stats WHERE event_id=%s", (event_id,))
+    bump_total(db, 'total_events', -1)
+
+def totals(db):
+    cursor = db.cursor(dictionary=True)
+    cursor.execute("SELECT stat_key, stat_value FROM portal_stats")
+    stats = {key: 0 for key in TOTALS}
+    for row in cursor.fetchall():
+        stats[row['stat_key']] = int(row['stat_value'])
+    cursor.execute("SELECT COALESCE(SUM(registration_count), 0) AS total FROM event_stats")
+    stats['total_registrations'] = int(cursor.fetchone()['total'])
+    return stats
+
+def dashboard_stats(db):
+    """Totals and per-event analytics for the admin dashboard, read from the counters."""
+    stats = totals(db)
+    cursor = db.cursor(dictionary=True)
+    cursor.execute("""
+        SELECT e.event_name,
+               COALESCE(es.registration_count, 0) as total_reg,
+               COALESCE(es.attendance_count, 0) as attended
+        FROM events e
+        LEFT JOIN event_stats es ON e.event_id = es.event_id
+        WHERE e.deleted_at IS NULL
+    """)
+    return stats, cursor.fetchall()
+
+def rebuild(db):
+    """Recompute every counter from the base tables, repairing any drift."""
+    cursor = db.cursor()
+    cursor.execute("DELETE FROM event_stats")
+    cursor.execute("""
+        INSERT INTO event_stats (event_id, registration_count, attendance_count)
+        SELECT e.event_id,
+               COUNT(r.registration_id),
+               COALESCE(SUM(CASE WHEN r.attendance = 'Present' THEN 1 ELSE 0 END), 0)
+        FROM events e
+        LEFT JOIN registrations r ON e.event_id = r.event_id
+        GROUP BY e.event_id
+    """)
+    cursor.execute("DELETE FROM portal_stats")
+    cursor.execute("""
+        INSERT INTO portal_stats (stat_key, stat_value)
+        SELECT 'total_students', COUNT(*) FROM student
+        UNION ALL SELECT 'total_faculty', COUNT(*) FROM faculty
+        UNION ALL SELECT 'total_events', COUNT(*) FROM events
+        UNION ALL SELECT 'pending_ods', COUNT(*) FROM onduty_requests WHERE status='Pending'
+    """)
+    db.commit()
+
+def init_app(app):
+    try:
+        db = get_pooled_connection()
+        cursor = db.cursor()
+        cursor.execute("SELECT COUNT(*) FROM portal_stats")
+        if cursor.fetchone()[0] == 0:
+            rebuild(db)
+        db.commit()
+        db.close()
+    except Exception as e:
+        print(f"Error seeding statistics: {e}")
+
+    @app.cli.command('rebuild-stats')
+    def rebuild_stats_command():
+        """Recompute event_stats and portal_stats from the base tables."""
+        db = get_pooled_connection()
+        try:
+            rebuild(db)
+        finally:
+            db.close()
+        click.echo("Statistics rebuilt.")
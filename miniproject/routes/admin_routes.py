@@ -1,13 +1,21 @@
-from flask import Blueprint, render_template, request, redirect, url_for, session, flash, abort, current_app
-from models.db import get_db_connection
-from utils.helpers import login_required, add_notification, notify_admins
-from services.email_service import send_email
+from flask import Blueprint, render_template, request, redirect, url_for, session, flash, abort, current_app, make_response, send_file
+from models.db import get_db_connection, pool_stats, IntegrityError
+from models import stats
+from utils.helpers import login_required, notify_admins
+from utils.ratelimit import rate_limit
+from services.email_service import outbox_stats
+from services.fanout_service import announce_event
+from services import jobs, dashboard_service, export_service, certificate_service, onduty_service, directory_service, import_service, deletion_service, timetable_service, scheduler_service, seating_service, schedule_service, registration_service
 from werkzeug.security import generate_password_hash
-from datetime import timedelta
-import time
+from werkzeug.utils import secure_filename
+from datetime import datetime, timedelta
 
 admin_bp = Blueprint('admin', __name__)
 
+CERTIFICATES_PAGE_SIZE = 50
+ONDUTY_PAGE_SIZE = 50
+USERS_PAGE_SIZE = 50
+
 @admin_bp.route('/admin/dashboard')
 @login_required
 def admin_dashboard():
@@ -17,41 +25,18 @@ def admin_dashboard():
     db = get_db_connection()
     cursor = db.cursor(dictionary=True)
     
-    stats = {}
-    cursor.execute("SELECT COUNT(*) as count FROM student")
-    stats['total_students'] = cursor.fetchone()['count']
-    
-    cursor.execute("SELECT COUNT(*) as count FROM faculty")
-    stats['total_faculty'] = cursor.fetchone()['count']
-    
-    cursor.execute("SELECT COUNT(*) as count FROM events")
-    stats['total_events'] = cursor.fetchone()['count']
-    
-    cursor.execute("SELECT COUNT(*) as count FROM registrations")
-    stats['total_registrations'] = cursor.fetchone()['count']
-
-    cursor.execute("SELECT COUNT(*) as count FROM onduty_requests WHERE status='Pending'")
-    stats['pending_ods'] = cursor.fetchone()['count']
+    # Totals and per-event counts are maintained incrementally (models/stats.py)
+    totals, analytics_data = stats.dashboard_stats(db)
 
     cursor.execute("SELECT faculty_id, name, department FROM faculty ORDER BY name")
     faculty_list = cursor.fetchall()
-
-    cursor.execute("""
-        SELECT 
-            e.event_name,
-            COUNT(r.registration_id) as total_reg,
-            SUM(CASE WHEN r.attendance = 'Present' THEN 1 ELSE 0 END) as attended
-        FROM events e
-        LEFT JOIN registrations r ON e.event_id = r.event_id
-        GROUP BY e.event_id, e.event_name
-    """)
-    analytics_data = cursor.fetchall()
     
     db.close()
-    return render_template('admin_dashboard.html', faculty_list=faculty_list, analytics_data=analytics_data, **stats)
+    return render_template('admin_dashboard.html', faculty_list=faculty_list, analytics_data=analytics_data, **totals)
 
 @admin_bp.route('/create-event', methods=['GET', 'POST'])
 @login_required
+@rate_limit('create-event', 10, per=60, key='user', methods=('POST',))
 def create_event():
     if not session.get('is_admin'):
         abort(403)
@@ -60,57 +45,40 @@ def create_event():
     cursor = db.cursor(dictionary=True)
 
     if request.method == 'POST':
-        time.sleep(3) 
         event_name = request.form['event_name']
         event_date = request.form['event_date']
         location = request.form['location']
         description = request.form['description']
         coordinator_id = request.form['coordinator_id']
+        # Blank means unlimited seats
+        capacity = request.form.get('capacity', type=int)
+        if capacity is not None and capacity < 1:
+            db.close()
+            flash("Capacity must be at least 1.", "error")
+            return redirect(url_for('admin.admin_dashboard'))
+        # Times are optional, but come as a pair: only timed events are checked for clashes
+        start_time = request.form.get('start_time') or None
+        end_time = request.form.get('end_time') or None
+        if (start_time is None) != (end_time is None) or (start_time and start_time >= end_time):
+            db.close()
+            flash("Give both a start and an end time, with the end after the start.", "error")
+            return redirect(url_for('admin.admin_dashboard'))
 
         try:
             cursor.execute("""
-                INSERT INTO events (event_name, event_date, location, description, coordinator_id)
-                VALUES (%s, %s, %s, %s, %s)
-            """, (event_name, event_date, location, description, coordinator_id))
+                INSERT INTO events (event_name, event_date, start_time, end_time, location, description, coordinator_id, capacity)
+                VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
+            """, (event_name, event_date, start_time, end_time, location, description, coordinator_id, capacity))
+            event_id = cursor.lastrowid
+            stats.record_event_created(db, event_id)
             db.commit()
 
-            cursor.execute("SELECT email FROM student")
-            students = cursor.fetchall()
-            
-            # Send Email (Simplified batch or loop in thread)
-            # send_email handles one by one in thread? 
-            # We should probably optimise but sticking to loop for now.
-            cursor.execute("SELECT student_id FROM student")
-            student_ids = cursor.fetchall()
-            
-            # Notifications
-            add_notification(coordinator_id, 'faculty', f"Assigned Coordinator: {event_name}.")
-            for s in student_ids:
-                add_notification(s['student_id'], 'student', f"New Event: {event_name} on {event_date}.")
-                
-            cursor.execute("SELECT faculty_id FROM faculty WHERE faculty_id != %s", (coordinator_id,))
-            faculty_ids = cursor.fetchall()
-            for f in faculty_ids:
-                add_notification(f['faculty_id'], 'faculty', f"Event Added: {event_name}.")
-                
-            # Emailing logic here is heavy. In app.py it created thread per student.
-            # I'll just skip bulk email for now or reimplement properly later.
-            # Or use send_email in loop?
-            for student in students:
-                body = f"""
-A new event has been added!
-
-Event Name: {event_name}
-Date: {event_date}
-Location: {location}
-Description: {description}
-
-Login to register now!
-"""
-                send_email("New Event Announcement!", [student['email']], body=body)
+            dashboard_service.invalidate_events()
+            dashboard_service.invalidate_faculty(coordinator_id)
 
+            job = announce_event(event_id)
             db.close()
-            flash("Event created and announcements sent!", "success")
+            flash(f"Event created! Announcements are being sent in the background (job {job.id}).", "success")
             return redirect(url_for('admin.admin_dashboard'))
         except Exception as e:
             db.rollback()
@@ -125,15 +93,15 @@ Login to register now!
 
 @admin_bp.route('/admin/delete-event/<int:event_id>')
 @login_required
+@rate_limit('admin-delete', 30, per=60, key='user')
 def delete_event(event_id):
     if not session.get('is_admin'):
         abort(403)
-    time.sleep(3)
     
     db = get_db_connection()
     cursor = db.cursor(dictionary=True)
     try:
-        cursor.execute("SELECT event_name FROM events WHERE event_id=%s", (event_id,))
+        cursor.execute("SELECT event_name, coordinator_id FROM events WHERE event_id=%s AND deleted_at IS NULL", (event_id,))
         event = cursor.fetchone()
         if not event:
             db.close()
@@ -141,10 +109,11 @@ def delete_event(event_id):
             # Redirect to events? events is likely public or student
             return redirect(url_for('public.events')) 
 
-        cursor.execute("DELETE FROM registrations WHERE event_id=%s", (event_id,))
-        cursor.execute("DELETE FROM events WHERE event_id=%s", (event_id,))
-        db.commit()
-        flash(f"Event '{event['event_name']}' and all related records deleted successfully.", "success")
+        job = deletion_service.delete(db, 'event', event_id, event['coordinator_id'])
+        if job:
+            flash(f"Event '{event['event_name']}' removed. Its records are being deleted in the background (job {job.id}).", "success")
+        else:
+            flash(f"Event '{event['event_name']}' and all related records deleted successfully.", "success")
     except Exception as e:
         db.rollback()
         flash(f"Error deleting event: {str(e)}", "error")
@@ -155,12 +124,12 @@ def delete_event(event_id):
 
 @admin_bp.route('/admin/register-faculty', methods=['GET', 'POST'])
 @login_required
+@rate_limit('register-faculty', 10, per=60, key='user', methods=('POST',))
 def register_faculty():
     if not session.get('is_admin'):
         abort(403)
 
     if request.method == 'POST':
-        time.sleep(3)
         name = request.form['name']
         email = request.form['email']
         department = request.form['department']
@@ -168,12 +137,6 @@ def register_faculty():
         
         db = get_db_connection()
         cursor = db.cursor(dictionary=True)
-        
-        cursor.execute("SELECT faculty_id FROM faculty WHERE email=%s", (email,))
-        if cursor.fetchone():
-            db.close()
-            flash("Faculty email already registered", "error")
-            return redirect(url_for('admin.register_faculty'))
 
         hashed = generate_password_hash(password)
         
@@ -182,10 +145,17 @@ def register_faculty():
                 INSERT INTO faculty (name, email, department, password, is_admin)
                 VALUES (%s, %s, %s, %s, 0)
             """, (name, email, department, hashed))
+            stats.bump_total(db, 'total_faculty', 1)
             db.commit()
             db.close()
             flash("Faculty member registered successfully", "success")
             return redirect(url_for('admin.admin_dashboard'))
+        except IntegrityError:
+            # uq_faculty_email
+            db.rollback()
+            db.close()
+            flash("Faculty email already registered", "error")
+            return redirect(url_for('admin.register_faculty'))
         except Exception as e:
             db.rollback()
             db.close()
@@ -200,15 +170,92 @@ def manage_users():
     if not session.get('is_admin'):
         abort(403)
         
+    filters = _user_filters()
     db = get_db_connection()
     cursor = db.cursor(dictionary=True)
-    cursor.execute("SELECT * FROM student ORDER BY name")
-    students = cursor.fetchall()
-    cursor.execute("SELECT * FROM faculty ORDER BY name")
-    faculty = cursor.fetchall()
+    students, students_next = directory_service.search_students(
+        cursor, filters['q'], filters['department'], filters['semester'], limit=USERS_PAGE_SIZE)
+    faculty, faculty_next = directory_service.search_faculty(
+        cursor, filters['q'], filters['department'], limit=USERS_PAGE_SIZE)
+    departments = directory_service.departments(cursor)
+    totals = stats.totals(db)
     db.close()
     
-    return render_template('manage_users.html', students=students, faculty=faculty)
+    return render_template('manage_users.html', students=students, faculty=faculty,
+                           students_next=students_next, faculty_next=faculty_next,
+                           departments=departments, filters=filters,
+                           total_students=totals['total_students'], total_faculty=totals['total_faculty'])
+
+def _user_filters():
+    return {
+        'q': (request.args.get('q') or '').strip()[:100],
+        'department': request.args.get('department') or None,
+        'semester': request.args.get('semester', type=int)
+    }
+
+@admin_bp.route('/admin/users.json')
+@login_required
+def users_json():
+    """Next page for incremental loading: ?type=student|faculty, the page filters, after_name and after_id."""
+    if not session.get('is_admin'):
+        abort(403)
+    filters = _user_filters()
+    after = None
+    if request.args.get('after_id', type=int) is not None:
+        after = (request.args.get('after_name', ''), request.args.get('after_id', type=int))
+    limit = min(request.args.get('limit', USERS_PAGE_SIZE, type=int), 200)
+
+    db = get_db_connection()
+    cursor = db.cursor(dictionary=True)
+    if request.args.get('type') == 'faculty':
+        rows, next_after = directory_service.search_faculty(cursor, filters['q'], filters['department'], after, limit)
+    else:
+        rows, next_after = directory_service.search_students(
+            cursor, filters['q'], filters['department'], filters['semester'], after, limit)
+    db.close()
+    return {'users': rows, 'next': next_after}
+
+@admin_bp.route('/admin/import-students', methods=['GET', 'POST'])
+@login_required
+@rate_limit('import-students', 5, per=60, key='user', methods=('POST',))
+def import_students():
+    if not session.get('is_admin'):
+        abort(403)
+    if request.method == 'POST':
+        upload = request.files.get('file')
+        mode = request.form.get('mode', 'create')
+        if not upload or not upload.filename or not upload.filename.lower().endswith(('.csv', '.xlsx')):
+            flash("Upload a .csv or .xlsx file.", "error")
+        elif mode not in import_service.MODES:
+            flash("Unknown import mode.", "error")
+        else:
+            job = import_service.start(upload, mode)
+            flash(f"Import started (job {job.id[:8]}). Progress is shown below.", "success")
+        return redirect(url_for('admin.import_students'))
+
+    imports = [j for j in jobs.recent_jobs(50) if j['name'].startswith('student-import')]
+    return render_template('admin_import.html', imports=imports)
+
+@admin_bp.route('/admin/import-students/template/<string:mode>')
+@login_required
+def import_template(mode):
+    if not session.get('is_admin') or mode not in import_service.MODES:
+        abort(403)
+    return make_response(import_service.template_csv(mode), 200, {
+        "Content-Type": "text/csv",
+        "Content-Disposition": f"attachment; filename=students_{mode}_template.csv"
+    })
+
+@admin_bp.route('/admin/import-students/<string:job_id>/errors')
+@login_required
+def import_errors(job_id):
+    if not session.get('is_admin'):
+        abort(403)
+    job = jobs.get_job(job_id)
+    path = import_service.report_path(job) if job else None
+    if not path:
+        abort(404)
+    return send_file(path, mimetype='text/csv', as_attachment=True, download_name=f"import_errors_{job_id[:8]}.csv")
 
 @admin_bp.route('/admin/edit-student/<int:id>', methods=['POST'])
 @login_required
@@ -232,6 +279,9 @@ def edit_student(id):
         """, (name, email, reg_no, dept, sem, id))
         db.commit()
         flash("Student updated successfully", "success")
+    except IntegrityError:
+        db.rollback()
+        flash("Another student already uses that register number or email.", "error")
     except Exception as e:
         db.rollback()
         flash(f"Error updating student: {str(e)}", "error")
@@ -240,18 +290,17 @@ def edit_student(id):
 
 @admin_bp.route('/admin/delete-student/<int:id>')
 @login_required
+@rate_limit('admin-delete', 30, per=60, key='user')
 def delete_student(id):
     if not session.get('is_admin'):
         abort(403)
-    time.sleep(3)
     db = get_db_connection()
-    cursor = db.cursor()
     try:
-        cursor.execute("DELETE FROM feedback WHERE student_id=%s", (id,))
-        cursor.execute("DELETE FROM registrations WHERE student_id=%s", (id,))
-        cursor.execute("DELETE FROM student WHERE student_id=%s", (id,))
-        db.commit()
-        flash("Student deleted successfully", "success")
+        job = deletion_service.delete(db, 'student', id)
+        if job:
+            flash(f"Student is being deleted in the background (job {job.id}).", "success")
+        else:
+            flash("Student deleted successfully", "success")
     except Exception as e:
         db.rollback()
         flash(f"Error deleting student: {str(e)}", "error")
@@ -275,7 +324,12 @@ def edit_faculty(id):
             WHERE faculty_id=%s
         """, (name, email, dept, id))
         db.commit()
+        # Faculty names appear in the cached cohort schedules
+        schedule_service.invalidate()
         flash("Faculty member updated successfully", "success")
+    except IntegrityError:
+        db.rollback()
+        flash("Another faculty member already uses that email.", "error")
     except Exception as e:
         db.rollback()
         flash(f"Error updating faculty: {str(e)}", "error")
@@ -284,10 +338,10 @@ def edit_faculty(id):
 
 @admin_bp.route('/admin/delete-faculty/<int:id>')
 @login_required
+@rate_limit('admin-delete', 30, per=60, key='user')
 def delete_faculty(id):
     if not session.get('is_admin'):
         abort(403)
-    time.sleep(3)
     if id == session.get('user_id') and session.get('role') == 'faculty':
         flash("You cannot delete your own admin account.", "error")
         return redirect(url_for('admin.manage_users'))
@@ -295,7 +349,10 @@ def delete_faculty(id):
     cursor = db.cursor()
     try:
         cursor.execute("DELETE FROM faculty WHERE faculty_id=%s", (id,))
+        if cursor.rowcount:
+            stats.bump_total(db, 'total_faculty', -1)
         db.commit()
+        schedule_service.invalidate()
         flash("Faculty member deleted successfully", "success")
     except Exception as e:
         db.rollback()
@@ -310,6 +367,75 @@ def system_settings():
         abort(403)
     return render_template('system_settings.html')
 
+@admin_bp.route('/admin/metrics')
+@login_required
+def system_metrics():
+    if not session.get('is_admin'):
+        abort(403)
+    return {'db_pool': pool_stats(), 'jobs': jobs.recent_jobs(), 'email_outbox': outbox_stats()}
+
+@admin_bp.route('/admin/jobs/<string:job_id>')
+@login_required
+def job_status(job_id):
+    if not session.get('is_admin'):
+        abort(403)
+    job = jobs.get_job(job_id)
+    if not job:
+        abort(404)
+    return job.to_dict()
+
+@admin_bp.route('/admin/email-outbox')
+@login_required
+def email_outbox():
+    if not session.get('is_admin'):
+        abort(403)
+    db = get_db_connection()
+    cursor = db.cursor(dictionary=True)
+    cursor.execute("""
+        SELECT outbox_id, subject, recipients, attempts, last_error, created_at, next_attempt_at
+        FROM email_outbox
+        WHERE status = 'dead'
+        ORDER BY outbox_id DESC
+        LIMIT 200
+    """)
+    dead_letters = cursor.fetchall()
+    db.close()
+    return render_template('admin_outbox.html', dead_letters=dead_letters, stats=outbox_stats())
+
+@admin_bp.route('/admin/email-outbox/retry', methods=['POST'])
+@login_required
+def retry_dead_letters():
+    if not session.get('is_admin'):
+        abort(403)
+    outbox_id = request.form.get('outbox_id')
+    db = get_db_connection()
+    cursor = db.cursor()
+    try:
+        if outbox_id:
+            cursor.execute("""
+                UPDATE email_outbox SET status='pending', attempts=0, next_attempt_at=NOW()
+                WHERE outbox_id=%s AND status='dead'
+            """, (outbox_id,))
+        else:
+            cursor.execute("""
+                UPDATE email_outbox SET status='pending', attempts=0, next_attempt_at=NOW()
+                WHERE status='dead'
+            """)
+        db.commit()
+        flash(f"{cursor.rowcount} email(s) re-queued.", "success")
+    except Exception as e:
+        db.rollback()
+        flash(f"Error re-queueing emails: {e}", "error")
+    db.close()
+    return redirect(url_for('admin.email_outbox'))
+
+@admin_bp.route('/admin/export-attendance')
+@login_required
+def export_all_attendance():
+    if not session.get('is_admin'):
+        abort(403)
+    return export_service.all_events_export(request.args.get('format', 'xlsx'))
+
 @admin_bp.route('/admin/feedbacks')
 @login_required
 def admin_feedbacks():
@@ -322,6 +448,7 @@ def admin_feedbacks():
         FROM feedback f
         JOIN events e ON f.event_id = e.event_id
         JOIN student s ON f.student_id = s.student_id
+        WHERE e.deleted_at IS NULL
         ORDER BY f.created_at DESC
     """)
     feedbacks = cursor.fetchall()
@@ -360,11 +487,8 @@ def delete_course(course_id):
     if not session.get('is_admin'):
         abort(403)
     db = get_db_connection()
-    cursor = db.cursor()
     try:
-        cursor.execute("DELETE FROM timetable WHERE course_id=%s", (course_id,))
-        cursor.execute("DELETE FROM courses WHERE course_id=%s", (course_id,))
-        db.commit()
+        deletion_service.delete(db, 'course', course_id)
         flash("Course deleted.", "success")
     except Exception as e:
         db.rollback()
@@ -385,37 +509,39 @@ def manage_timetable():
     db = get_db_connection()
     cursor = db.cursor(dictionary=True)
     if request.method == 'POST':
-        course_id = request.form['course_id']
-        faculty_id = request.form['faculty_id']
-        day = request.form['day']
-        start_time = request.form['start_time']
-        end_time = request.form['end_time']
-        classroom = request.form['classroom']
-        cursor.execute("""
-            SELECT timetable_id FROM timetable
-            WHERE faculty_id=%s
-            AND day=%s
-            AND (
-                (start_time < %s AND end_time > %s)
-            )
-        """, (faculty_id, day, end_time, start_time))
-        conflict = cursor.fetchone()
-        if conflict:
-             flash("Time conflict detected! Faculty is already booked for this slot.", "error")
-             db.close()
-             return redirect(url_for('admin.manage_timetable'))
+        courses = timetable_service.courses_by_id(cursor, [request.form.get('course_id', type=int) or 0])
+        slot, error = timetable_service.make_slot(request.form, courses)
+        if error:
+            db.close()
+            flash(error, "error")
+            return redirect(url_for('admin.manage_timetable'))
+        # Faculty, classroom and cohort clashes, checked against the cached interval index once its
+        # version has been compared with the database under the lock
+        if not timetable_service.acquire_write_lock(db):
+            db.close()
+            flash("The timetable is being updated by someone else. Please try again.", "error")
+            return redirect(url_for('admin.manage_timetable'))
         try:
-            cursor.execute("""
-                INSERT INTO timetable (course_id, faculty_id, day, start_time, end_time, classroom)
-                VALUES (%s, %s, %s, %s, %s, %s)
-            """, (course_id, faculty_id, day, start_time, end_time, classroom))
-            db.commit()
-            flash("Schedule assigned successfully.", "success")
+            conflicts = timetable_service.check_slot(cursor, slot)
+            if conflicts:
+                for message in conflicts:
+                    flash(f"Time conflict detected! {message}.", "error")
+            else:
+                version = timetable_service.insert_slots(cursor, [slot])
+                db.commit()
+                timetable_service.slots_added([slot], version)
+                schedule_service.invalidate()
+                flash("Schedule assigned successfully.", "success")
         except Exception as e:
             db.rollback()
             flash(f"Error assigning schedule: {e}", "error")
+        finally:
+            timetable_service.release_write_lock(db)
         db.close()
         return redirect(url_for('admin.manage_timetable'))
+    return _timetable_page(db, cursor)
+
+def _timetable_page(db, cursor, **context):
     cursor.execute("""
         SELECT t.*, c.course_name, c.department, c.semester, f.name as faculty_name
         FROM timetable t
@@ -429,7 +555,171 @@ def manage_timetable():
     cursor.execute("SELECT faculty_id, name, department FROM faculty ORDER BY name")
     faculty_list = cursor.fetchall()
     db.close()
-    return render_template('admin_timetable.html', timetable=timetable, courses=courses, faculty_list=faculty_list)
+    return render_template('admin_timetable.html', timetable=timetable, courses=courses, faculty_list=faculty_list, **context)
+
+@admin_bp.route('/admin/manage-timetable/upload', methods=['POST'])
+@login_required
+@rate_limit('timetable-upload', 10, per=60, key='user')
+def upload_timetable():
+    """Validate a whole term's slots from a CSV and, with action=load, insert them if nothing clashes."""
+    if not session.get('is_admin'):
+        abort(403)
+    upload = request.files.get('file')
+    if not upload or not upload.filename.lower().endswith('.csv'):
+        flash("Upload a .csv file.", "error")
+        return redirect(url_for('admin.manage_timetable'))
+    load = request.form.get('action') == 'load'
+
+    db = get_db_connection()
+    cursor = db.cursor(dictionary=True)
+    if not timetable_service.acquire_write_lock(db):
+        db.close()
+        flash("The timetable is being updated by someone else. Please try again.", "error")
+        return redirect(url_for('admin.manage_timetable'))
+    try:
+        slots, report = timetable_service.validate_rows(cursor, timetable_service.read_csv(upload))
+        loaded = 0
+        if load and slots and not report:
+            timetable_service.insert_slots(cursor, slots)
+            db.commit()
+            timetable_service.invalidate()
+            schedule_service.invalidate()
+            loaded = len(slots)
+    except Exception as e:
+        db.rollback()
+        timetable_service.release_write_lock(db)
+        db.close()
+        flash(f"Error reading timetable: {e}", "error")
+        return redirect(url_for('admin.manage_timetable'))
+    timetable_service.release_write_lock(db)
+
+    if loaded:
+        flash(f"Loaded {loaded} slot(s).", "success")
+    elif report:
+        flash(f"Found {len(report)} problem(s) in {upload.filename}; nothing was loaded.", "error")
+    elif slots:
+        flash(f"All {len(slots)} slot(s) in {upload.filename} are free of clashes.", "success")
+    else:
+        flash("The file has no slots.", "info")
+    return _timetable_page(db, cursor, upload_report=report, upload_name=upload.filename)
+
+@admin_bp.route('/admin/manage-timetable/template')
+@login_required
+def timetable_template():
+    if not session.get('is_admin'):
+        abort(403)
+    return make_response(timetable_service.template_csv(), 200, {
+        "Content-Type": "text/csv",
+        "Content-Disposition": "attachment; filename=timetable_template.csv"
+    })
+
+@admin_bp.route('/admin/manage-timetable/generate', methods=['POST'])
+@login_required
+@rate_limit('timetable-generate', 5, per=60, key='user')
+def generate_timetable():
+    """Draft a clash-free timetable for the uploaded course requirements around the existing slots."""
+    if not session.get('is_admin'):
+        abort(403)
+    upload = request.files.get('file')
+    rooms = list(dict.fromkeys(r.strip() for r in request.form.get('rooms', '').split(',') if r.strip()))
+    day_names = [d for d in timetable_service.DAYS if d in request.form.getlist('days')]
+    periods = request.form.get('periods', 7, type=int)
+    period_minutes = request.form.get('period_minutes', 60, type=int)
+    budget = min(request.form.get('budget', 10, type=int), scheduler_service.MAX_BUDGET)
+    try:
+        day_start = timetable_service.to_minutes(request.form.get('day_start', '09:00'))
+    except (ValueError, IndexError):
+        day_start = None
+    if not upload or not upload.filename.lower().endswith('.csv'):
+        flash("Upload the course requirements as a .csv file.", "error")
+    elif not rooms or not day_names:
+        flash("List at least one classroom and one day.", "error")
+    elif day_start is None or periods < 1 or period_minutes < 10 or day_start + periods * period_minutes > 24 * 60:
+        flash("The periods must fit within the day.", "error")
+    elif budget < 1:
+        flash("The time budget must be at least one second.", "error")
+    else:
+        db = get_db_connection()
+        cursor = db.cursor(dictionary=True)
+        courses = timetable_service.courses_by_id(cursor)
+        cursor.execute("SELECT faculty_id, name FROM faculty")
+        faculty = {row['faculty_id']: row['name'] for row in cursor.fetchall()}
+        requirements, errors = scheduler_service.read_requirements(upload, courses, faculty)
+        index = timetable_service.conflict_index(cursor)
+        db.close()
+        if errors:
+            for error in errors[:10]:
+                flash(error, "error")
+        elif not requirements:
+            flash("The requirements file has no courses.", "info")
+        else:
+            blocked = scheduler_service.blocked_periods(index, day_names, day_start, period_minutes, periods)
+            job = scheduler_service.start(requirements, faculty, rooms, day_names, day_start, period_minutes, periods, blocked, budget)
+            return redirect(url_for('admin.timetable_draft', job_id=job.id))
+    return redirect(url_for('admin.manage_timetable'))
+
+@admin_bp.route('/admin/manage-timetable/generate/<string:job_id>')
+@login_required
+def timetable_draft(job_id):
+    if not session.get('is_admin'):
+        abort(403)
+    job = jobs.get_job(job_id)
+    if not job or job.name != 'timetable-generate':
+        abort(404)
+    return render_template('admin_timetable_draft.html', job=job.to_dict())
+
+@admin_bp.route('/admin/manage-timetable/generate/<string:job_id>/apply', methods=['POST'])
+@login_required
+def apply_timetable_draft(job_id):
+    """Write a generated draft into the timetable, re-checked against whatever changed since it was drafted."""
+    if not session.get('is_admin'):
+        abort(403)
+    job = jobs.get_job(job_id)
+    if not job or job.name != 'timetable-generate' or not job.result:
+        abort(404)
+    db = get_db_connection()
+    cursor = db.cursor(dictionary=True)
+    if not timetable_service.acquire_write_lock(db):
+        db.close()
+        flash("The timetable is being updated by someone else. Please try again.", "error")
+        return redirect(url_for('admin.timetable_draft', job_id=job_id))
+    try:
+        slots, report = timetable_service.validate_rows(cursor, enumerate(job.result['slots'], 1))
+        if report:
+            db.rollback()
+        else:
+            timetable_service.insert_slots(cursor, slots)
+            db.commit()
+            timetable_service.invalidate()
+            schedule_service.invalidate()
+    except Exception as e:
+        db.rollback()
+        timetable_service.release_write_lock(db)
+        db.close()
+        flash(f"Error applying timetable: {e}", "error")
+        return redirect(url_for('admin.timetable_draft', job_id=job_id))
+    timetable_service.release_write_lock(db)
+    if report:
+        flash(f"The draft clashes in {len(report)} place(s) and was not applied.", "error")
+        return _timetable_page(db, cursor, upload_report=report, upload_name="the generated draft")
+    db.close()
+    flash(f"Added {len(slots)} slot(s) to the timetable.", "success")
+    return redirect(url_for('admin.manage_timetable'))
+
+@admin_bp.route('/admin/manage-timetable/requirements-template')
+@login_required
+def timetable_requirements_template():
+    if not session.get('is_admin'):
+        abort(403)
+    db = get_db_connection()
+    cursor = db.cursor(dictionary=True)
+    cursor.execute("SELECT course_id, course_name, department, semester FROM courses ORDER BY department, semester, course_name")
+    courses = cursor.fetchall()
+    db.close()
+    return make_response(scheduler_service.template_csv(courses), 200, {
+        "Content-Type": "text/csv",
+        "Content-Disposition": "attachment; filename=timetable_requirements.csv"
+    })
 
 @admin_bp.route('/admin/delete-timetable-slot/<int:slot_id>')
 @login_required
@@ -440,7 +730,10 @@ def delete_timetable_slot_admin(slot_id):
     cursor = db.cursor()
     try:
         cursor.execute("DELETE FROM timetable WHERE timetable_id=%s", (slot_id,))
+        timetable_service.bump_version(cursor)
         db.commit()
+        timetable_service.invalidate()
+        schedule_service.invalidate()
         flash("Schedule deleted.", "success")
     except Exception as e:
         db.rollback()
@@ -453,18 +746,81 @@ def delete_timetable_slot_admin(slot_id):
 def admin_onduty():
     if not session.get('is_admin'):
         abort(403)
+    # Keyset pagination, newest first; filter by status / event
+    status = request.args.get('status', 'Pending')
+    event_id = request.args.get('event_id', type=int)
+    before = request.args.get('before', type=int)
+    conditions, params = ["e.deleted_at IS NULL"], []
+    if status in ('Pending', 'Approved', 'Rejected'):
+        conditions.append("od.status = %s")
+        params.append(status)
+    if event_id:
+        conditions.append("od.event_id = %s")
+        params.append(event_id)
+    if before:
+        conditions.append("od.request_id < %s")
+        params.append(before)
+    where = f"WHERE {' AND '.join(conditions)}"
+
     db = get_db_connection()
     cursor = db.cursor(dictionary=True)
-    cursor.execute("""
+    cursor.execute(f"""
         SELECT od.*, s.name as student_name, s.register_number, s.department, e.event_name, e.event_date
         FROM onduty_requests od
         JOIN student s ON od.student_id = s.student_id
         JOIN events e ON od.event_id = e.event_id
-        ORDER BY od.request_date DESC
-    """)
+        {where}
+        ORDER BY od.request_id DESC
+        LIMIT %s
+    """, params + [ONDUTY_PAGE_SIZE + 1])
     requests = cursor.fetchall()
+    next_before = None
+    if len(requests) > ONDUTY_PAGE_SIZE:
+        requests = requests[:ONDUTY_PAGE_SIZE]
+        next_before = requests[-1]['request_id']
+
+    cursor.execute("""
+        SELECT e.event_id, e.event_name, COUNT(*) as pending
+        FROM onduty_requests od
+        JOIN events e ON od.event_id = e.event_id
+        WHERE od.status = 'Pending' AND e.deleted_at IS NULL
+        GROUP BY e.event_id, e.event_name
+        ORDER BY e.event_name
+    """)
+    pending_events = cursor.fetchall()
+    db.close()
+    return render_template('admin_onduty.html', requests=requests, pending_events=pending_events,
+                           status=status, event_id=event_id, next_before=next_before)
+
+@admin_bp.route('/admin/onduty/respond', methods=['POST'])
+@login_required
+def respond_onduty_bulk():
+    """Approve or reject the selected pending requests, or every pending request for an event."""
+    if not session.get('is_admin'):
+        abort(403)
+    new_status = 'Approved' if request.form.get('action') == 'approve' else 'Rejected'
+    event_id = request.form.get('event_id', type=int)
+    try:
+        ids = [int(i) for i in request.form.getlist('request_ids')]
+    except ValueError:
+        flash("Invalid request selection.", "error")
+        return redirect(url_for('admin.admin_onduty'))
+    if not ids and not (request.form.get('scope') == 'event' and event_id):
+        flash("Select the requests to update.", "error")
+        return redirect(url_for('admin.admin_onduty'))
+
+    db = get_db_connection()
+    try:
+        if ids:
+            count = onduty_service.respond(db, new_status, session['user_id'], request_ids=ids)
+        else:
+            count = onduty_service.respond(db, new_status, session['user_id'], event_id=event_id)
+        flash(f"{count} request(s) {new_status}.", "success")
+    except Exception as e:
+        db.rollback()
+        flash(f"Error updating requests: {e}", "error")
     db.close()
-    return render_template('admin_onduty.html', requests=requests)
+    return redirect(url_for('admin.admin_onduty', event_id=event_id) if event_id else url_for('admin.admin_onduty'))
 
 @admin_bp.route('/admin/onduty/respond/<int:req_id>/<string:action>')
 @login_required
@@ -473,21 +829,9 @@ def approve_onduty(req_id, action):
         abort(403)
     new_status = 'Approved' if action == 'approve' else 'Rejected'
     db = get_db_connection()
-    cursor = db.cursor(dictionary=True)
     try:
-        cursor.execute("""
-            SELECT od.student_id, e.event_name 
-            FROM onduty_requests od
-            JOIN events e ON od.event_id = e.event_id
-            WHERE od.request_id = %s
-        """, (req_id,))
-        req_details = cursor.fetchone()
-        cursor.execute("UPDATE onduty_requests SET status=%s, approved_by=%s WHERE request_id=%s", 
-                       (new_status, session['user_id'], req_id))
-        if req_details:
-             msg = f"Your On-Duty request for event '{req_details['event_name']}' has been {new_status} by Admin."
-             add_notification(req_details['student_id'], 'student', msg)
-        db.commit()
+        # A processed request can still be changed from here, so not only pending ones
+        onduty_service.respond(db, new_status, session['user_id'], request_ids=[req_id], pending_only=False)
         flash(f"Request {new_status}.", "success")
     except Exception as e:
         db.rollback()
@@ -514,6 +858,7 @@ def admin_exams():
                 VALUES (%s, %s, %s, %s, %s)
             """, (course_id, exam_date, start_time, end_time, hall))
             db.commit()
+            schedule_service.invalidate()
             flash("Exam scheduled successfully!", "success")
         except Exception as e:
             db.rollback()
@@ -521,7 +866,8 @@ def admin_exams():
         db.close()
         return redirect(url_for('admin.admin_exams'))
     cursor.execute("""
-        SELECT e.*, c.course_name, c.department, c.semester 
+        SELECT e.*, c.course_name, c.department, c.semester,
+        (SELECT COUNT(*) FROM exam_seating es WHERE es.exam_id = e.exam_id) as seated
         FROM exams e 
         JOIN courses c ON e.course_id = c.course_id 
         ORDER BY e.exam_date, e.start_time
@@ -539,19 +885,98 @@ def admin_exams():
                  ex[f] = str(ex[f])
     cursor.execute("SELECT * FROM courses ORDER BY department, course_name")
     courses = cursor.fetchall()
+    cursor.execute("SELECT * FROM exam_halls ORDER BY name")
+    halls = cursor.fetchall()
     db.close()
-    return render_template('admin_exams.html', exams=exams, courses=courses)
+    exam_dates = sorted({str(ex['exam_date']) for ex in exams})
+    return render_template('admin_exams.html', exams=exams, courses=courses, halls=halls, exam_dates=exam_dates)
 
-@admin_bp.route('/admin/delete_exam/<int:exam_id>')
+@admin_bp.route('/admin/exams/halls', methods=['POST'])
 @login_required
-def delete_exam(exam_id):
+def add_exam_hall():
     if not session.get('is_admin'):
         abort(403)
+    name = request.form.get('name', '').strip()
+    capacity = request.form.get('capacity', type=int)
+    seats_per_row = request.form.get('seats_per_row', 10, type=int)
+    if not name or not capacity or capacity < 1 or not seats_per_row or seats_per_row < 1:
+        flash("Give the hall a name, a capacity and a row width.", "error")
+        return redirect(url_for('admin.admin_exams'))
     db = get_db_connection()
     cursor = db.cursor()
     try:
-        cursor.execute("DELETE FROM exams WHERE exam_id=%s", (exam_id,))
+        cursor.execute("INSERT INTO exam_halls (name, capacity, seats_per_row) VALUES (%s, %s, %s)",
+                       (name[:50], capacity, seats_per_row))
         db.commit()
+        flash("Hall added.", "success")
+    except IntegrityError:
+        db.rollback()
+        flash("A hall with that name already exists.", "error")
+    db.close()
+    return redirect(url_for('admin.admin_exams'))
+
+@admin_bp.route('/admin/exams/halls/<int:hall_id>/delete')
+@login_required
+def delete_exam_hall(hall_id):
+    if not session.get('is_admin'):
+        abort(403)
+    db = get_db_connection()
+    try:
+        # Seats allocated in the hall go with it; allocate the date again to re-seat those students
+        deletion_service.delete(db, 'hall', hall_id)
+        flash("Hall deleted.", "success")
+    except Exception as e:
+        db.rollback()
+        flash(f"Error deleting hall: {e}", "error")
+    db.close()
+    return redirect(url_for('admin.admin_exams'))
+
+@admin_bp.route('/admin/exams/seating', methods=['POST'])
+@login_required
+@rate_limit('exam-seating', 10, per=60, key='user')
+def allocate_exam_seating():
+    """Seat every eligible student for every exam on a date, replacing the previous allocation for it."""
+    if not session.get('is_admin'):
+        abort(403)
+    exam_date = request.form.get('exam_date')
+    db = get_db_connection()
+    try:
+        summary = seating_service.allocate_date(db, exam_date)
+        if summary is None:
+            flash("No exams are scheduled on that date.", "info")
+        else:
+            flash(f"Seated {summary['seated']} student(s) for {summary['exams']} exam(s) in {summary['halls']} hall(s).", "success")
+            if summary['clashes']:
+                flash(f"{summary['clashes']} student(s) have overlapping exams and were seated for the first one only.", "error")
+    except ValueError as e:
+        db.rollback()
+        flash(f"{e} Add halls and allocate again.", "error")
+    except Exception as e:
+        db.rollback()
+        flash(f"Error allocating seats: {e}", "error")
+    db.close()
+    return redirect(url_for('admin.admin_exams'))
+
+@admin_bp.route('/admin/exams/seating/export')
+@login_required
+def export_exam_seating():
+    if not session.get('is_admin'):
+        abort(403)
+    exam_date = request.args.get('date', '')
+    try:
+        datetime.strptime(exam_date, '%Y-%m-%d')
+    except ValueError:
+        abort(404)
+    return seating_service.seating_export(exam_date, request.args.get('format', 'csv'))
+
+@admin_bp.route('/admin/delete_exam/<int:exam_id>')
+@login_required
+def delete_exam(exam_id):
+    if not session.get('is_admin'):
+        abort(403)
+    db = get_db_connection()
+    try:
+        deletion_service.delete(db, 'exam', exam_id)
         flash("Exam schedule deleted.", "success")
     except Exception as e:
         db.rollback()
@@ -566,17 +991,90 @@ def admin_certificates():
         abort(403)
     db = get_db_connection()
     cursor = db.cursor(dictionary=True)
-    cursor.execute("""
-        SELECT r.registration_id, r.certificate_status, s.name as student_name, e.event_name, e.event_date
+    # Keyset pagination, newest first: ?before=<registration_id> continues after the last row shown
+    event_id = request.args.get('event_id', type=int)
+    before = request.args.get('before', type=int)
+    conditions, params = ["r.certificate_status = 'Pending'", "e.deleted_at IS NULL"], []
+    if event_id:
+        conditions.append("r.event_id = %s")
+        params.append(event_id)
+    if before:
+        conditions.append("r.registration_id < %s")
+        params.append(before)
+    cursor.execute(f"""
+        SELECT r.registration_id, r.certificate_status, r.attendance, s.name as student_name, e.event_name, e.event_date
         FROM registrations r
         JOIN student s ON r.student_id = s.student_id
         JOIN events e ON r.event_id = e.event_id
-        WHERE r.certificate_status = 'Pending'
-        ORDER BY e.event_date DESC
-    """)
+        WHERE {' AND '.join(conditions)}
+        ORDER BY r.registration_id DESC
+        LIMIT %s
+    """, params + [CERTIFICATES_PAGE_SIZE + 1])
     pending_certs = cursor.fetchall()
+    next_before = None
+    if len(pending_certs) > CERTIFICATES_PAGE_SIZE:
+        pending_certs = pending_certs[:CERTIFICATES_PAGE_SIZE]
+        next_before = pending_certs[-1]['registration_id']
+
+    cursor.execute("""
+        SELECT e.event_id, e.event_name, COUNT(*) as pending
+        FROM registrations r
+        JOIN events e ON r.event_id = e.event_id
+        WHERE r.certificate_status = 'Pending' AND e.deleted_at IS NULL
+        GROUP BY e.event_id, e.event_name
+        ORDER BY e.event_name
+    """)
+    pending_events = cursor.fetchall()
+    events = dashboard_service.all_events(cursor)
     db.close()
-    return render_template('admin_certificates.html', pending_certs=pending_certs)
+    return render_template('admin_certificates.html', pending_certs=pending_certs, events=events,
+                           pending_events=pending_events, event_id=event_id, next_before=next_before)
+
+@admin_bp.route('/admin/certificates/approve', methods=['POST'])
+@login_required
+def approve_certificates_bulk():
+    """scope: 'selected' (registration_ids), 'event' (every pending for event_id) or 'present' (pending with attendance, optionally per event)."""
+    if not session.get('is_admin'):
+        abort(403)
+    scope = request.form.get('scope')
+    event_id = request.form.get('event_id', type=int)
+    db = get_db_connection()
+    try:
+        if scope == 'selected':
+            ids = [int(i) for i in request.form.getlist('registration_ids')]
+            approved = certificate_service.approve(db, registration_ids=ids)
+        elif scope == 'event' and event_id:
+            approved = certificate_service.approve(db, event_id=event_id)
+        elif scope == 'present':
+            approved = certificate_service.approve(db, event_id=event_id, present_only=True)
+        else:
+            db.close()
+            flash("Choose which certificates to approve.", "error")
+            return redirect(url_for('admin.admin_certificates'))
+        flash(f"Approved {len(approved)} certificate(s).", "success")
+    except Exception as e:
+        db.rollback()
+        flash(f"Error approving certificates: {e}", "error")
+    db.close()
+    return redirect(url_for('admin.admin_certificates', event_id=event_id) if event_id else url_for('admin.admin_certificates'))
+
+@admin_bp.route('/admin/certificates/download')
+@login_required
+def download_event_certificates():
+    """Every approved certificate for one event as a single ZIP."""
+    if not session.get('is_admin'):
+        abort(403)
+    event_id = request.args.get('event_id', type=int)
+    db = get_db_connection()
+    cursor = db.cursor(dictionary=True)
+    records = certificate_service.approved_records(cursor, event_id)
+    db.close()
+    if not records:
+        flash("No approved certificates for that event.", "info")
+        return redirect(url_for('admin.admin_certificates'))
+
+    path = certificate_service.event_certificates_zip(records)
+    return export_service.temp_file_response(path, 'application/zip', f"Certificates_{secure_filename(records[0]['event_name'])}.zip")
 
 @admin_bp.route('/admin/approve-certificate/<int:reg_id>')
 @login_required
@@ -584,14 +1082,8 @@ def approve_certificate(reg_id):
     if not session.get('is_admin'):
         abort(403)
     db = get_db_connection()
-    cursor = db.cursor(dictionary=True)
     try:
-        cursor.execute("UPDATE registrations SET certificate_status='Approved' WHERE registration_id=%s", (reg_id,))
-        db.commit()
-        cursor.execute("SELECT student_id FROM registrations WHERE registration_id=%s", (reg_id,))
-        res = cursor.fetchone()
-        if res:
-             add_notification(res['student_id'], 'student', "Your certificate has been approved! Download it now.")
+        certificate_service.approve(db, registration_ids=[reg_id])
         flash("Certificate approved successfully!", "success")
     except Exception as e:
         db.rollback()
@@ -614,6 +1106,7 @@ def toggle_event_status(event_id, new_status):
     try:
         cursor.execute("UPDATE events SET status=%s WHERE event_id=%s", (new_status, event_id))
         db.commit()
+        dashboard_service.invalidate_events()
         flash(f"Event registration is now {new_status}.", "success")
     except Exception as e:
         db.rollback()
@@ -621,3 +1114,37 @@ def toggle_event_status(event_id, new_status):
     db.close()
     
     return redirect(url_for('public.events'))
+
+@admin_bp.route('/admin/event-capacity/<int:event_id>', methods=['POST'])
+@login_required
+def set_event_capacity(event_id):
+    if not session.get('is_admin'):
+        abort(403)
+
+    # Blank means unlimited seats
+    capacity = request.form.get('capacity', type=int)
+    if capacity is not None and capacity < 1:
+        flash("Capacity must be at least 1.", "error")
+        return redirect(url_for('public.events'))
+
+    db = get_db_connection()
+    try:
+        promoted = registration_service.set_capacity(db, event_id, capacity)
+        if promoted is None:
+            flash("Event not found.", "error")
+        else:
+            cursor = db.cursor()
+            cursor.execute("SELECT coordinator_id FROM events WHERE event_id=%s", (event_id,))
+            dashboard_service.invalidate_events()
+            dashboard_service.invalidate_faculty(cursor.fetchone()[0])
+            for _, student_id in promoted:
+                dashboard_service.invalidate_student(student_id)
+            message = f"Capacity set to {capacity or 'unlimited'}."
+            if promoted:
+                message += f" {len(promoted)} student(s) moved off the waitlist."
+            flash(message, "success")
+    except Exception as e:
+        db.rollback()
+        flash(f"Error updating capacity: {e}", "error")
+    db.close()
+    return redirect(url_for('public.events'))
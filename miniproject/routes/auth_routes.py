@@ -1,10 +1,11 @@
 from flask import Blueprint, render_template, request, redirect, url_for, session, flash, current_app
 from werkzeug.security import check_password_hash, generate_password_hash
-from models.db import get_db_connection
+from models.db import get_db_connection, IntegrityError
+from models import stats
 from itsdangerous import URLSafeTimedSerializer
 from services.email_service import send_email
 from utils.helpers import login_required
-import time
+from utils.ratelimit import rate_limit
 
 auth_bp = Blueprint('auth', __name__)
 
@@ -51,8 +52,8 @@ def login():
     return render_template('login.html')
 
 @auth_bp.route('/register-user', methods=['POST'])
+@rate_limit('register-user', 5, per=60, key='ip')
 def register_user():
-    time.sleep(3) 
     role = request.form.get('role', 'student')
     if role != 'student':
         flash("Only student registration is allowed here.", "error")
@@ -78,22 +79,23 @@ def register_user():
     try:
         db = get_db_connection()
         cursor = db.cursor(dictionary=True)
-        cursor.execute("SELECT student_id FROM student WHERE register_number=%s", (username,))
-        if cursor.fetchone():
-             db.close()
-             flash("Student already registered (Check Reg No)", "error")
-             return redirect(url_for('auth.login'))
-
+        # Duplicates are rejected by uq_student_register_number / uq_student_email
         cursor.execute("""
             INSERT INTO student (name, register_number, email, department, semester, password)
             VALUES (%s,%s,%s,%s,%s,%s)
         """, (name, username, email, department, request.form['semester'], hashed))
+        stats.bump_total(db, 'total_students', 1)
 
         db.commit()
         db.close()
         flash("Registration successful. Please Login.", "success")
         return redirect(url_for('auth.login'))
 
+    except IntegrityError:
+        db.rollback()
+        db.close()
+        flash("Student already registered (Check Reg No / Email)", "error")
+        return redirect(url_for('auth.login'))
     except Exception as e:
         flash(str(e), "error")
         return redirect(url_for('auth.login'))
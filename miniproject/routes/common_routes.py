@@ -1,26 +1,168 @@
-from flask import Blueprint, session
-from models.db import get_db_connection
-from utils.helpers import login_required
+from flask import Blueprint, session, request, Response, stream_with_context, current_app, redirect, url_for, flash
+from models.db import get_db_connection, get_pooled_connection
+from utils.helpers import login_required, decrement_unread_count, get_unread_count, notifications_version, wait_for_notifications
+from services import schedule_service
+import json
+import time
 
 common_bp = Blueprint('common', __name__)
 
+NOTIFICATION_COLUMNS = "notification_id, message, is_read, created_at"
+PAGE_SIZE = 20
+STREAM_BATCH = 50
+
+def _fetch_notifications(cursor, user_id, role, since=None, before=None, limit=PAGE_SIZE):
+    """
+    Keyset reads on notification_id. `since` returns the oldest rows after the client's cursor,
+    oldest first, so a burst larger than `limit` is drained over several reads instead of skipped.
+    `before` pages back through history, newest first.
+    """
+    if since is not None:
+        cursor.execute(f"""
+            SELECT {NOTIFICATION_COLUMNS} FROM notifications
+            WHERE user_id = %s AND user_role = %s AND notification_id > %s
+            ORDER BY notification_id ASC LIMIT %s
+        """, (user_id, role, since, limit))
+    elif before is not None:
+        cursor.execute(f"""
+            SELECT {NOTIFICATION_COLUMNS} FROM notifications
+            WHERE user_id = %s AND user_role = %s AND notification_id < %s
+            ORDER BY notification_id DESC LIMIT %s
+        """, (user_id, role, before, limit))
+    else:
+        cursor.execute(f"""
+            SELECT {NOTIFICATION_COLUMNS} FROM notifications
+            WHERE user_id = %s AND user_role = %s
+            ORDER BY notification_id DESC LIMIT %s
+        """, (user_id, role, limit))
+    return cursor.fetchall()
+
+def _mark_read(db, user_id, role, ids):
+    if not ids:
+        return 0
+    placeholders = ", ".join(["%s"] * len(ids))
+    cursor = db.cursor()
+    cursor.execute(f"""
+        UPDATE notifications SET is_read = 1
+        WHERE user_id = %s AND user_role = %s AND is_read = 0 AND notification_id IN ({placeholders})
+    """, (user_id, role, *ids))
+    db.commit()
+    decrement_unread_count(user_id, role, cursor.rowcount)
+    return cursor.rowcount
+
 @common_bp.route('/get-notifications')
 @login_required
 def get_notifications():
+    since = request.args.get('since', type=int)
+    before = request.args.get('before', type=int)
+    limit = min(request.args.get('limit', PAGE_SIZE, type=int), 100)
+
     db = get_db_connection()
     cursor = db.cursor(dictionary=True)
-    cursor.execute("""
-        SELECT * FROM notifications 
-        WHERE user_id = %s AND user_role = %s 
-        ORDER BY created_at DESC LIMIT 20
-    """, (session['user_id'], session['role']))
-    notes = cursor.fetchall()
-    
-    cursor.execute("""
-        UPDATE notifications SET is_read = 1 
-        WHERE user_id = %s AND user_role = %s
-    """, (session['user_id'], session['role']))
-    db.commit()
+    notes = _fetch_notifications(cursor, session['user_id'], session['role'], since=since, before=before, limit=limit)
+
+    # Only what was actually delivered is marked as read
+    _mark_read(db, session['user_id'], session['role'], [n['notification_id'] for n in notes if not n['is_read']])
+    db.close()
+
+    if since is not None:
+        # The cursor only moves past what was returned; has_more asks the client to read on
+        return {
+            'notifications': notes[::-1],
+            'cursor': notes[-1]['notification_id'] if notes else since,
+            'has_more': len(notes) == limit,
+            'next_before': None
+        }
+    return {
+        'notifications': notes,
+        'cursor': notes[0]['notification_id'] if notes else since,
+        'has_more': False,
+        'next_before': notes[-1]['notification_id'] if len(notes) == limit else None
+    }
+
+@common_bp.route('/notifications/mark-read', methods=['POST'])
+@login_required
+def mark_notifications_read():
+    data = request.get_json(silent=True) or {}
+    ids = data.get('ids', []) if isinstance(data, dict) else None
+    if not isinstance(ids, list):
+        return {'error': 'ids must be a list of notification ids'}, 400
+    try:
+        ids = [int(i) for i in ids[:500]]
+    except (TypeError, ValueError):
+        return {'error': 'ids must be a list of notification ids'}, 400
+    db = get_db_connection()
+    marked = _mark_read(db, session['user_id'], session['role'], ids)
+    db.close()
+    return {'marked': marked}
+
+@common_bp.route('/notifications/stream')
+@login_required
+def notification_stream():
+    """
+    Server-Sent Events: pushes rows newer than the client's cursor. The stream ends after
+    NOTIFICATION_STREAM_SECONDS and EventSource reconnects with Last-Event-ID.
+    """
+    user_id, role = session['user_id'], session['role']
+    last_id = request.headers.get('Last-Event-ID', type=int) or request.args.get('since', type=int)
+    lifetime = current_app.config.get('NOTIFICATION_STREAM_SECONDS', 30)
+    recheck = current_app.config.get('NOTIFICATION_STREAM_RECHECK', 10)
+
+    def events():
+        nonlocal last_id
+        deadline = time.monotonic() + lifetime
+        version = notifications_version()
+        first = True
+        while True:
+            # A connection is only checked out while querying, never while idle
+            db = get_pooled_connection()
+            try:
+                cursor = db.cursor(dictionary=True)
+                if last_id is None:
+                    cursor.execute("""
+                        SELECT COALESCE(MAX(notification_id), 0) as last_id FROM notifications
+                        WHERE user_id = %s AND user_role = %s
+                    """, (user_id, role))
+                    last_id = cursor.fetchone()['last_id']
+                    notes = []
+                else:
+                    notes = _fetch_notifications(cursor, user_id, role, since=last_id, limit=STREAM_BATCH)
+                unread = get_unread_count(user_id, role, db=db) if notes or first else None
+            finally:
+                db.close()
+
+            if notes or first:
+                if notes:
+                    last_id = notes[-1]['notification_id']
+                payload = json.dumps({'notifications': notes, 'unread': unread}, default=str)
+                yield f"id: {last_id}\nevent: notification\ndata: {payload}\n\n"
+                first = False
+                if len(notes) == STREAM_BATCH and time.monotonic() < deadline:
+                    continue  # more are waiting: drain before sleeping
+
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            # Woken at once for notifications written by this process; other workers are caught on recheck
+            version = wait_for_notifications(version, min(recheck, remaining))
+
+        yield "retry: 1000\n\n"
+
+    return Response(stream_with_context(events()), mimetype='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no'
+    })
+
+@common_bp.route('/calendar-feed/reset', methods=['POST'])
+@login_required
+def reset_calendar_feed():
+    """Revoke the user's calendar subscription link (e.g. after it leaked) and issue a new one."""
+    db = get_db_connection()
+    try:
+        schedule_service.reset_feed_token(db, session['role'], session['user_id'])
+        flash("Your calendar feed link has been reset. Subscribe again with the new link.", "success")
+    except Exception as e:
+        db.rollback()
+        flash(f"Error resetting the calendar feed: {e}", "error")
     db.close()
-    
-    return {'notifications': notes}
+    return redirect(request.referrer or url_for('auth.login'))
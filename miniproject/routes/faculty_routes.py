@@ -1,8 +1,8 @@
-from flask import Blueprint, render_template, request, redirect, url_for, session, flash, abort, make_response
+from flask import Blueprint, render_template, request, redirect, url_for, session, flash, abort
 from models.db import get_db_connection
+from models import stats
 from utils.helpers import login_required, role_required, add_notification, notify_admins
-import openpyxl
-import io
+from services import dashboard_service, attendance_service, export_service, schedule_service
 
 faculty_bp = Blueprint('faculty', __name__)
 
@@ -12,17 +12,21 @@ faculty_bp = Blueprint('faculty', __name__)
 def faculty_dashboard():
     db = get_db_connection()
     cursor = db.cursor(dictionary=True)
-    
+    view = dashboard_service.faculty_dashboard_view(cursor, session['user_id'], _build_faculty_dashboard)
+    db.close()
+    return render_template('faculty_dashboard.html', **view)
+
+def _build_faculty_dashboard(cursor, faculty_id):
     cursor.execute("""
         SELECT e.*, 
         COUNT(r.registration_id) as total_reg_count,
         SUM(CASE WHEN r.attendance = 'Present' THEN 1 ELSE 0 END) as attended_count
         FROM events e
         LEFT JOIN registrations r ON e.event_id = r.event_id
-        WHERE e.coordinator_id = %s
+        WHERE e.coordinator_id = %s AND e.deleted_at IS NULL
         GROUP BY e.event_id
         ORDER BY e.event_date
-    """, (session['user_id'],))
+    """, (faculty_id,))
     events = cursor.fetchall()
     
     for e in events:
@@ -46,13 +50,13 @@ def faculty_dashboard():
             'attended': int(e['attended_count']) if e['attended_count'] else 0
         })
     
-    db.close()
-    return render_template('faculty_dashboard.html', 
-                           events=events,
-                           total_events=total_events,
-                           total_registrations=total_registrations,
-                           attendance_rate=attendance_rate,
-                           analytics_data=analytics_data)
+    return {
+        'events': events,
+        'total_events': total_events,
+        'total_registrations': total_registrations,
+        'attendance_rate': attendance_rate,
+        'analytics_data': analytics_data
+    }
 
 @faculty_bp.route('/export-attendance/<int:event_id>')
 @login_required
@@ -61,62 +65,14 @@ def export_attendance(event_id):
     db = get_db_connection()
     cursor = db.cursor(dictionary=True)
     
-    cursor.execute("SELECT event_name FROM events WHERE event_id=%s AND coordinator_id=%s", (event_id, session['user_id']))
+    cursor.execute("SELECT event_name FROM events WHERE event_id=%s AND coordinator_id=%s AND deleted_at IS NULL", (event_id, session['user_id']))
     event = cursor.fetchone()
+    db.close()
     if not event:
-        db.close()
         abort(403)
-        
-    cursor.execute("""
-        SELECT s.name, s.register_number, s.department, s.email, s.semester, r.attendance, r.certificate_status
-        FROM registrations r
-        JOIN student s ON r.student_id = s.student_id
-        WHERE r.event_id = %s
-        ORDER BY s.name
-    """, (event_id,))
-    attendees = cursor.fetchall()
-    db.close()
-    
-    wb = openpyxl.Workbook()
-    ws = wb.active
-    ws.title = "Attendance Sheet"
-    
-    headers = ["Name", "Register Number", "Department", "Semester", "Email", "Attendance Status", "Certificate Status"]
-    ws.append(headers)
-    
-    for person in attendees:
-        attendance = person['attendance'] if person['attendance'] else 'Absent'
-        cert_status = person['certificate_status'] if person['certificate_status'] else 'Not Issued'
-        ws.append([
-            person['name'],
-            person['register_number'],
-            person['department'],
-            person['semester'],
-            person['email'],
-            attendance,
-            cert_status
-        ])
-        
-    for col in ws.columns:
-        max_length = 0
-        column = col[0].column_letter
-        for cell in col:
-            try:
-                if len(str(cell.value)) > max_length:
-                    max_length = len(str(cell.value))
-            except:
-                pass
-        adjusted_width = (max_length + 2)
-        ws.column_dimensions[column].width = adjusted_width
-
-    output = io.BytesIO()
-    wb.save(output)
-    output.seek(0)
-    
-    return make_response(output.getvalue(), 200, {
-        "Content-Disposition": f"attachment; filename=Attendance_{event['event_name']}.xlsx",
-        "Content-Type": "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
-    })
+
+    # Rows are streamed from the database, never loaded all at once (services/export_service.py)
+    return export_service.attendance_export(event_id, event['event_name'], request.args.get('format', 'xlsx'))
 
 @faculty_bp.route('/scan-attendance', methods=['GET', 'POST'])
 @login_required
@@ -132,24 +88,30 @@ def scan_attendance():
         cursor = db.cursor(dictionary=True)
         
         cursor.execute("""
-            SELECT r.registration_id, s.student_id, s.name, e.event_name 
+            SELECT r.registration_id, r.event_id, s.student_id, s.name, e.event_name, e.coordinator_id 
             FROM registrations r 
             JOIN student s ON r.student_id = s.student_id 
             JOIN events e ON r.event_id = e.event_id 
-            WHERE r.qr_token = %s
+            WHERE r.qr_token = %s AND e.deleted_at IS NULL
         """, (qr_token,))
         registration = cursor.fetchone()
 
         if registration:
+            # Re-scans leave the row (and an already approved certificate) untouched
             cursor.execute("""
                 UPDATE registrations 
-                SET attendance = 'Present', certificate_status = 'Pending' 
-                WHERE qr_token = %s
+                SET attendance = 'Present', certificate_status = 'Pending', attended_at = NOW()
+                WHERE qr_token = %s AND (attendance IS NULL OR attendance != 'Present')
             """, (qr_token,))
+            newly_marked = cursor.rowcount > 0
+            if newly_marked:
+                stats.record_attendance(db, registration['event_id'])
             db.commit()
+            dashboard_service.invalidate_registration(registration['student_id'], registration['coordinator_id'])
 
-            add_notification(registration['student_id'], 'student', f"Attendance marked: {registration['event_name']}.")
-            notify_admins(f"Certificate Pending Approval: {registration['name']} - {registration['event_name']}.")
+            if newly_marked:
+                add_notification(registration['student_id'], 'student', f"Attendance marked: {registration['event_name']}.")
+                notify_admins(f"Certificate Pending Approval: {registration['name']} - {registration['event_name']}.")
             
             db.close()
             return f"Success: Attendance marked for {registration['name']} (Event: {registration['event_name']})"
@@ -157,7 +119,92 @@ def scan_attendance():
             db.close()
             return "Error: Invalid QR Code", 404
 
-    return render_template('scan_attendance.html')
+    # With ?event_id= the page runs the offline scanner for that event
+    event = None
+    event_id = request.args.get('event_id', type=int)
+    if event_id:
+        event = _coordinated_event(event_id)
+        if not event:
+            abort(403)
+    return render_template('scan_attendance.html', event=event)
+
+def _coordinated_event(event_id, db=None):
+    own = db is None
+    if own:
+        db = get_db_connection()
+    cursor = db.cursor(dictionary=True)
+    cursor.execute("SELECT event_id, event_name, event_date, coordinator_id FROM events WHERE event_id=%s AND coordinator_id=%s AND deleted_at IS NULL",
+                   (event_id, session['user_id']))
+    event = cursor.fetchone()
+    if own:
+        db.close()
+    return event
+
+@faculty_bp.route('/scan-attendance/batch', methods=['POST'])
+@login_required
+@role_required('faculty')
+def scan_attendance_batch():
+    """JSON {event_id, tokens: [...]} -> per-token results, applied in one transaction."""
+    data = request.get_json(silent=True) or {}
+    tokens = [str(t) for t in data.get('tokens', []) if t]
+    if not tokens:
+        return {'error': 'No tokens provided'}, 400
+    if len(tokens) > attendance_service.MAX_BATCH:
+        return {'error': f'At most {attendance_service.MAX_BATCH} tokens per batch'}, 400
+
+    db = get_db_connection()
+    event = _coordinated_event(data.get('event_id'), db)
+    if not event:
+        db.close()
+        abort(403)
+
+    results = attendance_service.mark_batch(db, event, [(t, None) for t in tokens])
+    db.close()
+    return {
+        'results': results,
+        'marked': sum(1 for r in results if r['status'] == 'marked')
+    }
+
+@faculty_bp.route('/scan-attendance/<int:event_id>/manifest')
+@login_required
+@role_required('faculty')
+def scan_manifest(event_id):
+    db = get_db_connection()
+    if not _coordinated_event(event_id, db):
+        db.close()
+        abort(403)
+    manifest = attendance_service.manifest(db.cursor(dictionary=True), event_id)
+    db.close()
+    return manifest
+
+@faculty_bp.route('/scan-attendance/<int:event_id>/reconcile', methods=['POST'])
+@login_required
+@role_required('faculty')
+def reconcile_scans(event_id):
+    """
+    Upload from the offline scanner: JSON {scans: [{token, scanned_at}]}. Safe to retry;
+    already merged scans come back as duplicates.
+    """
+    data = request.get_json(silent=True) or {}
+    scans = [(str(s['token']), attendance_service.parse_scanned_at(s.get('scanned_at')))
+             for s in data.get('scans', []) if isinstance(s, dict) and s.get('token')]
+    if not scans:
+        return {'error': 'No scans provided'}, 400
+    if len(scans) > attendance_service.MAX_BATCH:
+        return {'error': f'At most {attendance_service.MAX_BATCH} scans per upload'}, 400
+
+    db = get_db_connection()
+    event = _coordinated_event(event_id, db)
+    if not event:
+        db.close()
+        abort(403)
+
+    results = attendance_service.mark_batch(db, event, scans)
+    db.close()
+    return {
+        'results': results,
+        'marked': sum(1 for r in results if r['status'] == 'marked')
+    }
 
 @faculty_bp.route('/faculty/timetable')
 @login_required
@@ -166,14 +213,21 @@ def faculty_timetable():
     db = get_db_connection()
     cursor = db.cursor(dictionary=True)
     
-    cursor.execute("""
-        SELECT t.*, c.course_name, c.semester, c.department 
-        FROM timetable t 
-        JOIN courses c ON t.course_id = c.course_id 
-        WHERE t.faculty_id = %s 
-        ORDER BY FIELD(day, 'Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday'), start_time
-    """, (session['user_id'],))
-    timetable = cursor.fetchall()
+    snapshot = schedule_service.faculty_snapshot(cursor, session['user_id'])
+    token = schedule_service.feed_token(db, 'faculty', session['user_id'])
     
     db.close()
-    return render_template('faculty_timetable.html', timetable=timetable, courses=[])
+    return render_template('faculty_timetable.html', timetable=snapshot['timetable'], courses=[],
+                           feed_url=url_for('public.calendar_feed', token=token, _external=True))
+
+@faculty_bp.route('/faculty/schedule.<fmt>')
+@login_required
+@role_required('faculty')
+def faculty_schedule(fmt):
+    if fmt not in ('json', 'ics'):
+        abort(404)
+    db = get_db_connection()
+    cursor = db.cursor(dictionary=True)
+    snapshot = schedule_service.faculty_snapshot(cursor, session['user_id'])
+    db.close()
+    return schedule_service.feed_response(snapshot, fmt, "timetable")
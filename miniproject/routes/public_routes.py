@@ -1,5 +1,6 @@
-from flask import Blueprint, render_template, session, request
+from flask import Blueprint, render_template, session, request, abort
 from models.db import get_db_connection
+from services import schedule_service, registration_service
 
 public_bp = Blueprint('public', __name__)
 
@@ -14,10 +15,11 @@ def home():
             CASE WHEN r.registration_id IS NOT NULL THEN 1 ELSE 0 END as is_registered
             FROM events e
             LEFT JOIN registrations r ON e.event_id = r.event_id AND r.student_id = %s
+            WHERE e.deleted_at IS NULL
             ORDER BY e.event_date
         """, (session['user_id'],))
     else:
-        cursor.execute("SELECT * FROM events ORDER BY event_date")
+        cursor.execute("SELECT * FROM events WHERE deleted_at IS NULL ORDER BY event_date")
     
     events = cursor.fetchall()
     db.close()
@@ -34,12 +36,12 @@ def events():
     offset = (page - 1) * per_page
     
     # Get total count
-    cursor.execute("SELECT COUNT(*) as total FROM events")
+    cursor.execute("SELECT COUNT(*) as total FROM events WHERE deleted_at IS NULL")
     total_events = cursor.fetchone()['total']
     total_pages = (total_events + per_page - 1) // per_page
     
     # Fetch subset
-    cursor.execute("SELECT * FROM events ORDER BY event_date DESC LIMIT %s OFFSET %s", (per_page, offset))
+    cursor.execute("SELECT * FROM events WHERE deleted_at IS NULL ORDER BY event_date DESC LIMIT %s OFFSET %s", (per_page, offset))
     events = cursor.fetchall()
     
     # Calculate Deadline Status
@@ -59,5 +61,43 @@ def events():
         else:
             event['deadline_passed'] = False
 
+    if session.get('role') == 'student':
+        department, semester = schedule_service.student_cohort(cursor, session['user_id'])
+        schedule_service.flag_events(schedule_service.busy_index(cursor, department, semester), events)
+        registered = set()
+        if events:
+            cursor.execute(f"""
+                SELECT event_id FROM registrations
+                WHERE student_id = %s AND event_id IN ({', '.join(['%s'] * len(events))})
+            """, [session['user_id']] + [event['event_id'] for event in events])
+            registered = {row['event_id'] for row in cursor.fetchall()}
+        waitlisted = registration_service.waitlist_positions(cursor, session['user_id'])
+        for event in events:
+            event['is_registered'] = event['event_id'] in registered
+            event['waitlist_position'] = waitlisted.get(event['event_id'])
+    else:
+        for event in events:
+            event['time_range'] = schedule_service.time_range(event)
+
     db.close()
     return render_template('events.html', events=events, page=page, total_pages=total_pages)
+
+@public_bp.route('/calendar/<token>.ics')
+def calendar_feed(token):
+    """Calendar subscription for calendar apps, which cannot log in: the signed token names the user."""
+    db = get_db_connection()
+    # Also rejects tokens revoked by a reset and users that no longer exist
+    role, user_id = schedule_service.read_feed_token(db, token)
+    if role not in ('student', 'faculty'):
+        db.close()
+        abort(404)
+    cursor = db.cursor(dictionary=True)
+    if role == 'student':
+        department, semester = schedule_service.student_cohort(cursor, user_id)
+        snapshot = schedule_service.cohort_snapshot(cursor, department, semester) if department else None
+    else:
+        snapshot = schedule_service.faculty_snapshot(cursor, user_id)
+    db.close()
+    if snapshot is None:
+        abort(404)
+    return schedule_service.feed_response(snapshot, 'ics', "schedule")
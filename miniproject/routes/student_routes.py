@@ -1,13 +1,10 @@
 from flask import Blueprint, render_template, request, redirect, url_for, session, flash, send_file, make_response, abort
-from models.db import get_db_connection
-from utils.helpers import login_required, role_required, add_notification, notify_admins
-from services.email_service import send_email
+from models.db import get_db_connection, IntegrityError
+from models import stats
+from utils.helpers import login_required, role_required
+from utils.ratelimit import rate_limit
+from services import dashboard_service, certificate_service, registration_service, schedule_service
 from datetime import datetime, timedelta
-import uuid
-import qrcode
-from io import BytesIO
-import time
-from fpdf import FPDF
 
 student_bp = Blueprint('student', __name__)
 
@@ -18,16 +15,7 @@ def student_dashboard():
     db = get_db_connection()
     cursor = db.cursor(dictionary=True)
     
-    cursor.execute("""
-        SELECT e.event_id, e.event_name, e.event_date, e.location, r.attendance, r.certificate_status, r.registration_id,
-        (SELECT COUNT(*) FROM feedback f WHERE f.event_id=r.event_id AND f.student_id=r.student_id) as feedback_count,
-        od.status as od_status
-        FROM registrations r
-        JOIN events e ON r.event_id=e.event_id
-        LEFT JOIN onduty_requests od ON r.event_id = od.event_id AND r.student_id = od.student_id
-        WHERE r.student_id=%s
-    """, (session['user_id'],))
-    registrations = cursor.fetchall()
+    registrations = dashboard_service.student_registrations(cursor, session['user_id'])
     
     current_date = datetime.now().date()
     for r in registrations:
@@ -46,14 +34,16 @@ def student_dashboard():
     if total_registered > 0:
         participation_rate = round((attended_count / total_registered) * 100, 1)
         
-    cursor.execute("""
-        SELECT e.*, 
-        CASE WHEN r.registration_id IS NOT NULL THEN 1 ELSE 0 END as is_registered
-        FROM events e
-        LEFT JOIN registrations r ON e.event_id = r.event_id AND r.student_id = %s
-        ORDER BY e.event_date
-    """, (session['user_id'],))
-    events = cursor.fetchall()
+    # Shared event list; the per-student flag comes from the registrations already loaded
+    registered_ids = {r['event_id'] for r in registrations}
+    # Not cached: a place in the queue moves whenever someone ahead leaves it
+    waitlisted = registration_service.waitlist_positions(cursor, session['user_id'])
+    events = dashboard_service.all_events(cursor)
+    for e in events:
+        e['is_registered'] = 1 if e['event_id'] in registered_ids else 0
+        e['waitlist_position'] = waitlisted.get(e['event_id'])
+    department, semester = schedule_service.student_cohort(cursor, session['user_id'])
+    schedule_service.flag_events(schedule_service.busy_index(cursor, department, semester), events)
     
     db.close()
     
@@ -78,7 +68,7 @@ def my_registrations():
             FROM registrations r
             JOIN student s ON r.student_id = s.student_id
             JOIN events e ON r.event_id = e.event_id
-            WHERE s.register_number=%s AND s.email=%s
+            WHERE s.register_number=%s AND s.email=%s AND e.deleted_at IS NULL
             ORDER BY e.event_date DESC
         """, (reg_no, email))
         registrations = cursor.fetchall()
@@ -89,13 +79,13 @@ def my_registrations():
 @student_bp.route('/register-event/<int:event_id>', methods=['GET', 'POST'])
 @login_required
 @role_required('student')
+@rate_limit('register-event', 10, per=60, key='user')
 def register_for_event(event_id):
-    time.sleep(3)
     db = get_db_connection()
     cursor = db.cursor(dictionary=True)
     
     # Check Event Status
-    cursor.execute("SELECT * FROM events WHERE event_id=%s", (event_id,))
+    cursor.execute("SELECT * FROM events WHERE event_id=%s AND deleted_at IS NULL", (event_id,))
     event = cursor.fetchone()
     
     if not event:
@@ -127,6 +117,14 @@ def register_for_event(event_id):
         db.close()
         flash("You are already registered for this event.", "info")
         return redirect(url_for('student.student_dashboard'))
+
+    # Exams block registration; a class does not, since attendance there can be covered by on-duty
+    department, semester = schedule_service.student_cohort(cursor, session['user_id'])
+    clashes = schedule_service.clashes(schedule_service.busy_index(cursor, department, semester), event)
+    if any(kind == 'exam' for kind, _ in clashes):
+        db.close()
+        flash(f"This event clashes with your {schedule_service.describe(clashes)}.", "error")
+        return redirect(url_for('student.student_dashboard'))
     
     if request.method == 'POST':
         req_fields = ['name', 'register_number', 'email', 'semester']
@@ -136,59 +134,29 @@ def register_for_event(event_id):
                 flash(f"{field.replace('_', ' ').capitalize()} is required.", "error")
                 return redirect(url_for('student.student_dashboard'))
         
+        # Set per form render, so a double-submit or a retried POST is answered instead of applied twice
+        idempotency_key = (request.form.get('idempotency_key') or request.headers.get('Idempotency-Key') or '').strip()[:64]
         try:
-            qr_token = str(uuid.uuid4())
-            cursor.execute("""
-                INSERT INTO registrations (student_id, event_id, qr_token) 
-                VALUES (%s, %s, %s)
-            """, (session['user_id'], event_id, qr_token))
-            db.commit()
-
-            # Event details are already in 'event' variable
-            
-            cursor.execute("SELECT email, name FROM student WHERE student_id=%s", (session['user_id'],))
-            student = cursor.fetchone()
-
-            qr = qrcode.make(qr_token)
-            buffer = BytesIO()
-            qr.save(buffer, format="PNG")
-            img_data = buffer.getvalue()
-
-            html_body = f"""
-            <h3>Registration Confirmed!</h3>
-            <p>Hello {student['name']},</p>
-            <p>You have successfully registered for:</p>
-            <ul>
-                <li><strong>Event:</strong> {event['event_name']}</li>
-                <li><strong>Date:</strong> {event['event_date']}</li>
-                <li><strong>Location:</strong> {event['location']}</li>
-            </ul>
-            <p>Please show the QR code below during attendance:</p>
-            <div style="text-align: center;">
-                <img src="cid:qr_code" alt="QR Code" style="width: 200px; height: 200px;">
-            </div>
-            """
-            
-            attachment = {
-                'filename': 'qrcode.png',
-                'content_type': 'image/png',
-                'data': img_data,
-                'headers': {'Content-ID': '<qr_code>'}
-            }
-            
-            send_email("Event Registration Successful", [student['email']], html=html_body, attachments=[attachment])
-
-            add_notification(session['user_id'], 'student', f"Registered: {event['event_name']}.")
-            add_notification(event['coordinator_id'], 'faculty', f"Reg: {student['name']} - {event['event_name']}.")
-            notify_admins(f"Reg: {student['name']} - {event['event_name']}.")
-
-            flash("Successfully registered! Confirmation email with QR code sent.", "success")
+            outcome, detail = registration_service.register(db, session['user_id'], event_id, idempotency_key or None)
             db.close()
-
         except Exception as e:
             db.rollback()
             db.close()
             flash(f"Error during registration: {str(e)}", "error")
+            return redirect(url_for('student.student_dashboard'))
+
+        if outcome == 'registered':
+            dashboard_service.invalidate_registration(session['user_id'], event['coordinator_id'])
+            flash("Successfully registered! Confirmation email with QR code is on its way.", "success")
+        elif outcome == 'waitlisted':
+            flash(f"This event is full. You are number {detail} on the waitlist and will be registered automatically if a seat opens up.", "info")
+        elif outcome == 'replayed':
+            flash("This registration request was already received.", "info")
+        else:
+            flash("You are already registered or on the waitlist for this event.", "info")
+        if clashes and outcome in ('registered', 'waitlisted'):
+            flash(f"Note: the event overlaps your {schedule_service.describe(clashes)}. "
+                  "Once your attendance is marked you can request on-duty from your dashboard.", "warning")
 
         return redirect(url_for('student.student_dashboard'))
     
@@ -203,7 +171,7 @@ def cancel_registration(reg_id):
     cursor = db.cursor(dictionary=True)
     
     cursor.execute("""
-        SELECT r.event_id, e.event_date, r.attendance 
+        SELECT r.event_id, e.event_date, e.coordinator_id, r.attendance 
         FROM registrations r
         JOIN events e ON r.event_id = e.event_id
         WHERE r.registration_id=%s AND r.student_id=%s
@@ -232,8 +200,10 @@ def cancel_registration(reg_id):
         return redirect(url_for('student.student_dashboard'))
 
     try:
-        cursor.execute("DELETE FROM registrations WHERE registration_id=%s", (reg_id,))
-        db.commit()
+        promoted = registration_service.cancel(db, reg_id, record['event_id'])
+        dashboard_service.invalidate_registration(session['user_id'], record['coordinator_id'])
+        if promoted:
+            dashboard_service.invalidate_student(promoted)
         flash("Registration cancelled successfully.", "success")
     except Exception as e:
         db.rollback()
@@ -242,6 +212,22 @@ def cancel_registration(reg_id):
     db.close()
     return redirect(url_for('student.student_dashboard'))
 
+@student_bp.route('/leave-waitlist/<int:event_id>', methods=['POST'])
+@login_required
+@role_required('student')
+def leave_waitlist(event_id):
+    db = get_db_connection()
+    try:
+        if registration_service.leave_waitlist(db, session['user_id'], event_id):
+            flash("You have left the waitlist.", "success")
+        else:
+            flash("You are not on the waitlist for this event.", "info")
+    except Exception as e:
+        db.rollback()
+        flash(f"Error leaving the waitlist: {str(e)}", "error")
+    db.close()
+    return redirect(request.referrer or url_for('student.student_dashboard'))
+
 @student_bp.route('/submit-feedback', methods=['POST'])
 @login_required
 def submit_feedback():
@@ -255,20 +241,19 @@ def submit_feedback():
 
     db = get_db_connection()
     cursor = db.cursor(dictionary=True)
-    
-    cursor.execute("SELECT * FROM feedback WHERE event_id=%s AND student_id=%s", (event_id, student_id))
-    if cursor.fetchone():
-        db.close()
-        flash("You have already submitted feedback.", "warning")
-        return redirect(url_for('student.student_dashboard'))
         
+    # uq_feedback_event_student rejects a second submission
     try:
         cursor.execute("""
             INSERT INTO feedback (event_id, student_id, rating, comments)
             VALUES (%s, %s, %s, %s)
         """, (event_id, student_id, rating, comments))
         db.commit()
+        dashboard_service.invalidate_student(student_id)
         flash("Thank you for your feedback!", "success")
+    except IntegrityError:
+        db.rollback()
+        flash("You have already submitted feedback.", "warning")
     except Exception as e:
         db.rollback()
         flash(f"Error submitting feedback: {str(e)}", "error")
@@ -291,18 +276,25 @@ def student_timetable():
         flash("Student profile not found.", "error")
         return redirect(url_for('student.student_dashboard'))
         
-    cursor.execute("""
-        SELECT t.*, c.course_name, f.name as faculty_name
-        FROM timetable t
-        JOIN courses c ON t.course_id = c.course_id
-        JOIN faculty f ON t.faculty_id = f.faculty_id
-        WHERE c.department = %s AND c.semester = %s
-        ORDER BY FIELD(day, 'Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday'), start_time
-    """, (student['department'], student['semester']))
-    timetable = cursor.fetchall()
+    snapshot = schedule_service.cohort_snapshot(cursor, student['department'], student['semester'])
+    token = schedule_service.feed_token(db, 'student', session['user_id'])
     
     db.close()
-    return render_template('student_timetable.html', timetable=timetable, student=student)
+    return render_template('student_timetable.html', timetable=snapshot['timetable'], student=student,
+                           feed_url=url_for('public.calendar_feed', token=token, _external=True))
+
+@student_bp.route('/student/schedule.<fmt>')
+@login_required
+@role_required('student')
+def student_schedule(fmt):
+    if fmt not in ('json', 'ics'):
+        abort(404)
+    db = get_db_connection()
+    cursor = db.cursor(dictionary=True)
+    department, semester = schedule_service.student_cohort(cursor, session['user_id'])
+    snapshot = schedule_service.cohort_snapshot(cursor, department, semester)
+    db.close()
+    return schedule_service.feed_response(snapshot, fmt, "schedule")
 
 @student_bp.route('/request-onduty/<int:reg_id>')
 @login_required
@@ -322,24 +314,19 @@ def request_onduty(reg_id):
         flash("Cannot request On-Duty. Either attendance not marked or not registered.", "error")
         return redirect(url_for('student.student_dashboard'))
         
-    cursor.execute("""
-        SELECT request_id FROM onduty_requests 
-        WHERE student_id=%s AND event_id=%s
-    """, (session['user_id'], reg['event_id']))
-    existing = cursor.fetchone()
-    
-    if existing:
-        db.close()
-        flash("On-Duty request already submitted for this event.", "warning")
-        return redirect(url_for('student.student_dashboard'))
-        
+    # uq_od_student_event rejects a second request for the same event
     try:
         cursor.execute("""
             INSERT INTO onduty_requests (student_id, event_id, status)
             VALUES (%s, %s, 'Pending')
         """, (session['user_id'], reg['event_id']))
+        stats.bump_total(db, 'pending_ods', 1)
         db.commit()
+        dashboard_service.invalidate_student(session['user_id'])
         flash("On-Duty request submitted successfully!", "success")
+    except IntegrityError:
+        db.rollback()
+        flash("On-Duty request already submitted for this event.", "warning")
     except Exception as e:
         db.rollback()
         flash(f"Error submitting request: {e}", "error")
@@ -362,53 +349,13 @@ def student_exams():
         flash("Student record not found.", "error")
         return redirect(url_for('student.student_dashboard'))
         
-    cursor.execute("""
-        SELECT e.*, c.course_name, c.department, c.semester 
-        FROM exams e 
-        JOIN courses c ON e.course_id = c.course_id 
-        WHERE c.department = %s AND c.semester = %s
-        ORDER BY e.exam_date, e.start_time
-    """, (student['department'], student['semester']))
-    exams = cursor.fetchall()
-    
-    next_exam = None
-    now = datetime.now()
-    
-    for ex in exams:
-        time_str = ""
-        if isinstance(ex['start_time'], timedelta):
-            total_seconds = int(ex['start_time'].total_seconds())
-            hours = total_seconds // 3600
-            minutes = (total_seconds % 3600) // 60
-            time_str = f"{hours:02}:{minutes:02}"
-            ex['start_time'] = time_str
-        else:
-            time_str = str(ex['start_time'])[:5]
-            ex['start_time'] = time_str
-            
-        if isinstance(ex['end_time'], timedelta):
-             total_seconds = int(ex['end_time'].total_seconds())
-             hours = total_seconds // 3600
-             minutes = (total_seconds % 3600) // 60
-             ex['end_time'] = f"{hours:02}:{minutes:02}"
-        else:
-             ex['end_time'] = str(ex['end_time'])[:5]
-
-        if not next_exam:
-            try:
-                dt_str = f"{ex['exam_date']} {time_str}"
-                if len(time_str) == 5:
-                    exam_dt = datetime.strptime(dt_str, '%Y-%m-%d %H:%M')
-                else:
-                    exam_dt = datetime.strptime(dt_str, '%Y-%m-%d %H:%M:%S')
-                    
-                if exam_dt > now:
-                    next_exam = ex
-            except Exception as e:
-                pass
+    # Times are already HH:MM strings in the snapshot
+    snapshot = schedule_service.cohort_snapshot(cursor, student['department'], student['semester'])
+    token = schedule_service.feed_token(db, 'student', session['user_id'])
                 
     db.close()
-    return render_template('student_exams.html', exams=exams, next_exam=next_exam)
+    return render_template('student_exams.html', exams=snapshot['exams'], next_exam=schedule_service.next_exam(snapshot),
+                           feed_url=url_for('public.calendar_feed', token=token, _external=True))
 
 @student_bp.route('/download-certificate/<int:reg_id>')
 @login_required
@@ -420,7 +367,7 @@ def download_certificate(reg_id):
         FROM registrations r
         JOIN student s ON r.student_id = s.student_id
         JOIN events e ON r.event_id = e.event_id
-        WHERE r.registration_id=%s
+        WHERE r.registration_id=%s AND e.deleted_at IS NULL
     """, (reg_id,))
     record = cursor.fetchone()
     db.close()
@@ -435,93 +382,8 @@ def download_certificate(reg_id):
          flash("Certificate not available yet.", "error")
          return redirect(url_for('student.student_dashboard'))
          
-    pdf = FPDF(orientation='L', unit='mm', format='A4')
-    pdf.add_page()
-    
-    pdf.set_line_width(1.0)
-    pdf.set_draw_color(50, 50, 100)
-    pdf.rect(10, 10, 277, 190)
-    
-    pdf.set_line_width(0.5)
-    pdf.set_draw_color(200, 150, 50)
-    pdf.rect(13, 13, 271, 184)
-
-    pdf.set_y(25)
-    pdf.set_font("Times", 'B', 30)
-    pdf.set_text_color(50, 50, 100)
-    pdf.cell(0, 10, 'CAMPUS EVENT PORTAL UNIVERSITY', 0, 1, 'C')
-    
-    pdf.set_y(45)
-    pdf.set_font("Times", 'B', 40)
-    pdf.set_text_color(200, 150, 50)
-    pdf.cell(0, 15, 'CERTIFICATE', 0, 1, 'C')
-    
-    pdf.set_font("Times", '', 18)
-    pdf.set_text_color(0, 0, 0)
-    pdf.cell(0, 10, 'OF PARTICIPATION', 0, 1, 'C')
-
-    pdf.ln(15)
-    pdf.set_font("Arial", '', 16)
-    pdf.cell(0, 10, 'This is to certify that', 0, 1, 'C')
-    
-    pdf.ln(5)
-    pdf.set_font("Times", 'BI', 32)
-    pdf.set_text_color(50, 50, 100)
-    pdf.cell(0, 15, record['student_name'], 0, 1, 'C')
-    
-    pdf.ln(5)
-    pdf.set_font("Arial", '', 16)
-    pdf.set_text_color(0, 0, 0)
-    pdf.cell(0, 10, 'has successfully participated in the event', 0, 1, 'C')
-    
-    pdf.ln(5)
-    pdf.set_font("Helvetica", 'B', 24)
-    pdf.cell(0, 15, record['event_name'].upper(), 0, 1, 'C')
-    
-    pdf.ln(2)
-    pdf.set_font("Arial", '', 14)
-    pdf.cell(0, 10, f"Held on {record['event_date']}", 0, 1, 'C')
-
-    pdf.set_y(-55)
-    
-    pdf.set_x(40)
-    pdf.set_font("Times", 'I', 14)
-    pdf.cell(60, 10, "Coordinator", 0, 1, 'C') 
-    pdf.set_x(40)
-    pdf.cell(60, 0, "__________________________", 0, 1, 'C')
-    pdf.set_x(40)
-    pdf.set_font("Arial", '', 10)
-    pdf.cell(60, 10, "Event Coordinator", 0, 0, 'C')
-
-    pdf.set_xy(133, 155)
-    pdf.set_draw_color(200, 150, 50)
-    pdf.set_line_width(0.5)
-    pdf.ellipse(133.5, 155, 30, 30) 
-    
-    pdf.set_xy(133.5, 165)
-    pdf.set_font("Times", 'B', 8)
-    pdf.set_text_color(200, 150, 50)
-    pdf.cell(30, 5, "OFFICIAL", 0, 1, 'C')
-    pdf.set_xy(133.5, 170)
-    pdf.cell(30, 5, "SEAL", 0, 1, 'C')
-
-    pdf.set_y(-55)
-    pdf.set_x(190)
-    pdf.set_font("Times", 'I', 14)
-    pdf.cell(60, 10, "Dr. Principal Name", 0, 1, 'C')
-    pdf.set_x(190)
-    pdf.cell(60, 0, "__________________________", 0, 1, 'C')
-    pdf.set_x(190)
-    pdf.set_font("Arial", '', 10)
-    pdf.cell(60, 10, "Dean of Students", 0, 0, 'C')
-
-    pdf.set_y(-20)
-    pdf.set_font("Courier", '', 8)
-    pdf.set_text_color(150, 150, 150)
-    reg_id_str = str(record['registration_id']).zfill(6)
-    pdf.cell(0, 10, f"Certificate ID: CEP-{reg_id_str} | Verified by Campus Event Portal", 0, 1, 'C')
-
-    response = make_response(pdf.output(dest='S').encode('latin-1'))
+    # Static layout is drawn once; rendered PDFs are cached per registration (services/certificate_service.py)
+    response = make_response(certificate_service.get_certificate(record))
     response.headers['Content-Type'] = 'application/pdf'
     response.headers['Content-Disposition'] = f'attachment; filename=Certificate_{record["event_name"]}.pdf'
     return response
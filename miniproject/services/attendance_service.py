@@ -0,0 +1,142 @@
+from models import stats
+from utils.cache import Cache
+from utils.helpers import add_notifications
+from services import dashboard_service
+from datetime import datetime
+import time
+
+# qr_token -> (registration_id, student_id, student_name) for one event, so a scan
+# resolves without the registrations/student/events join. Rows are re-checked by
+# primary key before they are marked, so a stale entry can never mark a cancelled registration.
+# Every change to an event's registrations drops its entry through invalidate_tokens().
+_token_index = Cache('attendance:tokens', ttl=3600)
+
+# A token missing from the index triggers a reload (it may belong to a late registration),
+# but at most this often per event so a stream of bad codes cannot hammer the database.
+RELOAD_INTERVAL = 15
+
+MAX_BATCH = 500
+
+def _load_index(cursor, event_id):
+    cursor.execute("""
+        SELECT r.qr_token, r.registration_id, r.student_id, s.name
+        FROM registrations r
+        JOIN student s ON r.student_id = s.student_id
+        WHERE r.event_id = %s
+    """, (event_id,))
+    return {
+        'loaded_at': time.time(),
+        'tokens': {row['qr_token']: (row['registration_id'], row['student_id'], row['name']) for row in cursor.fetchall()}
+    }
+
+def token_index(cursor, event_id, refresh=False):
+    return _token_index.fetch(event_id, lambda: _load_index(cursor, event_id), refresh=refresh)
+
+def invalidate_tokens(event_id):
+    """Registrations for the event were added, cancelled or deleted, or the event itself was deleted."""
+    _token_index.delete(event_id)
+
+def manifest(cursor, event_id):
+    """
+    Every valid token for the event plus those already scanned, for offline validation at the door.
+    Read straight from registrations rather than the token index, which may lag in other workers.
+    """
+    cursor.execute("SELECT qr_token, attendance FROM registrations WHERE event_id = %s", (event_id,))
+    rows = cursor.fetchall()
+    return {
+        'event_id': event_id,
+        'generated_at': datetime.now().isoformat(timespec='seconds'),
+        'tokens': [row['qr_token'] for row in rows],
+        'present': [row['qr_token'] for row in rows if row['attendance'] == 'Present']
+    }
+
+def parse_scanned_at(value):
+    """ISO timestamp from a scanner -> naive server-local datetime, never in the future. None when unusable."""
+    if not value:
+        return None
+    try:
+        scanned_at = datetime.fromisoformat(str(value).replace('Z', '+00:00'))
+    except ValueError:
+        return None
+    if scanned_at.tzinfo is not None:
+        scanned_at = scanned_at.astimezone().replace(tzinfo=None)
+    return min(scanned_at, datetime.now())
+
+def mark_batch(db, event, scans):
+    """
+    Mark attendance for many (qr_token, scanned_at) scans of one event in a single transaction.
+    scanned_at may be None for "now". Returns one result per scan, in order: {'token', 'status', 'name'}
+    where status is 'marked', 'duplicate' (already present, or repeated in the batch) or 'invalid'.
+    Replaying the same scans is harmless; an earlier timestamp for an attendee already marked
+    moves attended_at back to it.
+    """
+    event_id = event['event_id']
+    now = datetime.now()
+    tokens = [token for token, _ in scans]
+    cursor = db.cursor(dictionary=True)
+    index = token_index(cursor, event_id)
+    if any(t not in index['tokens'] for t in tokens) and time.time() - index['loaded_at'] > RELOAD_INTERVAL:
+        index = token_index(cursor, event_id, refresh=True)
+    known = index['tokens']
+
+    reg_ids = list({known[t][0] for t in tokens if t in known})
+    current = {}
+    if reg_ids:
+        placeholders = ", ".join(["%s"] * len(reg_ids))
+        cursor.execute(f"""
+            SELECT registration_id, attendance FROM registrations
+            WHERE registration_id IN ({placeholders}) AND event_id = %s
+            FOR UPDATE
+        """, reg_ids + [event_id])
+        current = {row['registration_id']: row['attendance'] for row in cursor.fetchall()}
+
+    results, to_mark, earliest = [], {}, {}
+    for token, scanned_at in scans:
+        entry = known.get(token)
+        if entry is None or entry[0] not in current:
+            results.append({'token': token, 'status': 'invalid', 'name': None})
+            continue
+        registration_id, student_id, name = entry
+        scanned_at = scanned_at or now
+        earliest[registration_id] = min(scanned_at, earliest.get(registration_id, scanned_at))
+        if registration_id in to_mark or current[registration_id] == 'Present':
+            results.append({'token': token, 'status': 'duplicate', 'name': name})
+            continue
+        to_mark[registration_id] = (student_id, name)
+        results.append({'token': token, 'status': 'marked', 'name': name})
+
+    if to_mark:
+        ids = list(to_mark)
+        cases = " ".join(["WHEN %s THEN %s"] * len(ids))
+        placeholders = ", ".join(["%s"] * len(ids))
+        params = [value for reg_id in ids for value in (reg_id, earliest[reg_id])]
+        cursor.execute(f"""
+            UPDATE registrations
+            SET attendance = 'Present', certificate_status = 'Pending',
+                attended_at = CASE registration_id {cases} END
+            WHERE registration_id IN ({placeholders}) AND (attendance IS NULL OR attendance != 'Present')
+        """, params + ids)
+        stats.record_attendance(db, event_id, cursor.rowcount)
+
+        cursor.execute("SELECT faculty_id FROM faculty WHERE is_admin = 1")
+        admin_ids = [row['faculty_id'] for row in cursor.fetchall()]
+        rows = []
+        for student_id, name in to_mark.values():
+            rows.append((student_id, 'student', f"Attendance marked: {event['event_name']}."))
+            rows.extend((admin_id, 'faculty', f"Certificate Pending Approval: {name} - {event['event_name']}.") for admin_id in admin_ids)
+        add_notifications(rows, db=db)
+
+    # Offline scanners can upload out of order; keep the earliest scan time for attendees already marked
+    backdated = [(ts, reg_id, ts) for reg_id, ts in earliest.items() if reg_id not in to_mark and ts < now]
+    if backdated:
+        cursor.executemany("""
+            UPDATE registrations SET attended_at = %s
+            WHERE registration_id = %s AND (attended_at IS NULL OR attended_at > %s)
+        """, backdated)
+    db.commit()
+
+    if to_mark:
+        for student_id, _ in to_mark.values():
+            dashboard_service.invalidate_student(student_id)
+        dashboard_service.invalidate_faculty(event['coordinator_id'])
+    return results
@@ -0,0 +1,294 @@
+from flask import current_app
+from models.db import get_pooled_connection
+from utils.helpers import add_notifications
+from services import jobs, dashboard_service, processes
+from fpdf import FPDF
+from werkzeug.utils import secure_filename
+import tempfile
+import hashlib
+import zipfile
+import copy
+import glob
+import os
+
+# Bump when the layout changes; every cached PDF is keyed on it and will be rendered again.
+TEMPLATE_VERSION = 1
+
+_template = None
+
+
+def _draw_static(pdf):
+    """Everything on the certificate that is the same for every participant."""
+    pdf.set_line_width(1.0)
+    pdf.set_draw_color(50, 50, 100)
+    pdf.rect(10, 10, 277, 190)
+
+    pdf.set_line_width(0.5)
+    pdf.set_draw_color(200, 150, 50)
+    pdf.rect(13, 13, 271, 184)
+
+    pdf.set_y(25)
+    pdf.set_font("Times", 'B', 30)
+    pdf.set_text_color(50, 50, 100)
+    pdf.cell(0, 10, 'CAMPUS EVENT PORTAL UNIVERSITY', 0, 1, 'C')
+
+    pdf.set_y(45)
+    pdf.set_font("Times", 'B', 40)
+    pdf.set_text_color(200, 150, 50)
+    pdf.cell(0, 15, 'CERTIFICATE', 0, 1, 'C')
+
+    pdf.set_font("Times", '', 18)
+    pdf.set_text_color(0, 0, 0)
+    pdf.cell(0, 10, 'OF PARTICIPATION', 0, 1, 'C')
+
+    pdf.set_y(85)
+    pdf.set_font("Arial", '', 16)
+    pdf.cell(0, 10, 'This is to certify that', 0, 1, 'C')
+
+    pdf.set_y(120)
+    pdf.cell(0, 10, 'has successfully participated in the event', 0, 1, 'C')
+
+    pdf.set_y(155)
+    pdf.set_x(40)
+    pdf.set_font("Times", 'I', 14)
+    pdf.cell(60, 10, "Coordinator", 0, 1, 'C')
+    pdf.set_x(40)
+    pdf.cell(60, 0, "__________________________", 0, 1, 'C')
+    pdf.set_x(40)
+    pdf.set_font("Arial", '', 10)
+    pdf.cell(60, 10, "Event Coordinator", 0, 0, 'C')
+
+    pdf.set_xy(133, 155)
+    pdf.set_draw_color(200, 150, 50)
+    pdf.set_line_width(0.5)
+    pdf.ellipse(133.5, 155, 30, 30)
+
+    pdf.set_xy(133.5, 165)
+    pdf.set_font("Times", 'B', 8)
+    pdf.set_text_color(200, 150, 50)
+    pdf.cell(30, 5, "OFFICIAL", 0, 1, 'C')
+    pdf.set_xy(133.5, 170)
+    pdf.cell(30, 5, "SEAL", 0, 1, 'C')
+
+    pdf.set_y(155)
+    pdf.set_x(190)
+    pdf.set_font("Times", 'I', 14)
+    pdf.set_text_color(0, 0, 0)
+    pdf.cell(60, 10, "Dr. Principal Name", 0, 1, 'C')
+    pdf.set_x(190)
+    pdf.cell(60, 0, "__________________________", 0, 1, 'C')
+    pdf.set_x(190)
+    pdf.set_font("Arial", '', 10)
+    pdf.cell(60, 10, "Dean of Students", 0, 0, 'C')
+
+
+def _draw_fields(pdf, fields):
+    pdf.set_y(100)
+    pdf.set_font("Times", 'BI', 32)
+    pdf.set_text_color(50, 50, 100)
+    pdf.cell(0, 15, fields['student_name'], 0, 1, 'C')
+
+    pdf.set_y(135)
+    pdf.set_font("Helvetica", 'B', 24)
+    pdf.set_text_color(0, 0, 0)
+    pdf.cell(0, 15, fields['event_name'].upper(), 0, 1, 'C')
+
+    pdf.set_y(152)
+    pdf.set_font("Arial", '', 14)
+    pdf.cell(0, 10, f"Held on {fields['event_date']}", 0, 1, 'C')
+
+    pdf.set_y(190)
+    pdf.set_font("Courier", '', 8)
+    pdf.set_text_color(150, 150, 150)
+    reg_id_str = str(fields['registration_id']).zfill(6)
+    pdf.cell(0, 10, f"Certificate ID: CEP-{reg_id_str} | Verified by Campus Event Portal", 0, 1, 'C')
+
+
+def _get_template():
+    """The static layout, drawn once per process."""
+    global _template
+    if _template is None:
+        pdf = FPDF(orientation='L', unit='mm', format='A4')
+        # The footer sits inside the bottom margin; with auto page break on it spilled onto a second page
+        pdf.set_auto_page_break(False)
+        pdf.add_page()
+        _draw_static(pdf)
+        _template = pdf
+    return _template
+
+
+def _clone(template):
+    """A copy of the template document that can be drawn on without touching the original."""
+    pdf = copy.copy(template)
+    pdf.pages = dict(template.pages)
+    pdf.fonts = {key: dict(font) for key, font in template.fonts.items()}
+    for attr in ('offsets', 'orientation_changes', 'font_files', 'diffs', 'images', 'page_links', 'links'):
+        setattr(pdf, attr, copy.deepcopy(getattr(template, attr)))
+    return pdf
+
+
+def render(fields):
+    """
+    fields: registration_id, student_name, event_name, event_date. Returns the PDF bytes.
+    Module level (and free of Flask) so process pool workers can call it.
+    """
+    pdf = _clone(_get_template())
+    _draw_fields(pdf, fields)
+    return pdf.output(dest='S').encode('latin-1')
+
+
+def certificate_fields(record):
+    return {
+        'registration_id': record['registration_id'],
+        'student_name': record['student_name'],
+        'event_name': record['event_name'],
+        'event_date': str(record['event_date'])
+    }
+
+
+def _cache_dir():
+    path = current_app.config.get('CERTIFICATE_CACHE_DIR') or os.path.join(tempfile.gettempdir(), 'eventura-certificates')
+    os.makedirs(path, exist_ok=True)
+    return path
+
+
+def _cache_path(fields):
+    """
+    <registration_id>-<digest>.pdf, where the digest covers the template version and every
+    field printed. Renaming a student or an event yields a new version instead of a stale hit.
+    """
+    key = "|".join([str(TEMPLATE_VERSION), str(fields['registration_id']), fields['student_name'],
+                    fields['event_name'], fields['event_date']])
+    digest = hashlib.sha256(key.encode('utf-8')).hexdigest()[:24]
+    return os.path.join(_cache_dir(), f"{fields['registration_id']}-{digest}.pdf")
+
+
+def _store(path, registration_id, data):
+    # Drop older versions for this registration, then publish atomically
+    for old in glob.glob(os.path.join(os.path.dirname(path), f"{registration_id}-*.pdf")):
+        if old != path:
+            try:
+                os.remove(old)
+            except OSError:
+                pass
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, 'wb') as f:
+        f.write(data)
+    os.replace(tmp, path)
+
+
+def get_certificate(record):
+    """PDF bytes for an approved registration row, from the cache when possible."""
+    fields = certificate_fields(record)
+    path = _cache_path(fields)
+    try:
+        with open(path, 'rb') as f:
+            return f.read()
+    except FileNotFoundError:
+        pass
+    data = render(fields)
+    _store(path, fields['registration_id'], data)
+    return data
+
+
+def approved_records(cursor, event_id):
+    cursor.execute("""
+        SELECT r.registration_id, s.name as student_name, e.event_name, e.event_date
+        FROM registrations r
+        JOIN student s ON r.student_id = s.student_id
+        JOIN events e ON r.event_id = e.event_id
+        WHERE r.event_id = %s AND r.certificate_status = 'Approved' AND e.deleted_at IS NULL
+        ORDER BY s.name
+    """, (event_id,))
+    return cursor.fetchall()
+
+
+def approve(db, registration_ids=None, event_id=None, present_only=False):
+    """
+    Approve pending certificates in one transaction: the given registrations, every pending one
+    for an event, and/or only those with attendance 'Present'. Returns the approved registration ids.
+    """
+    conditions, params = ["certificate_status = 'Pending'"], []
+    if registration_ids is not None:
+        if not registration_ids:
+            return []
+        conditions.append(f"registration_id IN ({', '.join(['%s'] * len(registration_ids))})")
+        params.extend(registration_ids)
+    if event_id is not None:
+        conditions.append("event_id = %s")
+        params.append(event_id)
+    if present_only:
+        conditions.append("attendance = 'Present'")
+
+    cursor = db.cursor()
+    cursor.execute(f"SELECT registration_id, student_id FROM registrations WHERE {' AND '.join(conditions)} FOR UPDATE", params)
+    rows = cursor.fetchall()
+    if not rows:
+        db.rollback()
+        return []
+
+    approved = [reg_id for reg_id, _ in rows]
+    for i in range(0, len(approved), 1000):
+        chunk = approved[i:i + 1000]
+        cursor.execute(f"""
+            UPDATE registrations SET certificate_status = 'Approved'
+            WHERE registration_id IN ({', '.join(['%s'] * len(chunk))})
+        """, chunk)
+    add_notifications([(student_id, 'student', "Your certificate has been approved! Download it now.") for _, student_id in rows], db=db)
+    db.commit()
+
+    for student_id in {student_id for _, student_id in rows}:
+        dashboard_service.invalidate_student(student_id)
+    prewarm(approved)
+    return approved
+
+
+def prewarm(registration_ids):
+    """Render freshly approved certificates in the background, ahead of the download rush."""
+    return jobs.submit("certificate-prewarm", _prewarm, list(registration_ids))
+
+
+def _prewarm(job, registration_ids):
+    job.set_total(len(registration_ids))
+    for i in range(0, len(registration_ids), 500):
+        chunk = registration_ids[i:i + 500]
+        placeholders = ", ".join(["%s"] * len(chunk))
+        db = get_pooled_connection()
+        try:
+            cursor = db.cursor(dictionary=True)
+            cursor.execute(f"""
+                SELECT r.registration_id, s.name as student_name, e.event_name, e.event_date
+                FROM registrations r
+                JOIN student s ON r.student_id = s.student_id
+                JOIN events e ON r.event_id = e.event_id
+                WHERE r.registration_id IN ({placeholders}) AND r.certificate_status = 'Approved'
+            """, chunk)
+            records = cursor.fetchall()
+        finally:
+            db.close()
+        for record in records:
+            get_certificate(record)
+        job.advance(len(chunk))
+
+
+def event_certificates_zip(records):
+    """
+    Write a ZIP of certificates for the given registration rows to a temp file and return its path.
+    Cached PDFs are reused; the rest are rendered in a process pool.
+    """
+    fields = [certificate_fields(r) for r in records]
+    paths = [_cache_path(f) for f in fields]
+    missing = [(f, p) for f, p in zip(fields, paths) if not os.path.exists(p)]
+
+    if missing:
+        rendered = processes.run_all(render, [f for f, _ in missing], chunksize=16)
+        for (f, path), data in zip(missing, rendered):
+            _store(path, f['registration_id'], data)
+
+    tmp = tempfile.NamedTemporaryFile(suffix='.zip', delete=False)
+    with zipfile.ZipFile(tmp, 'w', zipfile.ZIP_STORED) as zf:
+        for f, path in zip(fields, paths):
+            reg_id_str = str(f['registration_id']).zfill(6)
+            zf.write(path, secure_filename(f"CEP-{reg_id_str}_{f['student_name']}.pdf"))
+    tmp.close()
+    return tmp.name
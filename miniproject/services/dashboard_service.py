@@ -0,0 +1,53 @@
+from utils.cache import Cache
+
+# Read models for the landing dashboards. Entries are dropped by the write paths that change
+# them; the TTL only bounds how long a missed invalidation can linger.
+_student_rows = Cache('dashboard:student', ttl=900)
+_faculty_views = Cache('dashboard:faculty', ttl=900)
+_event_list = Cache('dashboard:events', ttl=900)
+
+def student_registrations(cursor, student_id):
+    def build():
+        cursor.execute("""
+            SELECT e.event_id, e.event_name, e.event_date, e.location, r.attendance, r.certificate_status, r.registration_id,
+            (SELECT COUNT(*) FROM feedback f WHERE f.event_id=r.event_id AND f.student_id=r.student_id) as feedback_count,
+            od.status as od_status
+            FROM registrations r
+            JOIN events e ON r.event_id=e.event_id
+            LEFT JOIN onduty_requests od ON r.event_id = od.event_id AND r.student_id = od.student_id
+            WHERE r.student_id=%s AND e.deleted_at IS NULL
+        """, (student_id,))
+        return cursor.fetchall()
+    rows = _student_rows.fetch(student_id, build)
+    # Copies, so per-request fields never leak into the cached rows
+    return [dict(r) for r in rows]
+
+def all_events(cursor):
+    def build():
+        cursor.execute("SELECT * FROM events WHERE deleted_at IS NULL ORDER BY event_date")
+        return cursor.fetchall()
+    events = _event_list.fetch('all', build)
+    return [dict(e) for e in events]
+
+def faculty_dashboard_view(cursor, faculty_id, build):
+    """build(cursor, faculty_id) computes the template context on a miss."""
+    return _faculty_views.fetch(faculty_id, lambda: build(cursor, faculty_id))
+
+def invalidate_student(student_id):
+    _student_rows.delete(student_id)
+
+def invalidate_faculty(faculty_id):
+    if faculty_id is not None:
+        _faculty_views.delete(faculty_id)
+
+def invalidate_events(all_students=False, all_faculty=False):
+    """The event list changed. all_students/all_faculty also drop every per-user view (e.g. an event was deleted)."""
+    _event_list.clear()
+    if all_students:
+        _student_rows.clear()
+    if all_faculty:
+        _faculty_views.clear()
+
+def invalidate_registration(student_id, coordinator_id):
+    invalidate_student(student_id)
+    invalidate_faculty(coordinator_id)
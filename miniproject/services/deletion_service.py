@@ -0,0 +1,230 @@
+import click
+from models.db import get_pooled_connection
+from models import stats
+from services import jobs, dashboard_service, timetable_service, schedule_service, registration_service, attendance_service
+
+# What goes with each kind of record: (table, primary key, [(child table, child primary key, filter)]).
+# Children are purged in chunks before the parent row, each chunk in its own short transaction,
+# so a large delete never holds thousands of row locks at once. Notifications carry no event
+# reference, so an event's notifications stay with the users they were sent to.
+CASCADE = {
+    'event': ('events', 'event_id', [
+        ('registrations', 'registration_id', "event_id = %s"),
+        ('feedback', 'feedback_id', "event_id = %s"),
+        ('onduty_requests', 'request_id', "event_id = %s"),
+        ('event_waitlist', 'waitlist_id', "event_id = %s")
+    ]),
+    'student': ('student', 'student_id', [
+        # Off the waitlists first, so the seats freed below are never offered back to this student
+        ('event_waitlist', 'waitlist_id', "student_id = %s"),
+        ('registrations', 'registration_id', "student_id = %s"),
+        ('feedback', 'feedback_id', "student_id = %s"),
+        ('onduty_requests', 'request_id', "student_id = %s"),
+        ('notifications', 'notification_id', "user_id = %s AND user_role = 'student'"),
+        ('registration_requests', 'idempotency_key', "student_id = %s"),
+        ('exam_seating', 'seat_id', "student_id = %s")
+    ]),
+    'course': ('courses', 'course_id', [
+        ('timetable', 'timetable_id', "course_id = %s"),
+        ('exam_seating', 'seat_id', "exam_id IN (SELECT exam_id FROM exams WHERE course_id = %s)"),
+        ('exams', 'exam_id', "course_id = %s")
+    ]),
+    'exam': ('exams', 'exam_id', [
+        ('exam_seating', 'seat_id', "exam_id = %s")
+    ]),
+    'hall': ('exam_halls', 'hall_id', [
+        ('exam_seating', 'seat_id', "hall_id = %s")
+    ])
+}
+
+DELETE_CHUNK = 1000
+
+# Cascades with more dependent rows than this run as a background job
+BACKGROUND_THRESHOLD = 5000
+
+
+def _registrations_deleted(db, kind, rows):
+    per_event = {}
+    for row in rows:
+        counts = per_event.setdefault(row['event_id'], [0, 0])
+        counts[0] += 1
+        counts[1] += row['attendance'] == 'Present'
+    for event_id, (registrations, attended) in per_event.items():
+        stats.record_registration(db, event_id, -registrations)
+        if attended:
+            stats.record_attendance(db, event_id, -attended)
+
+    promoted = []
+    if kind == 'student':
+        # A deleted student's seats at upcoming events go to the waitlist, as a cancellation's would
+        cursor = db.cursor()
+        event_ids = list(per_event)
+        cursor.execute(f"""
+            SELECT event_id FROM events
+            WHERE event_id IN ({', '.join(['%s'] * len(event_ids))}) AND deleted_at IS NULL AND event_date >= CURDATE()
+        """, event_ids)
+        for (event_id,) in cursor.fetchall():
+            for _ in range(per_event[event_id][0]):
+                result = registration_service.promote(db, event_id)
+                if not result:
+                    break
+                promoted.append(result)
+
+    def after_commit():
+        for event_id in per_event:
+            attendance_service.invalidate_tokens(event_id)
+        for _, student_id in promoted:
+            dashboard_service.invalidate_student(student_id)
+    return after_commit
+
+
+def _onduty_deleted(db, kind, rows):
+    pending = sum(1 for row in rows if row['status'] == 'Pending')
+    if pending:
+        stats.bump_total(db, 'pending_ods', -pending)
+
+
+def _timetable_deleted(db, kind, rows):
+    timetable_service.bump_version(db.cursor())
+
+
+# Columns read with each chunk, and the update made in the same transaction as its delete.
+# The hook may return a callable to run once that transaction has committed.
+COUNTERS = {
+    'registrations': (", event_id, attendance", _registrations_deleted),
+    'onduty_requests': (", status", _onduty_deleted),
+    'timetable': ("", _timetable_deleted)
+}
+
+
+def dependent_rows(db, kind, key):
+    """Number of child rows the cascade for one record would remove."""
+    cursor = db.cursor()
+    total = 0
+    for table, _, where in CASCADE[kind][2]:
+        cursor.execute(f"SELECT COUNT(*) FROM {table} WHERE {where}", (key,))
+        total += cursor.fetchone()[0]
+    return total
+
+
+def _purge_table(db, kind, table, pk, where, key, job=None):
+    """Delete every matching row, DELETE_CHUNK at a time. Returns the number deleted."""
+    columns, on_delete = COUNTERS.get(table, ("", None))
+    cursor = db.cursor(dictionary=True)
+    deleted = 0
+    while True:
+        cursor.execute(f"SELECT {pk}{columns} FROM {table} WHERE {where} LIMIT {DELETE_CHUNK} FOR UPDATE", (key,))
+        rows = cursor.fetchall()
+        if not rows:
+            db.rollback()
+            return deleted
+        ids = [row[pk] for row in rows]
+        cursor.execute(f"DELETE FROM {table} WHERE {pk} IN ({', '.join(['%s'] * len(ids))})", ids)
+        after_commit = on_delete(db, kind, rows) if on_delete else None
+        db.commit()
+        if after_commit:
+            after_commit()
+        deleted += len(ids)
+        if job:
+            job.advance(len(ids))
+
+
+def _finish(db, kind, key):
+    """Remove the parent row once nothing refers to it any more."""
+    table, pk, _ = CASCADE[kind]
+    cursor = db.cursor()
+    cursor.execute(f"DELETE FROM {table} WHERE {pk} = %s", (key,))
+    if not cursor.rowcount:
+        # Already gone (purged twice): the counters were adjusted the first time
+        db.rollback()
+        return
+    if kind == 'event':
+        stats.record_event_deleted(db, key)
+    elif kind == 'student':
+        stats.bump_total(db, 'total_students', -1)
+    db.commit()
+
+
+def _invalidate(kind, key, coordinator_id=None):
+    if kind == 'event':
+        dashboard_service.invalidate_events(all_students=True)
+        dashboard_service.invalidate_faculty(coordinator_id)
+        attendance_service.invalidate_tokens(key)
+    elif kind == 'student':
+        dashboard_service.invalidate_student(key)
+        dashboard_service.invalidate_events(all_faculty=True)
+    elif kind == 'course':
+        timetable_service.invalidate()
+        schedule_service.invalidate()
+    elif kind == 'exam':
+        schedule_service.invalidate()
+
+
+def purge(job, kind, key, coordinator_id=None, db=None):
+    """
+    Delete one record and everything that depends on it. job may be None when run inline; db is
+    the caller's connection when there is one (inline, in a request), else one is checked out.
+    Returns False without doing anything while another purge of the same record is running.
+    """
+    own = db is None
+    if own:
+        db = get_pooled_connection()
+    # Held by the connection, so it also fences off purges in other processes (the CLI command)
+    # and is dropped by the server if this one dies
+    lock = f"eventura-purge-{kind}-{key}"
+    cursor = db.cursor()
+    cursor.execute("SELECT GET_LOCK(%s, 0)", (lock,))
+    if cursor.fetchone()[0] != 1:
+        if own:
+            db.close()
+        return False
+    try:
+        if job:
+            job.set_total(dependent_rows(db, kind, key))
+            db.rollback()
+        for table, pk, where in CASCADE[kind][2]:
+            _purge_table(db, kind, table, pk, where, key, job)
+        _finish(db, kind, key)
+    finally:
+        cursor.execute("SELECT RELEASE_LOCK(%s)", (lock,))
+        cursor.fetchone()
+        if own:
+            db.close()
+    _invalidate(kind, key, coordinator_id)
+    return True
+
+
+def delete(db, kind, key, coordinator_id=None):
+    """
+    Delete a record with its dependents. Events are hidden straight away (deleted_at) and then purged.
+    Small cascades run inline; large ones are handed to a background job, which is returned (else None).
+    """
+    if kind == 'event':
+        cursor = db.cursor()
+        cursor.execute("UPDATE events SET deleted_at = NOW() WHERE event_id = %s AND deleted_at IS NULL", (key,))
+        db.commit()
+        _invalidate(kind, key, coordinator_id)
+
+    if dependent_rows(db, kind, key) > BACKGROUND_THRESHOLD:
+        db.rollback()
+        return jobs.submit(f"delete-{kind}-{key}", purge, kind, key, coordinator_id)
+    db.rollback()
+    purge(None, kind, key, coordinator_id, db)
+    return None
+
+
+def init_app(app):
+    @app.cli.command('purge-deleted-events')
+    def purge_deleted_events_command():
+        """Finish purging events that were hidden but not fully deleted (e.g. after a restart)."""
+        db = get_pooled_connection()
+        try:
+            cursor = db.cursor()
+            cursor.execute("SELECT event_id, coordinator_id FROM events WHERE deleted_at IS NOT NULL")
+            pending = cursor.fetchall()
+            db.rollback()
+        finally:
+            db.close()
+        purged = sum(1 for event_id, coordinator_id in pending if purge(None, 'event', event_id, coordinator_id))
+        skipped = len(pending) - purged
+        click.echo(f"Purged {purged} event(s)" + (f"; {skipped} already being purged." if skipped else "."))
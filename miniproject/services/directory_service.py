@@ -0,0 +1,68 @@
+# Paged, filtered reads behind the admin user directory. Pages are keyset-paginated on
+# (name, id), so page N costs the same as page 1, and only the columns shown are selected.
+
+STUDENT_COLUMNS = "student_id, name, register_number, email, department, semester"
+FACULTY_COLUMNS = "faculty_id, name, email, department, is_admin"
+
+def _prefix(value):
+    """LIKE pattern for a prefix match, with the user's wildcards escaped so the index can be used."""
+    return value.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_') + '%'
+
+def _page(cursor, table, columns, id_col, conditions, params, after, limit):
+    if after:
+        after_name, after_id = after
+        conditions = conditions + [f"(name > %s OR (name = %s AND {id_col} > %s))"]
+        params = params + [after_name, after_name, after_id]
+    where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+    cursor.execute(f"""
+        SELECT {columns} FROM {table}
+        {where}
+        ORDER BY name, {id_col}
+        LIMIT %s
+    """, params + [limit + 1])
+    rows = cursor.fetchall()
+    next_after = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_after = {'after_name': rows[-1]['name'], 'after_id': rows[-1][id_col]}
+    return rows, next_after
+
+def search_students(cursor, q=None, department=None, semester=None, after=None, limit=50):
+    """
+    q matches the start of the register number when it contains a digit, otherwise the start of the name.
+    Returns (rows, next_after) where next_after feeds the following page or is None on the last one.
+    """
+    conditions, params = [], []
+    if q:
+        column = 'register_number' if any(ch.isdigit() for ch in q) else 'name'
+        conditions.append(f"{column} LIKE %s")
+        params.append(_prefix(q))
+    if department:
+        conditions.append("department = %s")
+        params.append(department)
+    if semester:
+        conditions.append("semester = %s")
+        params.append(semester)
+    return _page(cursor, 'student', STUDENT_COLUMNS, 'student_id', conditions, params, after, limit)
+
+def search_faculty(cursor, q=None, department=None, after=None, limit=50):
+    """q matches the start of the name, or of the email when it contains '@'."""
+    conditions, params = [], []
+    if q:
+        column = 'email' if '@' in q else 'name'
+        conditions.append(f"{column} LIKE %s")
+        params.append(_prefix(q))
+    if department:
+        conditions.append("department = %s")
+        params.append(department)
+    return _page(cursor, 'faculty', FACULTY_COLUMNS, 'faculty_id', conditions, params, after, limit)
+
+def departments(cursor):
+    """Distinct departments across students and faculty, for the filter dropdown (index-only scans)."""
+    cursor.execute("""
+        SELECT department FROM student WHERE department IS NOT NULL GROUP BY department
+        UNION
+        SELECT department FROM faculty WHERE department IS NOT NULL GROUP BY department
+        ORDER BY department
+    """)
+    return [row['department'] for row in cursor.fetchall()]
@@ -1,35 +1,243 @@
 from flask_mail import Message
-from threading import Thread
 from extensions import mail
 from flask import current_app
+from models.db import get_pooled_connection
+from io import BytesIO
+import qrcode
+import threading
+import base64
+import json
+import time
+
+_workers = []
+_wakeup = threading.Event()
+
+
+class RateLimiter:
+    """Token bucket shared by all workers in this process; acquire() blocks until a send is allowed."""
+
+    def __init__(self, per_minute):
+        self.rate = per_minute / 60.0
+        self.capacity = max(1.0, per_minute / 60.0 * 5)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+
+def _encode_attachments(attachments):
+    if not attachments:
+        return None
+    encoded = []
+    for att in attachments:
+        if 'qr' in att:
+            # Rendered by the worker at send time; only the token is stored
+            encoded.append({k: att[k] for k in ('filename', 'content_type', 'qr', 'disposition', 'headers') if k in att})
+            continue
+        encoded.append({
+            'filename': att['filename'],
+            'content_type': att['content_type'],
+            'data': base64.b64encode(att['data']).decode('ascii'),
+            'disposition': att.get('disposition', 'attachment'),
+            'headers': att.get('headers')
+        })
+    return json.dumps(encoded)
 
-def send_async_email(app, msg):
-    with app.app_context():
-        try:
-            mail.send(msg)
-        except Exception as e:
-            print(f"Error sending async email: {e}")
 
-def send_email(subject, recipients, body=None, html=None, attachments=None):
+def _enqueue(rows, db=None):
+    """rows: list of (subject, recipients_json, body, html, attachments_json)"""
+    own = db is None
+    if own:
+        db = get_pooled_connection()
+    try:
+        cursor = db.cursor()
+        for i in range(0, len(rows), 500):
+            chunk = rows[i:i + 500]
+            placeholders = ", ".join(["(%s, %s, %s, %s, %s)"] * len(chunk))
+            params = [value for row in chunk for value in row]
+            cursor.execute(f"""
+                INSERT INTO email_outbox (subject, recipients, body, html, attachments)
+                VALUES {placeholders}
+            """, params)
+        if own:
+            db.commit()
+    finally:
+        if own:
+            db.close()
+    _wakeup.set()
+
+
+def send_email(subject, recipients, body=None, html=None, attachments=None, db=None):
     """
-    Send email asynchronously.
-    attachments: list of dicts with keys: filename, content_type, data, disposition (optional), headers (optional)
+    Queue an email in the outbox; the delivery workers send it.
+    attachments: list of dicts with keys: filename, content_type, data, disposition (optional), headers (optional);
+    'qr': text instead of data attaches that text as a QR code PNG.
+    db: pass a connection to enqueue inside the caller's transaction.
     """
-    app = current_app._get_current_object()
-    msg = Message(subject=subject, recipients=recipients, sender=app.config['MAIL_USERNAME'])
-    if body:
-        msg.body = body
-    if html:
-        msg.html = html
-        
-    if attachments:
-        for att in attachments:
+    _enqueue([(subject, json.dumps(list(recipients)), body, html, _encode_attachments(attachments))], db=db)
+
+
+def send_bulk_email(subject, recipients, body=None, html=None, chunk_size=None, progress=None):
+    """
+    Queue the same message for many recipients (one message each, so addresses stay private).
+    progress: optional callable(queued, failed) invoked after every chunk.
+    """
+    chunk_size = chunk_size or current_app.config.get('MAIL_CHUNK_SIZE', 100)
+    recipients = list(recipients)
+    for i in range(0, len(recipients), chunk_size):
+        chunk = recipients[i:i + chunk_size]
+        _enqueue([(subject, json.dumps([r]), body, html, None) for r in chunk])
+        if progress:
+            progress(len(chunk), 0)
+    return 0
+
+
+def _render_qr(text):
+    buffer = BytesIO()
+    qrcode.make(text).save(buffer, format="PNG")
+    return buffer.getvalue()
+
+
+def _build_message(app, row):
+    msg = Message(subject=row['subject'], recipients=json.loads(row['recipients']), sender=app.config['MAIL_USERNAME'])
+    if row['body']:
+        msg.body = row['body']
+    if row['html']:
+        msg.html = row['html']
+    if row['attachments']:
+        for att in json.loads(row['attachments']):
             msg.attach(
                 att['filename'],
                 att['content_type'],
-                att['data'],
+                _render_qr(att['qr']) if 'qr' in att else base64.b64decode(att['data']),
                 att.get('disposition', 'attachment'),
                 headers=att.get('headers')
             )
+    return msg
+
+
+class OutboxWorker(threading.Thread):
+    def __init__(self, app, limiter, index):
+        super().__init__(name=f"outbox-worker-{index}", daemon=True)
+        self.app = app
+        self.limiter = limiter
+        self.batch_size = app.config.get('MAIL_BATCH_SIZE', 20)
+        self.max_attempts = app.config.get('MAIL_MAX_ATTEMPTS', 5)
+        self.backoff = app.config.get('MAIL_RETRY_BACKOFF', 60)
+        self.poll_interval = app.config.get('MAIL_POLL_INTERVAL', 5)
+
+    def run(self):
+        with self.app.app_context():
+            while True:
+                try:
+                    batch = self._claim()
+                    if not batch:
+                        _wakeup.wait(self.poll_interval)
+                        _wakeup.clear()
+                        continue
+                    # Keep the SMTP session open for as long as there is work queued
+                    with mail.connect() as conn:
+                        while batch:
+                            self._deliver(conn, batch)
+                            batch = self._claim()
+                except Exception as e:
+                    print(f"Outbox worker error: {e}")
+                    time.sleep(self.poll_interval)
+
+    def _claim(self):
+        db = get_pooled_connection()
+        try:
+            cursor = db.cursor(dictionary=True)
+            # Rows stuck in 'sending' belong to a worker that died mid-batch
+            cursor.execute("""
+                SELECT outbox_id FROM email_outbox
+                WHERE (status = 'pending' AND next_attempt_at <= NOW())
+                   OR (status = 'sending' AND claimed_at < NOW() - INTERVAL 10 MINUTE)
+                ORDER BY outbox_id
+                LIMIT %s
+                FOR UPDATE SKIP LOCKED
+            """, (self.batch_size,))
+            ids = [row['outbox_id'] for row in cursor.fetchall()]
+            if not ids:
+                db.rollback()
+                return []
+            placeholders = ", ".join(["%s"] * len(ids))
+            cursor.execute(f"""
+                UPDATE email_outbox SET status = 'sending', claimed_at = NOW()
+                WHERE outbox_id IN ({placeholders})
+            """, ids)
+            cursor.execute(f"""
+                SELECT outbox_id, subject, recipients, body, html, attachments, attempts
+                FROM email_outbox WHERE outbox_id IN ({placeholders})
+            """, ids)
+            rows = cursor.fetchall()
+            db.commit()
+            return rows
+        finally:
+            db.close()
+
+    def _deliver(self, conn, batch):
+        sent, failed = [], []
+        for row in batch:
+            self.limiter.acquire()
+            try:
+                conn.send(_build_message(self.app, row))
+                sent.append(row['outbox_id'])
+            except Exception as e:
+                failed.append((row, str(e)))
+        self._record(sent, failed)
+
+    def _record(self, sent, failed):
+        db = get_pooled_connection()
+        try:
+            cursor = db.cursor()
+            if sent:
+                placeholders = ", ".join(["%s"] * len(sent))
+                cursor.execute(f"""
+                    UPDATE email_outbox SET status = 'sent', sent_at = NOW(), last_error = NULL
+                    WHERE outbox_id IN ({placeholders})
+                """, sent)
+            for row, error in failed:
+                attempts = row['attempts'] + 1
+                status = 'dead' if attempts >= self.max_attempts else 'pending'
+                delay = self.backoff * (2 ** (attempts - 1))
+                cursor.execute("""
+                    UPDATE email_outbox
+                    SET status = %s, attempts = %s, last_error = %s,
+                        next_attempt_at = NOW() + INTERVAL %s SECOND
+                    WHERE outbox_id = %s
+                """, (status, attempts, error[:2000], delay, row['outbox_id']))
+            db.commit()
+        finally:
+            db.close()
+
+
+def init_app(app):
+    limiter = RateLimiter(app.config.get('MAIL_RATE_PER_MINUTE', 120))
+    for i in range(app.config.get('MAIL_WORKERS', 2)):
+        worker = OutboxWorker(app, limiter, i)
+        worker.start()
+        _workers.append(worker)
+
 
-    Thread(target=send_async_email, args=(app, msg)).start()
+def outbox_stats():
+    db = get_pooled_connection()
+    try:
+        cursor = db.cursor(dictionary=True)
+        cursor.execute("SELECT status, COUNT(*) as count FROM email_outbox GROUP BY status")
+        stats = {row['status']: row['count'] for row in cursor.fetchall()}
+    finally:
+        db.close()
+    stats['workers'] = sum(1 for w in _workers if w.is_alive())
+    return stats
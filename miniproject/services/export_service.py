@@ -0,0 +1,148 @@
+from flask import Response, current_app, stream_with_context
+from models.db import get_db_connection
+from werkzeug.utils import secure_filename
+import openpyxl
+from openpyxl.utils import get_column_letter
+import tempfile
+import csv
+import io
+import os
+
+# (header, SQL expression). Blank values are filled in SQL so the width query sees what is written.
+ATTENDANCE_COLUMNS = [
+    ("Name", "s.name"),
+    ("Register Number", "s.register_number"),
+    ("Department", "s.department"),
+    ("Semester", "s.semester"),
+    ("Email", "s.email"),
+    ("Attendance Status", "COALESCE(r.attendance, 'Absent')"),
+    ("Certificate Status", "COALESCE(r.certificate_status, 'Not Issued')")
+]
+
+EVENT_COLUMNS = [
+    ("Event", "e.event_name"),
+    ("Event Date", "e.event_date")
+]
+
+XLSX_TYPE = "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+
+
+def _iter_rows(select, params):
+    """
+    Yield result rows in chunks from an unbuffered cursor, so only one chunk is ever in memory.
+    Reads on the request's own connection (stream_with_context keeps it until the stream ends):
+    a second checkout per export would let concurrent exports exhaust the pool.
+    """
+    chunk_size = current_app.config.get('EXPORT_CHUNK_SIZE', 1000)
+    db = get_db_connection()
+    try:
+        cursor = db.cursor(buffered=False)
+        cursor.execute(select, params)
+        while True:
+            rows = cursor.fetchmany(chunk_size)
+            if not rows:
+                break
+            yield from rows
+    finally:
+        db.close()
+
+
+def _select(columns, source, order_by):
+    return f"SELECT {', '.join(expr for _, expr in columns)} {source} ORDER BY {order_by}"
+
+
+def _column_widths(columns, source, params):
+    """
+    Write-only sheets need their column widths before the first row, so the widths come
+    from one aggregate over the same rows instead of a second pass over the cells.
+    """
+    db = get_db_connection()
+    try:
+        cursor = db.cursor()
+        cursor.execute(f"SELECT {', '.join(f'MAX(CHAR_LENGTH({expr}))' for _, expr in columns)} {source}", params)
+        longest = cursor.fetchone()
+    finally:
+        db.close()
+    return [max(len(header), length or 0) + 2 for (header, _), length in zip(columns, longest)]
+
+
+def csv_response(filename, columns, source, params, order_by):
+    def generate():
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        writer.writerow([header for header, _ in columns])
+        for i, row in enumerate(_iter_rows(_select(columns, source, order_by), params), 1):
+            writer.writerow(row)
+            if i % 500 == 0:
+                yield buffer.getvalue()
+                buffer.seek(0)
+                buffer.truncate()
+        yield buffer.getvalue()
+
+    return Response(stream_with_context(generate()), mimetype='text/csv', headers={
+        "Content-Disposition": f"attachment; filename={secure_filename(filename)}.csv"
+    })
+
+
+def xlsx_response(filename, sheet_title, columns, source, params, order_by):
+    wb = openpyxl.Workbook(write_only=True)
+    ws = wb.create_sheet(sheet_title)
+    for i, width in enumerate(_column_widths(columns, source, params), 1):
+        ws.column_dimensions[get_column_letter(i)].width = width
+
+    ws.append([header for header, _ in columns])
+    for row in _iter_rows(_select(columns, source, order_by), params):
+        ws.append(list(row))
+
+    # The xlsx zip is only complete once saved, so it is spooled to disk and streamed from there
+    tmp = tempfile.NamedTemporaryFile(suffix='.xlsx', delete=False)
+    tmp.close()
+    wb.save(tmp.name)
+    return temp_file_response(tmp.name, XLSX_TYPE, f"{secure_filename(filename)}.xlsx")
+
+
+def temp_file_response(path, mimetype, download_name):
+    """Stream a spooled file in blocks and delete it once the response is closed."""
+    size = os.path.getsize(path)
+
+    def generate():
+        with open(path, 'rb') as f:
+            while True:
+                block = f.read(64 * 1024)
+                if not block:
+                    break
+                yield block
+
+    response = Response(generate(), mimetype=mimetype, headers={
+        "Content-Disposition": f"attachment; filename={download_name}",
+        "Content-Length": str(size)
+    })
+    # Runs even when the client disconnects before the body is read
+    response.call_on_close(lambda: os.remove(path))
+    return response
+
+
+def attendance_export(event_id, event_name, fmt='xlsx'):
+    source = """
+        FROM registrations r
+        JOIN student s ON r.student_id = s.student_id
+        WHERE r.event_id = %s
+    """
+    filename = f"Attendance_{event_name}"
+    if fmt == 'csv':
+        return csv_response(filename, ATTENDANCE_COLUMNS, source, (event_id,), "s.name")
+    return xlsx_response(filename, "Attendance Sheet", ATTENDANCE_COLUMNS, source, (event_id,), "s.name")
+
+
+def all_events_export(fmt='xlsx'):
+    columns = EVENT_COLUMNS + ATTENDANCE_COLUMNS
+    source = """
+        FROM registrations r
+        JOIN student s ON r.student_id = s.student_id
+        JOIN events e ON r.event_id = e.event_id
+        WHERE e.deleted_at IS NULL
+    """
+    order_by = "e.event_date, e.event_id, s.name"
+    if fmt == 'csv':
+        return csv_response("Attendance_All_Events", columns, source, (), order_by)
+    return xlsx_response("Attendance_All_Events", "All Events", columns, source, (), order_by)
@@ -0,0 +1,48 @@
+from models.db import get_pooled_connection
+from utils.helpers import add_notifications, notify_role
+from services.email_service import send_bulk_email
+from services import jobs
+
+def announce_event(event_id):
+    """Queue the notifications and announcement emails for a newly created event."""
+    return jobs.submit(f"announce-event-{event_id}", _announce_event, event_id)
+
+def _announce_event(job, event_id):
+    db = get_pooled_connection()
+    try:
+        cursor = db.cursor(dictionary=True)
+        cursor.execute("""
+            SELECT event_name, event_date, location, description, coordinator_id
+            FROM events WHERE event_id=%s
+        """, (event_id,))
+        event = cursor.fetchone()
+        if not event:
+            return
+
+        # All notifications in one transaction, set-based
+        add_notifications([(event['coordinator_id'], 'faculty', f"Assigned Coordinator: {event['event_name']}.")], db=db)
+        notify_role('student', f"New Event: {event['event_name']} on {event['event_date']}.", db=db)
+        notify_role('faculty', f"Event Added: {event['event_name']}.", exclude_id=event['coordinator_id'], db=db)
+        db.commit()
+
+        cursor.execute("SELECT email FROM student WHERE email IS NOT NULL AND email != ''")
+        recipients = [row['email'] for row in cursor.fetchall()]
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        db.close()
+
+    job.set_total(len(recipients))
+    body = f"""
+A new event has been added!
+
+Event Name: {event['event_name']}
+Date: {event['event_date']}
+Location: {event['location']}
+Description: {event['description']}
+
+Login to register now!
+"""
+    send_bulk_email("New Event Announcement!", recipients, body=body,
+                    progress=lambda sent, failed: job.advance(sent, failed))
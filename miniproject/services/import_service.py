@@ -0,0 +1,244 @@
+from models.db import get_pooled_connection, IntegrityError
+from models import stats
+from services import jobs, processes
+from werkzeug.security import generate_password_hash
+import tempfile
+import secrets
+import csv
+import io
+import os
+import re
+
+# Bulk student onboarding from a CSV/XLSX sheet. The upload is spooled to disk by the request and
+# parsed row by row in a background job, so neither the file nor the result set is ever held whole.
+
+MODES = ('create', 'semester')
+REQUIRED = {
+    'create': ('name', 'register_number', 'email', 'department', 'semester'),
+    'semester': ('register_number', 'semester')
+}
+CHUNK_SIZE = 500
+EMAIL_RE = re.compile(r"^[^@\s]+@[^@\s]+\.[^@\s]+$")
+MAX_LENGTHS = {'name': 100, 'register_number': 50, 'email': 100, 'department': 100}
+
+
+def start(upload, mode):
+    """Spool the uploaded file and queue the import. Returns the Job."""
+    suffix = '.xlsx' if upload.filename.lower().endswith('.xlsx') else '.csv'
+    tmp = tempfile.NamedTemporaryFile(suffix=suffix, delete=False)
+    tmp.close()
+    upload.save(tmp.name)
+    return jobs.submit(f"student-import-{mode}", _run, tmp.name, mode, upload.filename)
+
+
+def _normalize(header):
+    return str(header or '').strip().lower().replace(' ', '_').replace('reg_no', 'register_number')
+
+
+def _read_rows(path):
+    """Yield (line_number, {column: value}) without loading the whole sheet."""
+    if path.endswith('.xlsx'):
+        import openpyxl
+        wb = openpyxl.load_workbook(path, read_only=True, data_only=True)
+        try:
+            rows = wb.active.iter_rows(values_only=True)
+            header = [_normalize(h) for h in next(rows, [])]
+            for number, values in enumerate(rows, 2):
+                if any(v not in (None, '') for v in values):
+                    yield number, {h: ('' if v is None else str(v).strip()) for h, v in zip(header, values) if h}
+        finally:
+            wb.close()
+    else:
+        with open(path, newline='', encoding='utf-8-sig') as f:
+            reader = csv.reader(f)
+            header = [_normalize(h) for h in next(reader, [])]
+            for number, values in enumerate(reader, 2):
+                if any(v.strip() for v in values):
+                    yield number, {h: v.strip() for h, v in zip(header, values) if h}
+
+
+def _validate(row, mode):
+    missing = [c for c in REQUIRED[mode] if not row.get(c)]
+    if missing:
+        return f"Missing {', '.join(missing)}"
+    try:
+        semester = int(float(row['semester']))
+    except (ValueError, OverflowError):
+        # OverflowError: "inf" or "1e400"
+        return "Semester must be a number"
+    if not 1 <= semester <= 8:
+        return "Semester must be between 1 and 8"
+    row['semester'] = semester
+    for column, limit in MAX_LENGTHS.items():
+        if len(row.get(column, '')) > limit:
+            return f"{column.replace('_', ' ').capitalize()} is longer than {limit} characters"
+    if mode == 'create' and not EMAIL_RE.match(row['email']):
+        return "Invalid email"
+    return None
+
+
+def _chunks(rows, size):
+    chunk = []
+    for item in rows:
+        chunk.append(item)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def _existing(cursor, column, values):
+    if not values:
+        return set()
+    cursor.execute(f"SELECT {column} FROM student WHERE {column} IN ({', '.join(['%s'] * len(values))})", list(values))
+    return {row[0] for row in cursor.fetchall()}
+
+
+def _hash_all(passwords):
+    # Password hashing is deliberately slow; spread it over processes instead of one job thread
+    return processes.run_all(generate_password_hash, passwords, chunksize=32)
+
+
+def _insert_chunk(db, rows, hashes):
+    """Insert one chunk in one transaction. Returns (inserted, errors)."""
+    cursor = db.cursor()
+    values = [(r['name'], r['register_number'], r['email'], r['department'], r['semester'], h)
+              for (_, r), h in zip(rows, hashes)]
+    try:
+        cursor.execute(f"""
+            INSERT INTO student (name, register_number, email, department, semester, password)
+            VALUES {', '.join(['(%s, %s, %s, %s, %s, %s)'] * len(values))}
+        """, [v for row in values for v in row])
+        stats.bump_total(db, 'total_students', len(values))
+        db.commit()
+        return len(values), []
+    except IntegrityError:
+        # Someone registered one of these meanwhile: fall back to row by row to find out which
+        db.rollback()
+    inserted, errors = 0, []
+    for (number, row), value in zip(rows, values):
+        try:
+            cursor.execute("""
+                INSERT INTO student (name, register_number, email, department, semester, password)
+                VALUES (%s, %s, %s, %s, %s, %s)
+            """, value)
+            stats.bump_total(db, 'total_students', 1)
+            db.commit()
+            inserted += 1
+        except IntegrityError:
+            db.rollback()
+            errors.append((number, row, "Register number or email already exists"))
+    return inserted, errors
+
+
+def _create(db, chunk, seen_reg, seen_email):
+    errors, valid = [], []
+    for number, row in chunk:
+        error = _validate(row, 'create')
+        if not error and row['register_number'] in seen_reg:
+            error = "Duplicate register number in file"
+        if not error and row['email'].lower() in seen_email:
+            error = "Duplicate email in file"
+        if error:
+            errors.append((number, row, error))
+            continue
+        seen_reg.add(row['register_number'])
+        seen_email.add(row['email'].lower())
+        valid.append((number, row))
+
+    cursor = db.cursor()
+    taken_reg = _existing(cursor, 'register_number', {r['register_number'] for _, r in valid})
+    taken_email = {e.lower() for e in _existing(cursor, 'email', {r['email'] for _, r in valid})}
+    db.rollback()
+    fresh = []
+    for number, row in valid:
+        if row['register_number'] in taken_reg:
+            errors.append((number, row, "Register number already exists"))
+        elif row['email'].lower() in taken_email:
+            errors.append((number, row, "Email already exists"))
+        else:
+            fresh.append((number, row))
+
+    done = 0
+    if fresh:
+        # Rows without a password get a random one; the student sets their own via "Forgot password"
+        hashes = _hash_all([r.get('password') or secrets.token_urlsafe(12) for _, r in fresh])
+        done, insert_errors = _insert_chunk(db, fresh, hashes)
+        errors.extend(insert_errors)
+    return done, errors
+
+
+def _update_semester(db, chunk, seen_reg):
+    errors, valid = [], {}
+    for number, row in chunk:
+        error = _validate(row, 'semester')
+        if not error and row['register_number'] in seen_reg:
+            error = "Duplicate register number in file"
+        if error:
+            errors.append((number, row, error))
+            continue
+        seen_reg.add(row['register_number'])
+        valid[row['register_number']] = (number, row)
+
+    cursor = db.cursor()
+    known = {reg.upper() for reg in _existing(cursor, 'register_number', set(valid))}
+    for reg_no in [reg for reg in valid if reg.upper() not in known]:
+        number, row = valid.pop(reg_no)
+        errors.append((number, row, "No student with this register number"))
+    if valid:
+        regs = list(valid)
+        cursor.execute(f"""
+            UPDATE student
+            SET semester = CASE register_number {' '.join(['WHEN %s THEN %s'] * len(regs))} END
+            WHERE register_number IN ({', '.join(['%s'] * len(regs))})
+        """, [v for reg in regs for v in (reg, valid[reg][1]['semester'])] + regs)
+    db.commit()
+    return len(valid), errors
+
+
+def _report_path(job_id):
+    return os.path.join(tempfile.gettempdir(), f"student-import-{job_id}-errors.csv")
+
+
+def _run(job, path, mode, filename):
+    report_path = _report_path(job.id)
+    counts = {'processed': 0, 'succeeded': 0, 'failed': 0}
+    job.result = {'mode': mode, 'filename': filename, **counts}
+    seen_reg, seen_email = set(), set()
+
+    db = get_pooled_connection()
+    try:
+        with open(report_path, 'w', newline='', encoding='utf-8') as report:
+            writer = csv.writer(report)
+            writer.writerow(['row', 'register_number', 'email', 'error'])
+            for chunk in _chunks(_read_rows(path), CHUNK_SIZE):
+                if mode == 'create':
+                    done, errors = _create(db, chunk, seen_reg, seen_email)
+                else:
+                    done, errors = _update_semester(db, chunk, seen_reg)
+                for number, row, error in sorted(errors, key=lambda e: e[0]):
+                    writer.writerow([number, row.get('register_number', ''), row.get('email', ''), error])
+                counts['processed'] += len(chunk)
+                counts['succeeded'] += done
+                counts['failed'] += len(errors)
+                job.result.update(counts)
+                job.advance(len(chunk), failed=len(errors))
+        if not counts['failed']:
+            os.remove(report_path)
+    finally:
+        db.close()
+        os.remove(path)
+
+
+def report_path(job):
+    """Path of the per-row error report for a finished import job, if it has one."""
+    path = _report_path(job.id)
+    return path if job.finished_at and os.path.exists(path) else None
+
+
+def template_csv(mode):
+    buffer = io.StringIO()
+    columns = list(REQUIRED[mode]) + (['password'] if mode == 'create' else [])
+    csv.writer(buffer).writerow(columns)
+    return buffer.getvalue()
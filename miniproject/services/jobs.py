@@ -0,0 +1,101 @@
+from concurrent.futures import ThreadPoolExecutor
+from collections import OrderedDict
+from flask import current_app
+import threading
+import time
+import uuid
+
+MAX_TRACKED_JOBS = 200
+
+_executor = None
+_jobs = OrderedDict()
+_lock = threading.Lock()
+
+
+class Job:
+    def __init__(self, name):
+        self.id = uuid.uuid4().hex
+        self.name = name
+        self.status = 'queued'
+        self.total = 0
+        self.done = 0
+        self.failed = 0
+        self.error = None
+        self.result = None  # optional summary a job can fill in for its status page
+        self.created_at = time.time()
+        self.finished_at = None
+
+    def set_total(self, total):
+        self.total = total
+
+    def advance(self, count=1, failed=0):
+        with _lock:
+            self.done += count
+            self.failed += failed
+
+    def to_dict(self):
+        return {
+            'job_id': self.id,
+            'name': self.name,
+            'status': self.status,
+            'total': self.total,
+            'done': self.done,
+            'failed': self.failed,
+            'error': self.error,
+            'result': self.result,
+            'created_at': self.created_at,
+            'finished_at': self.finished_at
+        }
+
+
+def init_app(app):
+    global _executor
+    _executor = ThreadPoolExecutor(max_workers=app.config.get('JOB_WORKERS', 4), thread_name_prefix='job')
+
+
+def _get_executor():
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix='job')
+    return _executor
+
+
+def submit(name, fn, *args, **kwargs):
+    """
+    Run fn(job, *args, **kwargs) on the bounded background pool inside an app context.
+    Returns the Job so callers can report its id / progress.
+    """
+    app = current_app._get_current_object()
+    job = Job(name)
+
+    with _lock:
+        _jobs[job.id] = job
+        while len(_jobs) > MAX_TRACKED_JOBS:
+            _jobs.popitem(last=False)
+
+    def run():
+        with app.app_context():
+            job.status = 'running'
+            try:
+                fn(job, *args, **kwargs)
+                job.status = 'done'
+            except Exception as e:
+                job.status = 'failed'
+                job.error = str(e)
+                print(f"Error in background job {name}: {e}")
+            finally:
+                job.finished_at = time.time()
+
+    _get_executor().submit(run)
+    return job
+
+
+def get_job(job_id):
+    with _lock:
+        return _jobs.get(job_id)
+
+
+def recent_jobs(limit=20):
+    with _lock:
+        jobs = list(_jobs.values())[-limit:]
+    return [j.to_dict() for j in reversed(jobs)]
@@ -0,0 +1,59 @@
+from models import stats
+from utils.helpers import add_notifications
+from services import dashboard_service
+
+def respond(db, new_status, admin_id, request_ids=None, event_id=None, pending_only=True):
+    """
+    Set many on-duty requests to new_status ('Approved' / 'Rejected') in one transaction:
+    the given request ids and/or every request for an event. Returns the number updated.
+    """
+    conditions, params = [], []
+    if request_ids is not None:
+        if not request_ids:
+            return 0
+        conditions.append(f"request_id IN ({', '.join(['%s'] * len(request_ids))})")
+        params.extend(request_ids)
+    if event_id is not None:
+        conditions.append("event_id = %s")
+        params.append(event_id)
+    if pending_only:
+        conditions.append("status = 'Pending'")
+    if not conditions:
+        raise ValueError("respond() needs request ids, an event or pending_only")
+
+    cursor = db.cursor(dictionary=True)
+    cursor.execute(f"""
+        SELECT request_id, student_id, event_id, status FROM onduty_requests
+        WHERE {' AND '.join(conditions)}
+        FOR UPDATE
+    """, params)
+    rows = cursor.fetchall()
+    if not rows:
+        db.rollback()
+        return 0
+
+    ids = [row['request_id'] for row in rows]
+    for i in range(0, len(ids), 1000):
+        chunk = ids[i:i + 1000]
+        cursor.execute(f"""
+            UPDATE onduty_requests SET status = %s, approved_by = %s
+            WHERE request_id IN ({', '.join(['%s'] * len(chunk))})
+        """, [new_status, admin_id] + chunk)
+
+    was_pending = sum(1 for row in rows if row['status'] == 'Pending')
+    if was_pending:
+        stats.bump_total(db, 'pending_ods', -was_pending)
+
+    event_ids = list({row['event_id'] for row in rows})
+    cursor.execute(f"SELECT event_id, event_name FROM events WHERE event_id IN ({', '.join(['%s'] * len(event_ids))})", event_ids)
+    names = {row['event_id']: row['event_name'] for row in cursor.fetchall()}
+    add_notifications([
+        (row['student_id'], 'student',
+         f"Your On-Duty request for event '{names.get(row['event_id'], '')}' has been {new_status} by Admin.")
+        for row in rows
+    ], db=db)
+    db.commit()
+
+    for student_id in {row['student_id'] for row in rows}:
+        dashboard_service.invalidate_student(student_id)
+    return len(rows)
@@ -0,0 +1,49 @@
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+import multiprocessing
+import os
+import threading
+
+# CPU-bound work (certificate PDFs, password hashes) runs in one shared pool of worker processes.
+# The pool is only created on the first run_all, so CLI commands and the debug reloader's parent
+# never fork it. The workers are forked (spawn would re-import app.py in every child, running the
+# migrations and starting the app's threads again); they only compute on their arguments, so they
+# take none of the locks the parent's threads may hold. Where fork does not exist (Windows) the
+# work simply runs in the calling thread.
+
+_workers = None
+_pool = None
+_lock = threading.Lock()
+
+
+def init_app(app):
+    global _workers
+    _workers = app.config.get('PROCESS_WORKERS') or os.cpu_count() or 2
+
+
+def _get_pool():
+    global _pool
+    if _workers is None or 'fork' not in multiprocessing.get_all_start_methods():
+        return None
+    with _lock:
+        if _pool is None:
+            _pool = ProcessPoolExecutor(max_workers=_workers, mp_context=multiprocessing.get_context('fork'))
+        return _pool
+
+
+def run_all(fn, items, chunksize=1):
+    """
+    [fn(item) for item in items], computed in the worker processes. fn must be a module-level function.
+    Runs in this process when fork is unavailable, init_app was not called or a worker has died.
+    """
+    global _pool
+    pool = _get_pool()
+    if pool is not None:
+        try:
+            return list(pool.map(fn, items, chunksize=chunksize))
+        except BrokenProcessPool as e:
+            print(f"Process pool unusable, continuing in-process: {e}")
+            with _lock:
+                if _pool is pool:
+                    _pool = None
+    return [fn(item) for item in items]
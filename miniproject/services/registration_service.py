@@ -0,0 +1,193 @@
+from models.db import get_pooled_connection, IntegrityError
+from models import stats
+from utils.helpers import add_notifications, notify_admins
+from services.email_service import send_email
+from services import attendance_service
+import uuid
+
+def _insert_registration(cursor, student_id, event_id):
+    cursor.execute("""
+        INSERT INTO registrations (student_id, event_id, qr_token)
+        VALUES (%s, %s, %s)
+    """, (student_id, event_id, str(uuid.uuid4())))
+    return cursor.lastrowid
+
+def waitlist_position(cursor, event_id, waitlist_id):
+    cursor.execute("SELECT COUNT(*) FROM event_waitlist WHERE event_id=%s AND waitlist_id <= %s", (event_id, waitlist_id))
+    return cursor.fetchone()[0]
+
+def register(db, student_id, event_id, idempotency_key=None):
+    """
+    Register a student, or put them on the waitlist when the event is full, in one transaction.
+    Returns (outcome, detail):
+      ('registered', registration_id), ('waitlisted', position), ('duplicate', None) when already
+      registered or waitlisted, ('replayed', earlier outcome) when idempotency_key was seen before.
+    A new registration's confirmation mail and notifications are committed with it.
+    """
+    cursor = db.cursor()
+    if idempotency_key:
+        try:
+            # Inserted first, so a concurrent resubmit of the same form blocks here until this one commits
+            cursor.execute("""
+                INSERT INTO registration_requests (idempotency_key, student_id, event_id)
+                VALUES (%s, %s, %s)
+            """, (idempotency_key, student_id, event_id))
+        except IntegrityError:
+            db.rollback()
+            cursor.execute("SELECT outcome FROM registration_requests WHERE idempotency_key=%s AND student_id=%s",
+                           (idempotency_key, student_id))
+            row = cursor.fetchone()
+            db.rollback()
+            return 'replayed', row[0] if row else None
+
+    try:
+        if stats.claim_seat(db, event_id):
+            outcome, detail = 'registered', _insert_registration(cursor, student_id, event_id)
+            _queue_confirmation(db, detail)
+            # A waitlisted student who finds a free seat leaves the queue
+            cursor.execute("DELETE FROM event_waitlist WHERE event_id=%s AND student_id=%s", (event_id, student_id))
+        else:
+            cursor.execute("INSERT INTO event_waitlist (event_id, student_id) VALUES (%s, %s)", (event_id, student_id))
+            outcome, detail = 'waitlisted', waitlist_position(cursor, event_id, cursor.lastrowid)
+    except IntegrityError:
+        # uq_reg_student_event / uq_waitlist_event_student: a concurrent submit got there first
+        db.rollback()
+        return 'duplicate', None
+
+    if idempotency_key:
+        cursor.execute("UPDATE registration_requests SET outcome=%s WHERE idempotency_key=%s", (outcome, idempotency_key))
+    db.commit()
+    if outcome == 'registered':
+        attendance_service.invalidate_tokens(event_id)
+    return outcome, detail
+
+def promote(db, event_id):
+    """
+    Move the head of the event's waitlist into a free seat, in the caller's transaction, with its
+    confirmation mail and notifications. Returns (registration_id, student_id) or None.
+    """
+    cursor = db.cursor()
+    while True:
+        cursor.execute("""
+            SELECT waitlist_id, student_id FROM event_waitlist
+            WHERE event_id=%s ORDER BY waitlist_id LIMIT 1
+            FOR UPDATE SKIP LOCKED
+        """, (event_id,))
+        head = cursor.fetchone()
+        if not head:
+            return None
+        waitlist_id, student_id = head
+        cursor.execute("SELECT registration_id FROM registrations WHERE event_id=%s AND student_id=%s", (event_id, student_id))
+        if cursor.fetchone():
+            # Left over from before they registered directly; drop it and look at the next head
+            cursor.execute("DELETE FROM event_waitlist WHERE waitlist_id=%s", (waitlist_id,))
+            continue
+        if not stats.claim_seat(db, event_id):
+            return None
+        cursor.execute("DELETE FROM event_waitlist WHERE waitlist_id=%s", (waitlist_id,))
+        registration_id = _insert_registration(cursor, student_id, event_id)
+        _queue_confirmation(db, registration_id)
+        return registration_id, student_id
+
+def waitlist_positions(cursor, student_id):
+    """{event_id: place in the queue} for every event the student is waitlisted for."""
+    cursor.execute("""
+        SELECT w.event_id,
+               (SELECT COUNT(*) FROM event_waitlist x WHERE x.event_id = w.event_id AND x.waitlist_id <= w.waitlist_id) AS position
+        FROM event_waitlist w
+        WHERE w.student_id = %s
+    """, (student_id,))
+    return {row['event_id']: row['position'] for row in cursor.fetchall()}
+
+def leave_waitlist(db, student_id, event_id):
+    """Take the student off the event's waitlist. Returns False if they were not on it."""
+    cursor = db.cursor()
+    cursor.execute("DELETE FROM event_waitlist WHERE event_id=%s AND student_id=%s", (event_id, student_id))
+    left = cursor.rowcount > 0
+    db.commit()
+    return left
+
+def set_capacity(db, event_id, capacity):
+    """
+    Change the event's seat limit (None for unlimited) and hand any seats that opens up to the
+    waitlist, in one transaction. Seats already taken are kept when the limit goes down.
+    Returns [(registration_id, student_id)] for the promoted students, or None if there is no such event.
+    """
+    cursor = db.cursor()
+    cursor.execute("SELECT event_id FROM events WHERE event_id=%s AND deleted_at IS NULL FOR UPDATE", (event_id,))
+    if not cursor.fetchone():
+        db.rollback()
+        return None
+    cursor.execute("UPDATE events SET capacity=%s WHERE event_id=%s", (capacity, event_id))
+    promoted = []
+    while True:
+        result = promote(db, event_id)
+        if not result:
+            break
+        promoted.append(result)
+    db.commit()
+    if promoted:
+        attendance_service.invalidate_tokens(event_id)
+    return promoted
+
+def cancel(db, registration_id, event_id):
+    """
+    Cancel a registration and give the seat to the first student on the waitlist, in the same
+    transaction. Returns the promoted student's id, or None.
+    """
+    cursor = db.cursor()
+    cursor.execute("DELETE FROM registrations WHERE registration_id=%s", (registration_id,))
+    if not cursor.rowcount:
+        db.rollback()
+        return None
+    stats.record_registration(db, event_id, -1)
+    promoted = promote(db, event_id)
+    db.commit()
+    attendance_service.invalidate_tokens(event_id)
+    return promoted[1] if promoted else None
+
+def _queue_confirmation(db, registration_id):
+    """
+    Confirmation mail and notifications for a new registration, in the caller's transaction, so
+    they are never lost to a restart between the commit and the send. The outbox worker renders
+    the QR code when it sends the mail.
+    """
+    cursor = db.cursor(dictionary=True)
+    cursor.execute("""
+        SELECT r.qr_token, r.student_id, s.name, s.email,
+               e.event_name, e.event_date, e.location, e.coordinator_id
+        FROM registrations r
+        JOIN student s ON r.student_id = s.student_id
+        JOIN events e ON r.event_id = e.event_id
+        WHERE r.registration_id = %s
+    """, (registration_id,))
+    reg = cursor.fetchone()
+
+    html_body = f"""
+        <h3>Registration Confirmed!</h3>
+        <p>Hello {reg['name']},</p>
+        <p>You have successfully registered for:</p>
+        <ul>
+            <li><strong>Event:</strong> {reg['event_name']}</li>
+            <li><strong>Date:</strong> {reg['event_date']}</li>
+            <li><strong>Location:</strong> {reg['location']}</li>
+        </ul>
+        <p>Please show the QR code below during attendance:</p>
+        <div style="text-align: center;">
+            <img src="cid:qr_code" alt="QR Code" style="width: 200px; height: 200px;">
+        </div>
+        """
+
+    attachment = {
+        'filename': 'qrcode.png',
+        'content_type': 'image/png',
+        'qr': reg['qr_token'],
+        'headers': {'Content-ID': '<qr_code>'}
+    }
+
+    send_email("Event Registration Successful", [reg['email']], html=html_body, attachments=[attachment], db=db)
+    add_notifications([
+        (reg['student_id'], 'student', f"Registered: {reg['event_name']}."),
+        (reg['coordinator_id'], 'faculty', f"Reg: {reg['name']} - {reg['event_name']}.")
+    ], db=db)
+    notify_admins(f"Reg: {reg['name']} - {reg['event_name']}.", db=db)
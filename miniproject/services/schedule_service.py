@@ -0,0 +1,275 @@
+from flask import Response, current_app, request
+from itsdangerous import URLSafeSerializer, BadSignature
+from utils.cache import Cache
+from services.timetable_service import DAYS, Lane, to_minutes, format_minutes
+from datetime import date, datetime, timedelta
+from bisect import bisect_right
+import hashlib
+import hmac
+import json
+import secrets
+
+# When each cohort (department + semester) is busy: weekly classes by weekday and exams by date,
+# as interval lanes. Built once per cohort from timetable/exams and dropped whenever either changes,
+# so a clash check for an event is a dictionary lookup and a bisection.
+_busy = Cache('schedule:busy', ttl=3600)
+
+# Ready-to-serve schedules per cohort and per faculty member: the rows the pages render, the JSON
+# and iCalendar bodies and their ETags. Dropped together with the busy index; with the local
+# backend that only reaches this worker, so the TTL bounds how long the others serve an old one.
+_snapshots = Cache('schedule:snapshot', ttl=900)
+
+
+def _build(cursor, department, semester):
+    snapshot = cohort_snapshot(cursor, department, semester)
+    lanes = {}
+    for slot in snapshot['timetable']:
+        lanes.setdefault(('class', slot['day']), Lane()).add({
+            'start': to_minutes(slot['start_time']), 'end': to_minutes(slot['end_time']), 'label': slot['course_name']
+        })
+    for exam in snapshot['exams']:
+        lanes.setdefault(('exam', exam['exam_date']), Lane()).add({
+            'start': to_minutes(exam['start_time']), 'end': to_minutes(exam['end_time']), 'label': exam['course_name']
+        })
+    return lanes
+
+
+def busy_index(cursor, department, semester):
+    return _busy.fetch(f"{department}|{semester}", lambda: _build(cursor, department, semester))
+
+
+def student_cohort(cursor, student_id):
+    cursor.execute("SELECT department, semester FROM student WHERE student_id=%s", (student_id,))
+    row = cursor.fetchone()
+    return (row['department'], row['semester']) if row else (None, None)
+
+
+def invalidate():
+    """timetable, exams, courses or faculty names changed."""
+    _busy.clear()
+    _snapshots.clear()
+
+
+def _event_day(value):
+    if isinstance(value, datetime):
+        return value.date()
+    if isinstance(value, date):
+        return value
+    return datetime.strptime(str(value), '%Y-%m-%d').date()
+
+
+def clashes(lanes, event):
+    """
+    [(kind, course_name)] for the cohort's exams ('exam') and classes ('class') overlapping the event.
+    Events without start and end times are never reported.
+    """
+    if event.get('start_time') is None or event.get('end_time') is None:
+        return []
+    start, end = to_minutes(event['start_time']), to_minutes(event['end_time'])
+    day = _event_day(event['event_date'])
+    found = []
+    for kind, key in (('exam', day.isoformat()), ('class', day.strftime('%A'))):
+        lane = lanes.get((kind, key))
+        if lane:
+            found.extend((kind, slot['label']) for slot in lane.overlapping(start, end))
+    return found
+
+
+def describe(found):
+    exams = sorted({label for kind, label in found if kind == 'exam'})
+    classes = sorted({label for kind, label in found if kind == 'class'})
+    parts = []
+    if exams:
+        parts.append(f"exam: {', '.join(exams)}")
+    if classes:
+        parts.append(f"class: {', '.join(classes)}")
+    return "; ".join(parts)
+
+
+def flag_events(lanes, events):
+    """Set 'clash' (description or None), 'exam_clash' and 'time_range' on each event dict."""
+    for e in events:
+        found = clashes(lanes, e)
+        e['clash'] = describe(found) or None
+        e['exam_clash'] = any(kind == 'exam' for kind, _ in found)
+        e['time_range'] = time_range(e)
+    return events
+
+
+def time_range(event):
+    if event.get('start_time') is None or event.get('end_time') is None:
+        return None
+    return f"{format_minutes(to_minutes(event['start_time']))}-{format_minutes(to_minutes(event['end_time']))}"
+
+
+def _schedule_rows(cursor, where, params):
+    """Timetable and exam rows as plain strings, sorted by day/date and time."""
+    cursor.execute(f"""
+        SELECT t.timetable_id, t.day, t.start_time, t.end_time, t.classroom,
+               c.course_name, c.department, c.semester, f.name AS faculty_name
+        FROM timetable t
+        JOIN courses c ON t.course_id = c.course_id
+        JOIN faculty f ON t.faculty_id = f.faculty_id
+        WHERE {where}
+    """, params)
+    timetable = [{
+        'timetable_id': row['timetable_id'], 'day': row['day'],
+        'start_time': format_minutes(to_minutes(row['start_time'])), 'end_time': format_minutes(to_minutes(row['end_time'])),
+        'classroom': row['classroom'] or '', 'course_name': row['course_name'], 'department': row['department'],
+        'semester': row['semester'], 'faculty_name': row['faculty_name']
+    } for row in cursor.fetchall()]
+    timetable.sort(key=lambda s: (DAYS.index(s['day']) if s['day'] in DAYS else len(DAYS), s['start_time']))
+    return timetable
+
+
+def _exam_rows(cursor, department, semester):
+    cursor.execute("""
+        SELECT e.exam_id, e.exam_date, e.start_time, e.end_time, e.hall, c.course_name, c.department, c.semester
+        FROM exams e
+        JOIN courses c ON e.course_id = c.course_id
+        WHERE c.department = %s AND c.semester = %s
+    """, (department, semester))
+    exams = [{
+        'exam_id': row['exam_id'], 'exam_date': str(row['exam_date']),
+        'start_time': format_minutes(to_minutes(row['start_time'])), 'end_time': format_minutes(to_minutes(row['end_time'])),
+        'hall': row['hall'] or '', 'course_name': row['course_name'], 'department': row['department'], 'semester': row['semester']
+    } for row in cursor.fetchall()]
+    exams.sort(key=lambda e: (e['exam_date'], e['start_time']))
+    return exams
+
+
+def _ics_text(value):
+    return str(value).replace('\\', '\\\\').replace(';', '\\;').replace(',', '\\,').replace('\n', '\\n')
+
+
+def _ics_fold(line):
+    # Content lines are limited to 75 octets; continuations start with a space
+    data = line.encode('utf-8')
+    parts = []
+    while len(data) > 75:
+        cut = 75 if not parts else 74
+        while (data[cut] & 0xC0) == 0x80:  # never split a UTF-8 sequence
+            cut -= 1
+        parts.append(data[:cut].decode('utf-8'))
+        data = data[cut:]
+    parts.append(data.decode('utf-8'))
+    return '\r\n '.join(parts)
+
+
+def _ics(name, timetable, exams):
+    """
+    iCalendar body. Classes repeat weekly from this week; times are local (floating), as in the
+    timetable. DTSTAMP is fixed to the week so rebuilds of unchanged data give identical bytes.
+    """
+    monday = date.today() - timedelta(days=date.today().weekday())
+    stamp = monday.strftime('%Y%m%dT000000Z')
+    lines = ['BEGIN:VCALENDAR', 'VERSION:2.0', 'PRODID:-//Eventura//Schedule//EN', 'CALSCALE:GREGORIAN',
+             f"X-WR-CALNAME:{_ics_text(name)}"]
+    for slot in timetable:
+        if slot['day'] not in DAYS:
+            continue
+        day = (monday + timedelta(days=DAYS.index(slot['day']))).strftime('%Y%m%d')
+        lines += ['BEGIN:VEVENT', f"UID:class-{slot['timetable_id']}@eventura", f"DTSTAMP:{stamp}",
+                  f"DTSTART:{day}T{slot['start_time'].replace(':', '')}00", f"DTEND:{day}T{slot['end_time'].replace(':', '')}00",
+                  'RRULE:FREQ=WEEKLY', f"SUMMARY:{_ics_text(slot['course_name'])}",
+                  f"LOCATION:{_ics_text(slot['classroom'])}", f"DESCRIPTION:{_ics_text(slot['faculty_name'])}", 'END:VEVENT']
+    for exam in exams:
+        day = exam['exam_date'].replace('-', '')
+        lines += ['BEGIN:VEVENT', f"UID:exam-{exam['exam_id']}@eventura", f"DTSTAMP:{stamp}",
+                  f"DTSTART:{day}T{exam['start_time'].replace(':', '')}00", f"DTEND:{day}T{exam['end_time'].replace(':', '')}00",
+                  f"SUMMARY:{_ics_text('Exam: ' + exam['course_name'])}", f"LOCATION:{_ics_text(exam['hall'])}", 'END:VEVENT']
+    lines.append('END:VCALENDAR')
+    return ''.join(_ics_fold(line) + '\r\n' for line in lines).encode('utf-8')
+
+
+def _snapshot(name, timetable, exams):
+    body = json.dumps({'timetable': timetable, 'exams': exams}, sort_keys=True, separators=(',', ':')).encode('utf-8')
+    ics = _ics(name, timetable, exams)
+    return {
+        'timetable': timetable, 'exams': exams,
+        # Start of each exam, in the same order, for finding the next one by bisection
+        'exam_starts': [f"{e['exam_date']}T{e['start_time']}" for e in exams],
+        'json': body, 'json_etag': hashlib.sha256(body).hexdigest()[:32],
+        'ics': ics, 'ics_etag': hashlib.sha256(ics).hexdigest()[:32]
+    }
+
+
+def cohort_snapshot(cursor, department, semester):
+    """Timetable and exams of one (department, semester). Treat the result as read-only."""
+    def build():
+        timetable = _schedule_rows(cursor, "c.department = %s AND c.semester = %s", (department, semester))
+        return _snapshot(f"{department} Semester {semester}", timetable, _exam_rows(cursor, department, semester))
+    return _snapshots.fetch(f"cohort:{department}|{semester}", build)
+
+
+def faculty_snapshot(cursor, faculty_id):
+    def build():
+        return _snapshot("My Teaching Timetable", _schedule_rows(cursor, "t.faculty_id = %s", (faculty_id,)), [])
+    return _snapshots.fetch(f"faculty:{faculty_id}", build)
+
+
+def next_exam(snapshot, now=None):
+    """The first exam starting after now, or None."""
+    now = (now or datetime.now()).strftime('%Y-%m-%dT%H:%M')
+    i = bisect_right(snapshot['exam_starts'], now)
+    return snapshot['exams'][i] if i < len(snapshot['exams']) else None
+
+
+def feed_response(snapshot, fmt, filename):
+    """The snapshot as JSON or iCalendar, with a strong ETag; a matching If-None-Match gets a 304."""
+    if fmt == 'ics':
+        response = Response(snapshot['ics'], mimetype='text/calendar')
+        response.headers['Content-Disposition'] = f'inline; filename="{filename}.ics"'
+        response.set_etag(snapshot['ics_etag'])
+    else:
+        response = Response(snapshot['json'], mimetype='application/json')
+        response.set_etag(snapshot['json_etag'])
+    # Personal data: keep it out of shared caches, but let clients revalidate cheaply
+    response.headers['Cache-Control'] = 'private, no-cache'
+    return response.make_conditional(request)
+
+
+def _feed_serializer():
+    return URLSafeSerializer(current_app.config['SECRET_KEY'], salt='schedule-feed')
+
+
+_FEED_OWNERS = {'student': ('student', 'student_id'), 'faculty': ('faculty', 'faculty_id')}
+
+
+def _feed_nonce(cursor, role, user_id):
+    table, id_col = _FEED_OWNERS[role]
+    cursor.execute(f"SELECT feed_nonce FROM {table} WHERE {id_col}=%s", (user_id,))
+    row = cursor.fetchone()
+    return row['feed_nonce'] if row else None
+
+
+def reset_feed_token(db, role, user_id):
+    """Give the user a new feed nonce, which revokes every calendar URL handed out before."""
+    table, id_col = _FEED_OWNERS[role]
+    cursor = db.cursor()
+    cursor.execute(f"UPDATE {table} SET feed_nonce=%s WHERE {id_col}=%s", (secrets.token_hex(16), user_id))
+    db.commit()
+
+
+def feed_token(db, role, user_id):
+    """Token for the calendar subscription URL, since calendar apps cannot log in."""
+    cursor = db.cursor(dictionary=True)
+    nonce = _feed_nonce(cursor, role, user_id)
+    if not nonce:
+        reset_feed_token(db, role, user_id)
+        nonce = _feed_nonce(cursor, role, user_id)
+    return _feed_serializer().dumps([role, user_id, nonce])
+
+
+def read_feed_token(db, token):
+    """(role, user_id), or (None, None) for a forged, malformed or revoked token."""
+    try:
+        role, user_id, nonce = _feed_serializer().loads(token)
+    except (BadSignature, ValueError, TypeError):
+        return None, None
+    if role not in _FEED_OWNERS or not isinstance(nonce, str):
+        return None, None
+    current = _feed_nonce(db.cursor(dictionary=True), role, user_id)
+    if not current or not hmac.compare_digest(current, nonce):
+        return None, None
+    return role, user_id
@@ -0,0 +1,192 @@
+from services import jobs, timetable_service
+from collections import Counter
+import random
+import click
+import time
+import csv
+import io
+
+# Draft weekly timetables. A session is one period of one course; the solver places every session
+# on a (day, period, room) so that no faculty member, cohort or room is booked twice, working
+# around the slots already in the timetable. Greedy placement, most constrained first, then
+# min-conflicts local search until clean or out of time.
+
+MAX_BUDGET = 60
+REQUIREMENT_COLUMNS = ('course_id', 'course_name', 'department', 'semester', 'faculty_id', 'hours')
+
+
+def solve(sessions, days, periods, rooms, blocked=(), budget=10.0, seed=None):
+    """
+    sessions: list of (course_id, faculty_id, cohort). days: number of days; periods: per day;
+    rooms: list of room keys. blocked: (kind, key, day, period) already taken ('faculty', 'cohort', 'classroom').
+    Returns (placements, clashes): one (day, period, room) per session, and how many sessions still clash.
+    """
+    rng = random.Random(seed)
+    deadline = time.monotonic() + budget
+    times = [(d, p) for d in range(days) for p in range(periods)]
+    occupied = Counter(blocked)
+    per_day = Counter()  # (course_id, day): sessions of a course on one day, kept low to spread the week
+    placements = [None] * len(sessions)
+
+    def keys(i, d, p, room):
+        course_id, faculty_id, cohort = sessions[i]
+        return (('faculty', faculty_id, d, p), ('cohort', cohort, d, p), ('classroom', room, d, p))
+
+    def move(i, placement, delta):
+        d, p, room = placement
+        for key in keys(i, d, p, room):
+            occupied[key] += delta
+        per_day[(sessions[i][0], d)] += delta
+
+    def clashes(i):
+        d, p, room = placements[i]
+        return sum(occupied[key] - 1 for key in keys(i, d, p, room))
+
+    def best(i):
+        """The least clashing (day, period, room) for session i, ties broken at random."""
+        course_id, faculty_id, cohort = sessions[i]
+        best_score, choices = None, []
+        for d, p in times:
+            base = occupied[('faculty', faculty_id, d, p)] + occupied[('cohort', cohort, d, p)]
+            if best_score is not None and base > best_score[0]:
+                continue
+            room, room_load = None, None
+            for r in rooms:
+                load = occupied[('classroom', r, d, p)]
+                if room_load is None or load < room_load:
+                    room, room_load = r, load
+                    if not load:
+                        break
+            score = (base + room_load, per_day[(course_id, d)])
+            if best_score is None or score < best_score:
+                best_score, choices = score, [(d, p, room)]
+            elif score == best_score:
+                choices.append((d, p, room))
+        return rng.choice(choices)
+
+    load = Counter()
+    for course_id, faculty_id, cohort in sessions:
+        load[('faculty', faculty_id)] += 1
+        load[('cohort', cohort)] += 1
+    order = sorted(range(len(sessions)), key=lambda i: -(load[('faculty', sessions[i][1])] + load[('cohort', sessions[i][2])]))
+    for i in order:
+        placements[i] = best(i)
+        move(i, placements[i], 1)
+
+    conflicted = [i for i in range(len(sessions)) if clashes(i)]
+    while conflicted and time.monotonic() < deadline:
+        i = rng.choice(conflicted)
+        move(i, placements[i], -1)
+        # An occasional random move gets the search out of plateaus
+        placements[i] = rng.choice([(d, p, rng.choice(rooms)) for d, p in times]) if rng.random() < 0.05 else best(i)
+        move(i, placements[i], 1)
+        conflicted = [j for j in conflicted if clashes(j)]
+        if not conflicted:
+            conflicted = [j for j in range(len(sessions)) if clashes(j)]
+    return placements, len(conflicted)
+
+
+def read_requirements(upload, courses, faculty):
+    """
+    Parse the requirements CSV: one row per course with faculty_id and weekly hours.
+    faculty: {faculty_id: name}. Returns (requirements, errors); requirements are (course, faculty_id, hours).
+    """
+    reader = csv.DictReader(io.TextIOWrapper(upload.stream, encoding='utf-8-sig', newline=''))
+    requirements, errors = [], []
+    for number, row in enumerate(reader, 2):
+        row = {str(k).strip().lower(): (v or '').strip() for k, v in row.items() if k}
+        if not any(row.values()):
+            continue
+        try:
+            course_id, faculty_id, hours = int(row.get('course_id') or 0), int(row.get('faculty_id') or 0), int(row.get('hours') or 0)
+        except ValueError:
+            errors.append(f"Row {number}: course_id, faculty_id and hours must be numbers")
+            continue
+        if course_id not in courses:
+            errors.append(f"Row {number}: unknown course")
+        elif faculty_id not in faculty:
+            errors.append(f"Row {number}: unknown faculty")
+        elif not 1 <= hours <= 20:
+            errors.append(f"Row {number}: hours must be between 1 and 20")
+        else:
+            requirements.append((courses[course_id], faculty_id, hours))
+    return requirements, errors
+
+
+def blocked_periods(index, day_names, day_start, period_minutes, periods):
+    """(kind, key, day, period) for every period the current timetable already occupies."""
+    blocked = set()
+    for (kind, key, day), lane in index.lanes.items():
+        if day not in day_names:
+            continue
+        d = day_names.index(day)
+        for start, end in zip(lane.starts, lane.ends):
+            for p in range(periods):
+                p_start = day_start + p * period_minutes
+                if start < p_start + period_minutes and end > p_start:
+                    blocked.add((kind, key, d, p))
+    return blocked
+
+
+def start(requirements, faculty, rooms, day_names, day_start, period_minutes, periods, blocked, budget):
+    """Queue a generation job. The draft is kept in job.result for review before it is applied."""
+    return jobs.submit("timetable-generate", _generate, requirements, faculty, rooms, day_names,
+                       day_start, period_minutes, periods, blocked, budget)
+
+
+def _generate(job, requirements, faculty, rooms, day_names, day_start, period_minutes, periods, blocked, budget):
+    sessions, owners = [], []
+    for course, faculty_id, hours in requirements:
+        for _ in range(hours):
+            sessions.append((course['course_id'], faculty_id, (course['department'], course['semester'])))
+            owners.append(course)
+    job.set_total(len(sessions))
+    room_keys = [room.lower() for room in rooms]
+    began = time.monotonic()
+    placements, clashes = solve(sessions, len(day_names), periods, room_keys, blocked, budget)
+
+    slots = []
+    for (course_id, faculty_id, _), course, (d, p, room) in zip(sessions, owners, placements):
+        slot_start = day_start + p * period_minutes
+        slots.append({
+            'course_id': course_id, 'course_name': course['course_name'],
+            'department': course['department'], 'semester': course['semester'],
+            'faculty_id': faculty_id, 'faculty_name': faculty[faculty_id],
+            'day': day_names[d], 'start_time': timetable_service.format_minutes(slot_start),
+            'end_time': timetable_service.format_minutes(slot_start + period_minutes),
+            'classroom': rooms[room_keys.index(room)]
+        })
+    slots.sort(key=lambda s: (day_names.index(s['day']), s['start_time'], s['classroom']))
+    job.advance(len(sessions) - clashes, failed=clashes)
+    job.result = {'slots': slots, 'clashes': clashes, 'seconds': round(time.monotonic() - began, 2)}
+
+
+def template_csv(courses):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(REQUIREMENT_COLUMNS)
+    for c in courses:
+        writer.writerow([c['course_id'], c['course_name'], c['department'], c['semester'], '', 3])
+    return buffer.getvalue()
+
+
+def benchmark(course_counts=(25, 50, 100, 200, 400), room_counts=(10, 20, 40), hours=3, budget=10.0, echo=print):
+    """
+    Solve synthetic terms of growing size: 5 courses per cohort, 2 per faculty member, 5 days of 7 periods.
+    Where sessions outnumber room-periods no clean timetable exists and the solver uses its whole budget.
+    """
+    echo(f"{'courses':>8} {'rooms':>6} {'sessions':>9} {'seconds':>8} {'clashes':>8}")
+    for count in course_counts:
+        for room_count in room_counts:
+            sessions = [(c, c // 2, (f"D{c // 40}", (c // 5) % 8)) for c in range(count) for _ in range(hours)]
+            began = time.monotonic()
+            _, clashes = solve(sessions, 5, 7, [f"r{r}" for r in range(room_count)], budget=budget, seed=1)
+            echo(f"{count:>8} {room_count:>6} {len(sessions):>9} {time.monotonic() - began:>8.2f} {clashes:>8}")
+
+
+def init_app(app):
+    @app.cli.command('benchmark-scheduler')
+    @click.option('--budget', default=10.0, help="Seconds the solver may spend per problem.")
+    def benchmark_scheduler_command(budget):
+        """Show how timetable generation time scales with courses and rooms."""
+        benchmark(budget=budget, echo=click.echo)
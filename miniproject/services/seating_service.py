@@ -0,0 +1,147 @@
+from services import export_service, timetable_service
+
+# Exam-day seating. Exams whose times overlap form one sitting and share the halls; within a
+# sitting the students of each paper are spread evenly through the seat order, so neighbours
+# (side by side and front to back) are writing different papers wherever the numbers allow.
+
+INSERT_CHUNK = 1000
+
+SEATING_COLUMNS = [
+    ("Hall", "h.name"),
+    ("Seat", "CONCAT('R', FLOOR((es.seat_number - 1) / h.seats_per_row) + 1, '-S', MOD(es.seat_number - 1, h.seats_per_row) + 1)"),
+    ("Register Number", "s.register_number"),
+    ("Name", "s.name"),
+    ("Department", "s.department"),
+    ("Semester", "s.semester"),
+    ("Course", "c.course_name"),
+    ("Time", "CONCAT(TIME_FORMAT(e.start_time, '%%H:%%i'), '-', TIME_FORMAT(e.end_time, '%%H:%%i'))")
+]
+
+
+def sittings(exams):
+    """Group exams (with 'start'/'end' minutes) into sittings of overlapping times."""
+    groups = []
+    for exam in sorted(exams, key=lambda e: e['start']):
+        if groups and exam['start'] < groups[-1][1]:
+            groups[-1][0].append(exam)
+            groups[-1][1] = max(groups[-1][1], exam['end'])
+        else:
+            groups.append([[exam], exam['end']])
+    return [members for members, _ in groups]
+
+
+def interleave(groups):
+    """
+    groups: one list of students per paper. Returns [(group_index, student)] with every group
+    spread evenly: member j of a group of n sits at fraction (j + 0.5) / n of the sequence.
+    """
+    keyed = [((j + 0.5) / len(group), k, student) for k, group in enumerate(groups) for j, student in enumerate(group)]
+    keyed.sort(key=lambda item: (item[0], item[1]))
+    return [(k, student) for _, k, student in keyed]
+
+
+def seat_order(hall):
+    """
+    Seat numbers (row-major, from 1) in filling order. With an even row width every other row is
+    filled right to left, so alternating papers also alternate front to back.
+    """
+    width, capacity = hall['seats_per_row'], hall['capacity']
+    order = []
+    for row_start in range(0, capacity, width):
+        row = list(range(row_start + 1, min(row_start + width, capacity) + 1))
+        if width % 2 == 0 and (row_start // width) % 2:
+            row.reverse()
+        order.extend(row)
+    return order
+
+
+def allocate(exams, students_by_cohort, halls):
+    """
+    Pure allocation. exams: dicts with exam_id, department, semester, start, end. students_by_cohort:
+    {(department, semester): [student_id, ...]}. halls: dicts with hall_id, capacity, seats_per_row.
+    Returns (seats, clashes) where seats are (exam_id, student_id, hall_id, seat_number) and clashes
+    counts students with two overlapping papers (seated for the first only).
+    Raises ValueError when a sitting needs more seats than the halls have.
+    """
+    seats_in_order = [(hall['hall_id'], number) for hall in halls for number in seat_order(hall)]
+    seats, clashes = [], 0
+    for sitting in sittings(exams):
+        taken, groups = set(), []
+        for exam in sitting:
+            group = []
+            for student_id in students_by_cohort.get((exam['department'], exam['semester']), ()):
+                if student_id in taken:
+                    clashes += 1
+                    continue
+                taken.add(student_id)
+                group.append(student_id)
+            groups.append(group)
+        groups_in_use = [(exam, group) for exam, group in zip(sitting, groups) if group]
+        needed = sum(len(group) for _, group in groups_in_use)
+        if needed > len(seats_in_order):
+            start = timetable_service.format_minutes(sitting[0]['start'])
+            raise ValueError(f"The {start} sitting needs {needed} seats but the halls have {len(seats_in_order)}.")
+        order = interleave([group for _, group in groups_in_use])
+        for (k, student_id), (hall_id, number) in zip(order, seats_in_order):
+            seats.append((groups_in_use[k][0]['exam_id'], student_id, hall_id, number))
+    return seats, clashes
+
+
+def allocate_date(db, exam_date):
+    """Seat every eligible student for every exam on exam_date, replacing any earlier allocation."""
+    cursor = db.cursor(dictionary=True)
+    cursor.execute("""
+        SELECT e.exam_id, e.start_time, e.end_time, c.department, c.semester
+        FROM exams e
+        JOIN courses c ON e.course_id = c.course_id
+        WHERE e.exam_date = %s
+    """, (exam_date,))
+    exams = cursor.fetchall()
+    if not exams:
+        return None
+    for exam in exams:
+        exam['start'], exam['end'] = timetable_service.to_minutes(exam['start_time']), timetable_service.to_minutes(exam['end_time'])
+
+    cursor.execute("SELECT hall_id, name, capacity, seats_per_row FROM exam_halls ORDER BY capacity DESC, name")
+    halls = cursor.fetchall()
+
+    cohorts = list({(e['department'], e['semester']) for e in exams})
+    students_by_cohort = {cohort: [] for cohort in cohorts}
+    cursor.execute(f"""
+        SELECT student_id, department, semester FROM student
+        WHERE (department, semester) IN ({', '.join(['(%s, %s)'] * len(cohorts))})
+        ORDER BY register_number
+    """, [value for cohort in cohorts for value in cohort])
+    for row in cursor.fetchall():
+        students_by_cohort[(row['department'], row['semester'])].append(row['student_id'])
+
+    seats, clashes = allocate(exams, students_by_cohort, halls)
+
+    exam_ids = [e['exam_id'] for e in exams]
+    cursor.execute(f"DELETE FROM exam_seating WHERE exam_id IN ({', '.join(['%s'] * len(exam_ids))})", exam_ids)
+    for i in range(0, len(seats), INSERT_CHUNK):
+        chunk = seats[i:i + INSERT_CHUNK]
+        cursor.execute(f"""
+            INSERT INTO exam_seating (exam_id, student_id, hall_id, seat_number)
+            VALUES {', '.join(['(%s, %s, %s, %s)'] * len(chunk))}
+        """, [value for seat in chunk for value in seat])
+    db.commit()
+    return {'exams': len(exams), 'seated': len(seats), 'clashes': clashes,
+            'halls': len({hall_id for _, _, hall_id, _ in seats})}
+
+
+def seating_export(exam_date, fmt='csv'):
+    """The seating chart for one date, streamed hall by hall."""
+    source = """
+        FROM exam_seating es
+        JOIN exams e ON es.exam_id = e.exam_id
+        JOIN courses c ON e.course_id = c.course_id
+        JOIN student s ON es.student_id = s.student_id
+        JOIN exam_halls h ON es.hall_id = h.hall_id
+        WHERE e.exam_date = %s
+    """
+    order_by = "e.start_time, h.name, es.seat_number"
+    filename = f"Seating_{exam_date}"
+    if fmt == 'xlsx':
+        return export_service.xlsx_response(filename, "Seating", SEATING_COLUMNS, source, (exam_date,), order_by)
+    return export_service.csv_response(filename, SEATING_COLUMNS, source, (exam_date,), order_by)
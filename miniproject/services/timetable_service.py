@@ -0,0 +1,305 @@
+from utils.cache import Cache
+from bisect import bisect_left, bisect_right
+from datetime import timedelta, time as dt_time
+import csv
+import io
+
+DAYS = ('Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday')
+UPLOAD_COLUMNS = ('course_id', 'faculty_id', 'day', 'start_time', 'end_time', 'classroom')
+
+# Timetable writes go through this named lock, so a check and the insert it allows cannot interleave
+WRITE_LOCK = 'eventura-timetable'
+
+# The whole timetable as a ConflictIndex, tagged with the timetable version it was built from. Every
+# write bumps the version in data_versions in its own transaction, so each use compares the tag with
+# one primary-key read and rebuilds only after a write, whichever worker made it.
+_index_cache = Cache('timetable:index', ttl=3600)
+
+CLASH_MESSAGES = {
+    'faculty': "Faculty is already teaching",
+    'classroom': "Classroom is already booked for",
+    'cohort': "Cohort already has"
+}
+
+
+def to_minutes(value):
+    """A TIME column (timedelta), datetime.time or 'HH:MM[:SS]' -> minutes after midnight."""
+    if isinstance(value, timedelta):
+        return int(value.total_seconds()) // 60
+    if isinstance(value, dt_time):
+        return value.hour * 60 + value.minute
+    parts = str(value).strip().split(':')
+    hours, minutes = int(parts[0]), int(parts[1]) if len(parts) > 1 else 0
+    if not (0 <= hours < 24 and 0 <= minutes < 60):
+        raise ValueError(value)
+    return hours * 60 + minutes
+
+
+def format_minutes(minutes):
+    return f"{minutes // 60:02}:{minutes % 60:02}"
+
+
+def _resources(slot):
+    """(kind, key) pairs a slot occupies; two slots clash when they share one on the same day."""
+    keys = [('faculty', slot['faculty_id']), ('cohort', (slot['department'], slot['semester']))]
+    room = (slot.get('classroom') or '').strip().lower()
+    if room:
+        keys.append(('classroom', room))
+    return keys
+
+
+class Lane:
+    """One resource on one day: intervals sorted by start, plus the running maximum of their ends."""
+
+    def __init__(self):
+        self.starts = []
+        self.ends = []
+        self.slots = []
+        self.reach = []
+
+    def add(self, slot):
+        i = bisect_right(self.starts, slot['start'])
+        self.starts.insert(i, slot['start'])
+        self.ends.insert(i, slot['end'])
+        self.slots.insert(i, slot)
+        self.reach.insert(i, 0)
+        # Appending in start order (the bulk build) only touches the last entry
+        for k in range(i, len(self.reach)):
+            self.reach[k] = max(self.reach[k - 1] if k else 0, self.ends[k])
+
+    def copy(self):
+        lane = Lane()
+        lane.starts, lane.ends, lane.slots, lane.reach = self.starts[:], self.ends[:], self.slots[:], self.reach[:]
+        return lane
+
+    def overlapping(self, start, end):
+        # Only intervals starting before `end` can overlap, and among those one does
+        # exactly when the furthest end reaches past `start`: two bisections decide it.
+        j = bisect_left(self.starts, end)
+        if j == 0 or self.reach[j - 1] <= start:
+            return []
+        found = []
+        k = j - 1
+        while k >= 0 and self.reach[k] > start:
+            if self.ends[k] > start:
+                found.append(self.slots[k])
+            k -= 1
+        return found
+
+
+class ConflictIndex:
+    """Per-day interval lanes over timetable slots, for faculty, classroom and cohort."""
+
+    def __init__(self, slots=()):
+        self.lanes = {}
+        for slot in sorted(slots, key=lambda s: s['start']):
+            self.add(slot)
+
+    def add(self, slot):
+        for kind, key in _resources(slot):
+            self.lanes.setdefault((kind, key, slot['day']), Lane()).add(slot)
+
+    def with_slots(self, slots):
+        """A new index with the slots added. Only the lanes they touch are copied; this one stays as it was."""
+        index = ConflictIndex()
+        index.lanes = dict(self.lanes)
+        copied = set()
+        for slot in slots:
+            for kind, key in _resources(slot):
+                lane_key = (kind, key, slot['day'])
+                if lane_key not in copied:
+                    lane = self.lanes.get(lane_key)
+                    index.lanes[lane_key] = lane.copy() if lane else Lane()
+                    copied.add(lane_key)
+                index.lanes[lane_key].add(slot)
+        return index
+
+    def conflicts(self, slot):
+        """[(kind, other_slot)] for every indexed slot overlapping this one on a shared resource."""
+        found = []
+        for kind, key in _resources(slot):
+            lane = self.lanes.get((kind, key, slot['day']))
+            if lane:
+                found.extend((kind, other) for other in lane.overlapping(slot['start'], slot['end']) if other is not slot)
+        return found
+
+
+def _load_slots(cursor):
+    cursor.execute("""
+        SELECT t.timetable_id, t.course_id, t.faculty_id, t.day, t.start_time, t.end_time, t.classroom,
+               c.course_name, c.department, c.semester
+        FROM timetable t
+        JOIN courses c ON t.course_id = c.course_id
+    """)
+    slots = cursor.fetchall()
+    for slot in slots:
+        slot['start'], slot['end'] = to_minutes(slot.pop('start_time')), to_minutes(slot.pop('end_time'))
+    return slots
+
+
+def _version(cursor):
+    cursor.execute("SELECT version FROM data_versions WHERE name = 'timetable'")
+    row = cursor.fetchone()
+    return row['version'] if row else 0
+
+
+def bump_version(cursor):
+    """Call in the same transaction as every write to timetable."""
+    cursor.execute("""
+        INSERT INTO data_versions (name, version) VALUES ('timetable', 1)
+        ON DUPLICATE KEY UPDATE version = version + 1
+    """)
+
+
+def _build(cursor, version):
+    # The version is read first, so slots written meanwhile only make the tag conservative
+    index = ConflictIndex(_load_slots(cursor))
+    index.version = version
+    return index
+
+
+def conflict_index(cursor):
+    """The cached index if no write has happened since it was built, else a rebuilt one."""
+    version = _version(cursor)
+    index = _index_cache.fetch('all', lambda: _build(cursor, version))
+    if index.version != version:
+        index = _index_cache.fetch('all', lambda: _build(cursor, version), refresh=True)
+    return index
+
+
+def invalidate():
+    _index_cache.delete('all')
+
+
+def describe(kind, other):
+    where = f"row {other['row']} of the file" if other.get('row') else "the current timetable"
+    return (f"{CLASH_MESSAGES[kind]} {other['course_name']} on {other['day']} "
+            f"{format_minutes(other['start'])}-{format_minutes(other['end'])} ({where})")
+
+
+def make_slot(row, courses):
+    """
+    Validate one slot given as strings (form or file row). courses: {course_id: course row}.
+    Returns (slot, error).
+    """
+    try:
+        course_id, faculty_id = int(row.get('course_id') or 0), int(row.get('faculty_id') or 0)
+    except ValueError:
+        return None, "Course and faculty must be ids"
+    course = courses.get(course_id)
+    if not course:
+        return None, "Unknown course"
+    day = (row.get('day') or '').strip().capitalize()
+    if day not in DAYS:
+        return None, f"Day must be one of {', '.join(DAYS)}"
+    try:
+        start, end = to_minutes(row.get('start_time')), to_minutes(row.get('end_time'))
+    except (ValueError, IndexError):
+        return None, "Times must be HH:MM"
+    if start >= end:
+        return None, "End time must be after start time"
+    return {
+        'course_id': course_id, 'faculty_id': faculty_id, 'day': day, 'start': start, 'end': end,
+        'classroom': (row.get('classroom') or '').strip(), 'course_name': course['course_name'],
+        'department': course['department'], 'semester': course['semester']
+    }, None
+
+
+def courses_by_id(cursor, course_ids=None):
+    if course_ids is None:
+        cursor.execute("SELECT course_id, course_name, department, semester FROM courses")
+    else:
+        if not course_ids:
+            return {}
+        cursor.execute(f"SELECT course_id, course_name, department, semester FROM courses WHERE course_id IN ({', '.join(['%s'] * len(course_ids))})",
+                       list(course_ids))
+    return {c['course_id']: c for c in cursor.fetchall()}
+
+
+def check_slot(cursor, slot):
+    """Clash messages for one proposed slot against the current timetable. Call holding WRITE_LOCK."""
+    return [describe(kind, other) for kind, other in conflict_index(cursor).conflicts(slot)]
+
+
+def validate_rows(cursor, rows):
+    """
+    Check a whole term in one pass, against the current timetable and the rows before it in the file.
+    rows: iterable of (line_number, {column: value}). Returns (slots, report), where report holds
+    one {'row', 'error'} per problem found. Call holding WRITE_LOCK.
+    """
+    index = conflict_index(cursor)
+    courses = courses_by_id(cursor)
+    cursor.execute("SELECT faculty_id FROM faculty")
+    faculty = {row['faculty_id'] for row in cursor.fetchall()}
+    incoming = ConflictIndex()
+    slots, report = [], []
+    for number, row in rows:
+        slot, error = make_slot(row, courses)
+        if not error and slot['faculty_id'] not in faculty:
+            error = "Unknown faculty"
+        if error:
+            report.append({'row': number, 'error': error})
+            continue
+        slot['row'] = number
+        for kind, other in index.conflicts(slot) + incoming.conflicts(slot):
+            report.append({'row': number, 'error': describe(kind, other)})
+        # Added even when it clashes, so later rows are checked against everything in the file
+        incoming.add(slot)
+        slots.append(slot)
+    return slots, report
+
+
+def read_csv(upload):
+    """Yield (line_number, {column: value}) from an uploaded CSV."""
+    reader = csv.reader(io.TextIOWrapper(upload.stream, encoding='utf-8-sig', newline=''))
+    header = [str(h).strip().lower().replace(' ', '_') for h in next(reader, [])]
+    for number, values in enumerate(reader, 2):
+        if any(v.strip() for v in values):
+            yield number, {h: v.strip() for h, v in zip(header, values) if h}
+
+
+def insert_slots(cursor, slots):
+    """
+    Insert checked slots and bump the timetable version. Returns the new version, for slots_added
+    once the transaction has committed.
+    """
+    cursor.executemany("""
+        INSERT INTO timetable (course_id, faculty_id, day, start_time, end_time, classroom)
+        VALUES (%s, %s, %s, %s, %s, %s)
+    """, [(s['course_id'], s['faculty_id'], s['day'], format_minutes(s['start']), format_minutes(s['end']), s['classroom'])
+          for s in slots])
+    bump_version(cursor)
+    return _version(cursor)
+
+
+def slots_added(slots, version):
+    """
+    After insert_slots has committed: if this worker's cached index is exactly one write behind,
+    extend it with the slots instead of rebuilding it on the next check. Other workers rebuild once.
+    """
+    index = _index_cache.get('all')
+    if index is None or index.version != version - 1:
+        return
+    index = index.with_slots([{k: v for k, v in slot.items() if k != 'row'} for slot in slots])
+    index.version = version
+    _index_cache.set('all', index)
+
+
+def acquire_write_lock(db, timeout=10):
+    cursor = db.cursor()
+    cursor.execute("SELECT GET_LOCK(%s, %s)", (WRITE_LOCK, timeout))
+    return cursor.fetchone()[0] == 1
+
+
+def release_write_lock(db):
+    cursor = db.cursor()
+    cursor.execute("SELECT RELEASE_LOCK(%s)", (WRITE_LOCK,))
+    cursor.fetchone()
+
+
+def template_csv():
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(UPLOAD_COLUMNS)
+    writer.writerow([1, 1, 'Monday', '09:00', '10:00', 'Room 305'])
+    return buffer.getvalue()
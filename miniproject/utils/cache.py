@@ -0,0 +1,167 @@
+from collections import OrderedDict
+import pickle
+import threading
+import time
+
+_backend = None
+
+
+class LocalBackend:
+    """In-process LRU with per-entry TTL. Fine for a single worker process."""
+
+    def __init__(self, maxsize=10000):
+        self.maxsize = maxsize
+        self._data = OrderedDict()
+        self._generations = {}
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return None
+            value, expires = item
+            if expires and expires < time.monotonic():
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl=None):
+        with self._lock:
+            self._data[key] = (value, time.monotonic() + ttl if ttl else None)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def incr(self, key, delta=1):
+        """Increment an existing integer entry; missing entries stay missing."""
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return None
+            value, expires = item
+            if expires and expires < time.monotonic():
+                del self._data[key]
+                return None
+            self._data[key] = (value + delta, expires)
+            return value + delta
+
+    def generations(self, names):
+        with self._lock:
+            return [self._generations.get(name, 0) for name in names]
+
+    def bump_generation(self, namespace):
+        with self._lock:
+            self._generations[namespace] = self._generations.get(namespace, 0) + 1
+
+
+class RedisBackend:
+    """Shared backend for multi-worker deployments. Needs the optional `redis` package."""
+
+    _INCR_IF_EXISTS = """
+        if redis.call('exists', KEYS[1]) == 1 then
+            return redis.call('incrby', KEYS[1], ARGV[1])
+        end
+        return nil
+    """
+
+    def __init__(self, url, prefix='eventura:'):
+        import redis
+        self.client = redis.Redis.from_url(url)
+        self.prefix = prefix
+        self._incr = self.client.register_script(self._INCR_IF_EXISTS)
+
+    def get(self, key):
+        data = self.client.get(self.prefix + key)
+        if data is None:
+            return None
+        # Integers are stored as plain strings so INCRBY works on them
+        if data[:1] == b'\x80':
+            return pickle.loads(data)
+        return int(data)
+
+    def set(self, key, value, ttl=None):
+        data = str(value) if isinstance(value, int) and not isinstance(value, bool) else pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)
+        self.client.set(self.prefix + key, data, ex=int(ttl) if ttl else None)
+
+    def delete(self, key):
+        self.client.delete(self.prefix + key)
+
+    def incr(self, key, delta=1):
+        return self._incr(keys=[self.prefix + key], args=[delta])
+
+    def generations(self, names):
+        values = self.client.mget([self.prefix + 'gen:' + name for name in names])
+        return [int(value) if value else 0 for value in values]
+
+    def bump_generation(self, namespace):
+        self.client.incr(self.prefix + 'gen:' + namespace)
+
+
+def init_app(app):
+    global _backend
+    if app.config.get('CACHE_BACKEND') == 'redis':
+        _backend = RedisBackend(app.config['CACHE_REDIS_URL'])
+    else:
+        _backend = LocalBackend(app.config.get('CACHE_MAX_ENTRIES', 10000))
+
+
+def get_backend():
+    global _backend
+    if _backend is None:
+        _backend = LocalBackend()
+    return _backend
+
+
+class Cache:
+    """
+    A named view over the configured backend. clear() bumps the namespace
+    generation, which invalidates every key in O(1) without scanning; delete()
+    also bumps a generation of its own for the key. Both are part of the stored
+    key, so a value built from rows read before an invalidation (see fetch) is
+    written where no reader looks any more.
+    """
+
+    def __init__(self, namespace, ttl=300):
+        self.namespace = namespace
+        self.ttl = ttl
+
+    def _key(self, key):
+        ns_gen, key_gen = get_backend().generations([self.namespace, f"{self.namespace}:{key}"])
+        return f"{self.namespace}:{ns_gen}:{key}:{key_gen}"
+
+    def get(self, key):
+        return get_backend().get(self._key(key))
+
+    def fetch(self, key, build, refresh=False):
+        """
+        The cached value, or build() stored for next time (refresh=True rebuilds even on a hit).
+        The key is resolved before build() reads the database, so an invalidation that commits
+        meanwhile leaves the result unreachable instead of cached for the whole TTL.
+        """
+        backend = get_backend()
+        slot = self._key(key)
+        value = None if refresh else backend.get(slot)
+        if value is None:
+            value = build()
+            backend.set(slot, value, self.ttl)
+        return value
+
+    def set(self, key, value):
+        get_backend().set(self._key(key), value, self.ttl)
+
+    def delete(self, key):
+        backend = get_backend()
+        backend.delete(self._key(key))
+        backend.bump_generation(f"{self.namespace}:{key}")
+
+    def incr(self, key, delta=1):
+        return get_backend().incr(self._key(key), delta)
+
+    def clear(self):
+        get_backend().bump_generation(self.namespace)
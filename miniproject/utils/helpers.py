@@ -1,6 +1,64 @@
 from flask import session, redirect, url_for, abort
 from functools import wraps
+import threading
 from models.db import get_db_connection
+from utils.cache import Cache
+
+# Unread notification counts per (role, user_id); reset when the user reads their notifications
+_unread_counts = {
+    'student': Cache('unread:student', ttl=600),
+    'faculty': Cache('unread:faculty', ttl=600)
+}
+
+def _unread_cache(role):
+    return _unread_counts.get(role) or _unread_counts['student']
+
+def get_unread_count(user_id, role, db=None):
+    def count_unread():
+        conn = db or get_db_connection()
+        cursor = conn.cursor(dictionary=True)
+        cursor.execute("""
+            SELECT COUNT(*) as count FROM notifications
+            WHERE user_id = %s AND user_role = %s AND is_read = 0
+        """, (user_id, role))
+        result = cursor.fetchone()
+        if db is None:
+            conn.close()
+        return result['count'] if result else 0
+    return _unread_cache(role).fetch(user_id, count_unread)
+
+def set_unread_count(user_id, role, count):
+    _unread_cache(role).set(user_id, count)
+
+def decrement_unread_count(user_id, role, count):
+    if count:
+        cache = _unread_cache(role)
+        if (cache.incr(user_id, -count) or 0) < 0:
+            cache.delete(user_id)
+
+def _bump_unread(rows):
+    for user_id, role, _ in rows:
+        _unread_cache(role).incr(user_id)
+    _signal_notifications()
+
+# Wakes notification streams in this process as soon as something new is written
+_notify_cond = threading.Condition()
+_notify_version = 0
+
+def _signal_notifications():
+    global _notify_version
+    with _notify_cond:
+        _notify_version += 1
+        _notify_cond.notify_all()
+
+def notifications_version():
+    return _notify_version
+
+def wait_for_notifications(version, timeout):
+    """Block until a notification is written after `version` or the timeout expires."""
+    with _notify_cond:
+        _notify_cond.wait_for(lambda: _notify_version != version, timeout=timeout)
+        return _notify_version
 
 def login_required(f):
     @wraps(f)
@@ -31,24 +89,78 @@ def add_notification(user_id, role, message):
         """, (user_id, role, message))
         db.commit()
         db.close()
+        _unread_cache(role).incr(user_id)
+        _signal_notifications()
     except Exception as e:
         print(f"Error adding notification: {e}")
 
-def notify_admins(message):
+def add_notifications(rows, db=None, chunk_size=500):
+    """
+    Insert many (user_id, role, message) rows with multi-row INSERTs.
+    When db is given the rows join the caller's transaction and errors propagate, so the caller
+    rolls back instead of committing without them; otherwise they are committed here.
+    """
+    rows = list(rows)
+    if not rows:
+        return 0
+    own = db is None
     try:
+        if own:
+            db = get_db_connection()
+        cursor = db.cursor()
+        for i in range(0, len(rows), chunk_size):
+            chunk = rows[i:i + chunk_size]
+            placeholders = ", ".join(["(%s, %s, %s)"] * len(chunk))
+            params = [value for row in chunk for value in row]
+            cursor.execute(f"INSERT INTO notifications (user_id, user_role, message) VALUES {placeholders}", params)
+        if own:
+            db.commit()
+            db.close()
+        _bump_unread(rows)
+        return len(rows)
+    except Exception as e:
+        print(f"Error adding notifications: {e}")
+        raise
+
+def notify_role(role, message, exclude_id=None, db=None):
+    """Notify every student or every faculty member with a single INSERT ... SELECT."""
+    table, id_col = ('faculty', 'faculty_id') if role == 'faculty' else ('student', 'student_id')
+    own = db is None
+    if own:
         db = get_db_connection()
+    cursor = db.cursor()
+    if exclude_id is not None:
+        cursor.execute(f"""
+            INSERT INTO notifications (user_id, user_role, message)
+            SELECT {id_col}, %s, %s FROM {table} WHERE {id_col} != %s
+        """, (role, message, exclude_id))
+    else:
+        cursor.execute(f"""
+            INSERT INTO notifications (user_id, user_role, message)
+            SELECT {id_col}, %s, %s FROM {table}
+        """, (role, message))
+    count = cursor.rowcount
+    if own:
+        db.commit()
+        db.close()
+    # Too many keys to touch one by one; drop every cached count for the role instead
+    _unread_cache(role).clear()
+    _signal_notifications()
+    return count
+
+def notify_admins(message, db=None):
+    own = db is None
+    try:
+        if own:
+            db = get_db_connection()
         cursor = db.cursor(dictionary=True)
         cursor.execute("SELECT faculty_id FROM faculty WHERE is_admin = 1")
         admins = cursor.fetchall()
-        
-        cursor_insert = db.cursor()
-        for admin in admins:
-             cursor_insert.execute("""
-                INSERT INTO notifications (user_id, user_role, message) 
-                VALUES (%s, 'faculty', %s)
-            """, (admin['faculty_id'], message))
-        
-        db.commit()
-        db.close()
+        add_notifications([(admin['faculty_id'], 'faculty', message) for admin in admins], db=db)
+        if own:
+            db.commit()
+            db.close()
     except Exception as e:
         print(f"Error notifying admins: {e}")
+        if not own:
+            raise
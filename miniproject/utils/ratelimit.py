@@ -0,0 +1,109 @@
+from flask import request, session, current_app
+from functools import wraps
+from collections import OrderedDict
+from werkzeug.exceptions import TooManyRequests
+import threading
+import time
+
+_storage = None
+
+
+class MemoryStorage:
+    """Per-process buckets. Limits are per worker when running several workers."""
+
+    def __init__(self, max_keys=100000):
+        self.max_keys = max_keys
+        self._buckets = OrderedDict()
+        self._lock = threading.Lock()
+
+    def take(self, key, rate, capacity):
+        """Take one token. Returns (allowed, seconds until a token is available)."""
+        now = time.monotonic()
+        with self._lock:
+            tokens, updated = self._buckets.get(key, (capacity, now))
+            tokens = min(capacity, tokens + (now - updated) * rate)
+            if tokens >= 1:
+                allowed, wait = True, 0.0
+                tokens -= 1
+            else:
+                allowed, wait = False, (1 - tokens) / rate
+            self._buckets[key] = (tokens, now)
+            self._buckets.move_to_end(key)
+            while len(self._buckets) > self.max_keys:
+                self._buckets.popitem(last=False)
+        return allowed, wait
+
+
+class RedisStorage:
+    """Buckets shared by every worker. Needs the optional `redis` package."""
+
+    _TAKE = """
+        local data = redis.call('HMGET', KEYS[1], 'tokens', 'ts')
+        local rate = tonumber(ARGV[1])
+        local capacity = tonumber(ARGV[2])
+        local now = tonumber(ARGV[3])
+        local tokens = tonumber(data[1]) or capacity
+        local ts = tonumber(data[2]) or now
+        tokens = math.min(capacity, tokens + math.max(0, now - ts) * rate)
+        local allowed = 0
+        local wait = 0
+        if tokens >= 1 then
+            tokens = tokens - 1
+            allowed = 1
+        else
+            wait = (1 - tokens) / rate
+        end
+        redis.call('HSET', KEYS[1], 'tokens', tokens, 'ts', now)
+        redis.call('EXPIRE', KEYS[1], math.ceil(capacity / rate) + 1)
+        return {allowed, tostring(wait)}
+    """
+
+    def __init__(self, url, prefix='eventura:rl:'):
+        import redis
+        self.client = redis.Redis.from_url(url)
+        self.prefix = prefix
+        self._take = self.client.register_script(self._TAKE)
+
+    def take(self, key, rate, capacity):
+        allowed, wait = self._take(keys=[self.prefix + key], args=[rate, capacity, time.time()])
+        return bool(allowed), float(wait)
+
+
+def init_app(app):
+    global _storage
+    if app.config.get('RATELIMIT_STORAGE') == 'redis':
+        _storage = RedisStorage(app.config['CACHE_REDIS_URL'])
+    else:
+        _storage = MemoryStorage()
+
+
+def get_storage():
+    global _storage
+    if _storage is None:
+        _storage = MemoryStorage()
+    return _storage
+
+
+def _client_key(key):
+    if key == 'user' and 'user_id' in session:
+        return f"{session.get('role')}:{session['user_id']}"
+    # Behind a proxy, wrap the app in werkzeug's ProxyFix so remote_addr is the client
+    return request.remote_addr or 'unknown'
+
+
+def rate_limit(name, limit, per=60, burst=None, key='ip', methods=None):
+    """
+    Token bucket: `limit` requests every `per` seconds, with bursts of up to `burst`
+    (defaults to limit). key='user' buckets by logged-in user, falling back to the client IP.
+    methods restricts the limit to e.g. ('POST',). Over-limit calls are rejected with 429.
+    """
+    def decorator(f):
+        @wraps(f)
+        def wrapper(*args, **kwargs):
+            if current_app.config.get('RATELIMIT_ENABLED', True) and (not methods or request.method in methods):
+                allowed, wait = get_storage().take(f"{name}:{_client_key(key)}", limit / per, burst or limit)
+                if not allowed:
+                    raise TooManyRequests(retry_after=max(1, int(wait + 0.999)))
+            return f(*args, **kwargs)
+        return wrapper
+    return decorator